@@ -16,6 +16,7 @@ from Utilities.Set_Temperature_Profiles import Profiles
 from Utilities.Installation_Configuration import get_temperatures
 from Utilities.Prepare_Inputs import Prepare_Inputs
 import Utilities.Conversions as Conversions
+from Utilities.Incremental_Simulation import simulate_incremental
 
 cwd = os.getcwd()
 
@@ -42,6 +43,11 @@ Initial_Temperature = 51.7
 # The frequency with which the simulation should print updates
 Update_Frequency = 5
 
+# Set to a folder to store the results of this simulation. Later simulations
+# using the same configuration re-use the stored results up to the first
+# timestep with different inputs. None disables this
+Checkpoint_Folder = None
+
 #%%-----------------------READ INPUT DATA-----------------------------------
 
 # Read the draw profile data, convert as needed
@@ -75,26 +81,28 @@ Config['Node Temperatures (deg C)'] = [Initial_Temperature] * Config['Number of
 # Convert the inputs to the needed format for simulation
 Input_Data, Config, Column_Index = Prepare_Inputs(Input_Data, Config)
 
-#%%---------------------INITIALIZE MODEL-----------------------------------
-
-# Set parameters for the HPWH model using the configuration data
-HPWH = HPWH_MultipleNodes(Config)
-
 #%%--------------------PERFORM THE SIMULATION------------------------------
 
 print('Starting simulation')
-Time_Last_Update = datetime.datetime.now()
-for row in range(0, len(Input_Data)):
-    
-    # Process the timestep, store the outputs in the data set
-    Output = HPWH.calculate_timestep(Input_Data[row])
-    Input_Data[row] = Output
-    
-    # Update the user on simulation progress as appropriate
-    if (datetime.datetime.now() - Time_Last_Update).total_seconds() >= Update_Frequency:
-        Time_Last_Update = datetime.datetime.now()
-        Timestamp = Input_Data[row, Column_Index['Timestamp']]
-        print('Completed timestamp {} at {}'.format(Timestamp, Time_Last_Update))
+if Checkpoint_Folder is not None:
+    # simulate_incremental creates the model from the configuration data
+    Input_Data = simulate_incremental(Config, Input_Data, Checkpoint_Folder, Update_Frequency = Update_Frequency)
+else:
+    # Set parameters for the HPWH model using the configuration data
+    HPWH = HPWH_MultipleNodes(Config)
+
+    Time_Last_Update = datetime.datetime.now()
+    for row in range(0, len(Input_Data)):
+        
+        # Process the timestep, store the outputs in the data set
+        Output = HPWH.calculate_timestep(Input_Data[row])
+        Input_Data[row] = Output
+        
+        # Update the user on simulation progress as appropriate
+        if (datetime.datetime.now() - Time_Last_Update).total_seconds() >= Update_Frequency:
+            Time_Last_Update = datetime.datetime.now()
+            Timestamp = Input_Data[row, Column_Index['Timestamp']]
+            print('Completed timestamp {} at {}'.format(Timestamp, Time_Last_Update))
         
 # Create a pd.DataFrame with the results        
 Result = pd.DataFrame(Input_Data, index = ix, columns = Column_Index.keys())
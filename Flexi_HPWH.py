@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:34:50 2026
+
+This script is the command line interface of Flexi-HPWH (flexi-hpwh). It runs
+single simulations and test matrices from command line arguments, so batches
+of simulations can be scripted without editing the constants at the top of
+Example_Simulation.py or Multi-Simulation_Tool.py. Paths are resolved
+relative to the working directory, and the default configuration file is
+found relative to this script, so it can be run from any folder.
+
+Commands:
+    simulate: Simulates one time series input file, in the format used by
+        Example_Simulation.py. The input file must contain 'Hot Water Draw
+        Volume (L)', the inlet water temperature as 'Inlet Water Temperature
+        (deg C)' or 'Mains Temperature (deg C)', and the air temperatures
+        needed by the installation configuration. 'Timestep (min)' is
+        calculated from the timestamps if not provided. The engine used to
+        perform the simulation can be selected:
+            sequential: Simulates every timestep using HPWH_MultipleNodes.
+            windowed: Splits the simulation into one window per worker, each
+                preceded by warm-up rows, using simulate_warmup_windows in
+                Parallel_Simulation.py.
+            incremental: Re-uses stored runs with the same configuration
+                using simulate_incremental in Incremental_Simulation.py.
+                Requires --checkpoint-folder.
+            batch: Uses the vectorized HPWH_MultipleNodes_Batch. Does not
+                report the temperature of each node.
+    matrix: Runs a test matrix using Test_Matrix_Planner.py, in parallel
+        across the available workers, and stores the summary of every case.
+    report: Creates figures from the stored results of earlier simulations,
+        using Reports.py. Simulations do not create figures themselves.
+
+The simulate and matrix commands can limit the simulation to a time window
+with --start and --end, store only the key performance indicators with
+--kpi-only, and write the results as csv, parquet or pickle files with
+--format. Parquet requires pyarrow or fastparquet.
+
+Usage:
+    python Flexi_HPWH.py simulate <input file> [--engine sequential] [--workers N] [--kpi-only]
+    python Flexi_HPWH.py matrix <test matrix> --draw-profile <path> [--workers N] [--kpi-only]
+    python Flexi_HPWH.py report <results folder> [--workers N]
+    python Flexi_HPWH.py <command> --help
+
+@author: Peter Grant
+"""
+
+import os
+import sys
+import time
+import argparse
+
+Root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(Root, 'Utilities'))
+
+Engines = ['sequential', 'windowed', 'incremental', 'batch']
+
+# The file extension used for each output format
+Output_Formats = {'csv': '.csv', 'parquet': '.parquet', 'pickle': '.pkl'}
+
+Liters_In_Gallon = 3.78541 #The number of liters in a gallon
+
+def read_input_data(Path, Start = None, End = None):
+    '''
+    Reads a time series input file, optionally limited to the timestamps
+    between Start and End.
+    '''
+
+    import pandas as pd
+
+    Input_Data = pd.read_csv(Path, index_col = 0)
+    Input_Data.index = pd.to_datetime(Input_Data.index)
+    Input_Data = Input_Data.loc[Start:End]
+    if len(Input_Data) == 0:
+        raise ValueError('{} contains no timestamps between {} and {}'.format(Path, Start, End))
+
+    return Input_Data
+
+def prepare_input_data(Input_Data, config, Set_Temperature_Profile, Installation_Configuration,
+                       Initial_Temperature):
+    '''
+    Converts a time series input file to the inputs of HPWH_MultipleNodes, as
+    done in Example_Simulation.py.
+
+    inputs:
+        Input_Data: The pd.DataFrame returned by read_input_data.
+        config: The configuration of the HPWH.
+        Set_Temperature_Profile: The name of a profile in
+            Set_Temperature_Profiles.py. None uses the set temperatures in
+            the input file.
+        Installation_Configuration: The name of a configuration in
+            Installation_Configuration.py.
+        Initial_Temperature: The initial temperature of every node, in deg C.
+
+    outputs:
+        The numpy array of inputs and the configuration, including
+        'Column Index'.
+    '''
+
+    from Set_Temperature_Profiles import get_profile
+    from Installation_Configuration import get_temperatures
+    from Prepare_Inputs import Prepare_Inputs
+
+    Input_Data = Input_Data.rename(columns = {'Mains Temperature (deg C)': 'Inlet Water Temperature (deg C)'})
+    Input_Data['Timestamp'] = Input_Data.index
+    if 'Timestep (min)' not in Input_Data.columns:
+        Timestep = Input_Data.index.to_series().diff().dt.total_seconds() / 60
+        Input_Data['Timestep (min)'] = Timestep.bfill().fillna(1).to_numpy()
+
+    if Set_Temperature_Profile is not None:
+        Set_Temperature = Input_Data.index.hour.astype(str).map(get_profile(Set_Temperature_Profile))
+        Input_Data['Set Temperature, Heat Pump (deg C)'] = Set_Temperature
+        Input_Data['Set Temperature, Resistance (deg C)'] = Set_Temperature
+    elif 'Set Temperature, Heat Pump (deg C)' not in Input_Data.columns:
+        raise ValueError('The input file does not contain set temperatures. State a set temperature profile')
+    Input_Data = get_temperatures(Input_Data, Installation_Configuration)
+
+    config['Node Temperatures (deg C)'] = [Initial_Temperature] * config['Number of Nodes']
+
+    input_data, config, col_index = Prepare_Inputs(Input_Data, config)
+
+    return input_data, config
+
+def run_engine(config, input_data, Engine, Number_Workers = None, Checkpoint_Folder = None, Warmup_Rows = 1440,
+               Outputs = None, Update_Frequency = None):
+    '''
+    Simulates the inputs using the selected engine.
+
+    inputs:
+        config: The configuration of the HPWH, including 'Column Index'.
+        input_data: The numpy array of inputs.
+        Engine: One of Engines.
+        Number_Workers: The number of processes used by the windowed
+            engine. Defaults to the number of cores on this computer.
+        Checkpoint_Folder: The folder storing previous runs, used by the
+            incremental engine.
+        Warmup_Rows: The number of rows simulated before each window by the
+            windowed engine.
+        Outputs: The outputs stored by the batch engine. Defaults to every
+            output.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+
+    outputs:
+        A pd.DataFrame containing the inputs and outputs of every timestep.
+    '''
+
+    import numpy as np
+    import pandas as pd
+    from HPWH_Model import HPWH_MultipleNodes, HPWH_MultipleNodes_Batch, Model_Inputs
+
+    col_index = config['Column Index']
+    Index = pd.DatetimeIndex(input_data[:, col_index['Timestamp']])
+    if Engine == 'batch':
+        Inputs = {column: input_data[:, col_index[column]].astype(float) for column in Model_Inputs
+                  if column in col_index}
+        HPWH = HPWH_MultipleNodes_Batch(config, 1)
+        Results = HPWH.simulate(Inputs, Outputs, Update_Frequency)
+        result = pd.DataFrame(input_data, index = Index, columns = col_index.keys())
+        result = result.drop(columns = [column for column in result.columns if column not in Inputs])
+        for output, value in Results.items():
+            result[output] = value[:, 0]
+        return result
+
+    if Engine == 'sequential':
+        HPWH = HPWH_MultipleNodes(config)
+        Time_Last_Update = time.time()
+        for row in range(len(input_data)):
+            input_data[row] = HPWH.calculate_timestep(input_data[row])
+            if Update_Frequency is not None and time.time() - Time_Last_Update >= Update_Frequency:
+                print('completed row {} of {}'.format(row, len(input_data)))
+                Time_Last_Update = time.time()
+    elif Engine == 'windowed':
+        from Parallel_Simulation import simulate_warmup_windows
+        if Number_Workers is None:
+            Number_Workers = os.cpu_count()
+        input_data, Diagnostics = simulate_warmup_windows(config, input_data, Number_Workers, Warmup_Rows = Warmup_Rows,
+                                                          Number_Workers = Number_Workers,
+                                                          Update_Frequency = Update_Frequency)
+    elif Engine == 'incremental':
+        from Incremental_Simulation import simulate_incremental
+        if Checkpoint_Folder is None:
+            raise ValueError('The incremental engine requires a checkpoint folder')
+        input_data = simulate_incremental(config, input_data, Checkpoint_Folder, Update_Frequency = Update_Frequency)
+    else:
+        raise ValueError('Unknown engine {}. Options are {}'.format(Engine, Engines))
+
+    # Extract water temperatures for each node
+    result = pd.DataFrame(input_data, index = Index, columns = col_index.keys())
+    Node_Temperatures = np.array(result['Node Temperatures (deg C)'].tolist(), dtype = float)
+    for i in range(Node_Temperatures.shape[1]):
+        result['Node Temperature {} (deg C)'.format(i)] = Node_Temperatures[:, i]
+    result = result.drop(columns = ['Node Temperatures (deg C)', 'Timestamp'])
+
+    return result.infer_objects()
+
+# The outputs needed to calculate the key performance indicators
+KPI_Outputs = ['Electricity Consumed Total (kWh)', 'Electricity Consumed Heat Pump (kWh)',
+               'Electricity Consumed Resistance (kWh)', 'Total Heat Added Heat Pump (kWh)',
+               'Total Jacket Losses (kWh)', 'Hot Water Draw Volume (L)']
+
+def calculate_kpis(result):
+    '''
+    Calculates the key performance indicators of a simulation, using the
+    names in the summary created by Simulate_MonitoredData.
+
+    outputs:
+        A dictionary containing each key performance indicator.
+    '''
+
+    Peak = (result.index.hour >= 16) & (result.index.hour < 21)
+    KPIs = {'Electricity Consumed (kWh)': result['Electricity Consumed Total (kWh)'].sum(),
+            'Electricity Consumed Heat Pump (kWh)': result['Electricity Consumed Heat Pump (kWh)'].sum(),
+            'Energy Added Heat Pump (kWh)': result['Total Heat Added Heat Pump (kWh)'].sum(),
+            'Electricity Consumed Backup (kWh)': result['Electricity Consumed Resistance (kWh)'].sum(),
+            'Jacket Losses (kWh)': result['Total Jacket Losses (kWh)'].sum(),
+            'Electricity Consumed Peak (kWh, 4-9P)': result.loc[Peak, 'Electricity Consumed Total (kWh)'].sum(),
+            'Hot Water Draw Volume (gal)': result['Hot Water Draw Volume (L)'].sum() / Liters_In_Gallon}
+    if KPIs['Electricity Consumed Heat Pump (kWh)'] > 0:
+        KPIs['Average Heat Pump COP'] = KPIs['Energy Added Heat Pump (kWh)'] / KPIs['Electricity Consumed Heat Pump (kWh)']
+    else:
+        KPIs['Average Heat Pump COP'] = float('nan')
+
+    return {KPI: float(value) for KPI, value in KPIs.items()}
+
+def write_table(Table, Output_Folder, Name, Format):
+    '''
+    Writes a pd.DataFrame in the stated format and returns the path.
+    '''
+
+    os.makedirs(Output_Folder, exist_ok = True)
+    Path = os.path.join(Output_Folder, Name + Output_Formats[Format])
+    if Format == 'csv':
+        Table.to_csv(Path)
+    elif Format == 'parquet':
+        Table.to_parquet(Path)
+    else:
+        Table.to_pickle(Path)
+    print('Saved {}'.format(Path))
+
+    return Path
+
+def read_config(Path):
+    '''
+    Reads the HPWH configuration file.
+    '''
+
+    import json
+
+    with open(Path) as f:
+        return json.load(f)
+
+def simulate(Arguments):
+    '''
+    Runs the simulate command.
+    '''
+
+    import pandas as pd
+
+    Start_Time = time.time()
+    config = read_config(Arguments.config)
+    Input_Data = read_input_data(Arguments.input, Arguments.start, Arguments.end)
+    input_data, config = prepare_input_data(Input_Data, config, Arguments.set_temperature_profile,
+                                            Arguments.installation, Arguments.initial_temperature)
+    print('Simulating {} timesteps using the {} engine'.format(len(input_data), Arguments.engine))
+
+    result = run_engine(config, input_data, Arguments.engine, Arguments.workers, Arguments.checkpoint_folder,
+                        Arguments.warmup_rows, KPI_Outputs if Arguments.kpi_only else None, Arguments.update_frequency)
+
+    KPIs = calculate_kpis(result)
+    KPIs['Simulation Time (s)'] = time.time() - Start_Time
+    for KPI, value in KPIs.items():
+        print('{}: {}'.format(KPI, value))
+
+    write_table(pd.DataFrame(KPIs, index = pd.Index([Arguments.name], name = 'Simulation')),
+                Arguments.output_folder, Arguments.name + '_KPIs', Arguments.format)
+    if not Arguments.kpi_only:
+        write_table(result, Arguments.output_folder, Arguments.name, Arguments.format)
+
+def run_matrix(Arguments):
+    '''
+    Runs the matrix command.
+    '''
+
+    import pandas as pd
+    from Test_Matrix_Planner import compile_test_matrix, run_plan
+
+    if Arguments.draw_profile is None and Arguments.input_store is None:
+        raise ValueError('State the draw profiles using --draw-profile or --input-store')
+    Draw_Profile_Store = None
+    if Arguments.input_store is not None:
+        from Input_Store import Input_Store
+        Draw_Profile_Store = Input_Store(Arguments.input_store)
+
+    Test_Cases = pd.read_csv(Arguments.test_matrix, index_col = 0)
+    Plan = compile_test_matrix(Test_Cases, Arguments.installation,
+                               Arguments.draw_profile if Arguments.draw_profile is not None else '{}')
+    config = read_config(Arguments.config)
+    Time_Window = None
+    if Arguments.start is not None or Arguments.end is not None:
+        Time_Window = (Arguments.start, Arguments.end)
+
+    Results = run_plan(Plan, config, Arguments.output_folder, Arguments.name, Two_Week_Sim = Arguments.two_week,
+                       Number_Workers = Arguments.workers, Time_Window = Time_Window, KPI_Only = Arguments.kpi_only,
+                       Draw_Profile_Store = Draw_Profile_Store)
+    write_table(Test_Cases.join(Results), Arguments.output_folder, Arguments.name + '_Summary', Arguments.format)
+
+def build_parser():
+    '''
+    Returns the argparse.ArgumentParser for the command line interface.
+    '''
+
+    Parser = argparse.ArgumentParser(prog = 'flexi-hpwh', description = 'Flexi-HPWH simulations')
+    Commands = Parser.add_subparsers(dest = 'command', required = True)
+
+    Common = argparse.ArgumentParser(add_help = False)
+    Common.add_argument('--config', default = os.path.join(Root, 'Rheem_PROPH80_Config.txt'),
+                        help = 'The HPWH configuration file')
+    Common.add_argument('--installation', default = 'Open_Area',
+                        help = 'The installation configuration, from Installation_Configuration.py')
+    Common.add_argument('--output-folder', default = 'Output', help = 'The folder in which to save the results')
+    Common.add_argument('--name', default = 'Simulation', help = 'The base name of the output files')
+    Common.add_argument('--format', choices = list(Output_Formats), default = 'csv',
+                        help = 'The format of the output files')
+    Common.add_argument('--workers', type = int, default = None,
+                        help = 'The number of worker processes. Defaults to the number of cores')
+    Common.add_argument('--kpi-only', action = 'store_true',
+                        help = 'Only save the key performance indicators, not the results of each timestep')
+    Common.add_argument('--start', default = None, help = 'The first timestamp to simulate, e.g. 2020-10-01')
+    Common.add_argument('--end', default = None, help = 'The last timestamp to simulate, e.g. 2020-10-31')
+
+    Simulate_Parser = Commands.add_parser('simulate', parents = [Common], help = 'Simulate one input file')
+    Simulate_Parser.add_argument('input', help = 'The time series input file')
+    Simulate_Parser.add_argument('--engine', choices = Engines, default = 'sequential',
+                                 help = 'The simulation engine')
+    Simulate_Parser.add_argument('--set-temperature-profile', default = None,
+                                 help = 'A profile from Set_Temperature_Profiles.py. Defaults to the input file')
+    Simulate_Parser.add_argument('--initial-temperature', type = float, default = 51.7,
+                                 help = 'The initial temperature of every node, in deg C')
+    Simulate_Parser.add_argument('--checkpoint-folder', default = None,
+                                 help = 'The folder storing previous runs, used by the incremental engine')
+    Simulate_Parser.add_argument('--warmup-rows', type = int, default = 1440,
+                                 help = 'The warm-up rows of each window, used by the windowed engine')
+    Simulate_Parser.add_argument('--update-frequency', type = float, default = None,
+                                 help = 'Seconds between status updates')
+
+    Matrix_Parser = Commands.add_parser('matrix', parents = [Common], help = 'Run a test matrix')
+    Matrix_Parser.add_argument('test_matrix', help = 'The test matrix, e.g. Test_Cases.csv')
+    Matrix_Parser.add_argument('--draw-profile', default = None,
+                               help = "The path to the draw profiles. '{}' is replaced with the draw profile source")
+    Matrix_Parser.add_argument('--input-store', default = None,
+                               help = 'An input store containing the draw profiles, read instead of --draw-profile')
+    Matrix_Parser.add_argument('--two-week', action = 'store_true', help = 'Only simulate the first two weeks')
+
+    Report_Parser = Commands.add_parser('report', help = 'Create figures from stored results')
+    Report_Parser.add_argument('results_folder', help = 'The folder containing the results files')
+    Report_Parser.add_argument('--report-folder', default = None, help = 'The folder in which to save the figures')
+    Report_Parser.add_argument('--workers', type = int, default = None, help = 'The number of worker processes')
+    Report_Parser.add_argument('--overwrite', action = 'store_true', help = 'Create figures which are up to date again')
+
+    return Parser
+
+def main(Arguments = None):
+    '''
+    Runs the command line interface. Arguments defaults to sys.argv.
+    '''
+
+    Arguments = build_parser().parse_args(Arguments)
+    if Arguments.command == 'simulate':
+        simulate(Arguments)
+    elif Arguments.command == 'matrix':
+        run_matrix(Arguments)
+    else:
+        from Reports import create_report
+        create_report(Arguments.results_folder, Arguments.report_folder, Number_Workers = Arguments.workers,
+                      Overwrite = Arguments.overwrite)
+
+if __name__ == '__main__':
+    main()
@@ -8,16 +8,28 @@ be referenced in both the simulation and validation scripts as needed.
 Currently this module holds only Model_HPWH_MixedTank, representing a 1-node model with a fully mixed tank. The plan is to later add additional functions
 for different assumptions as needed, creating a library of relevant simulation models.
 
-This model has now been modified to include an occupant behavior learning algorithm. As currently implemented it tracks the electricity consumption
-of the HPWH during the full day, peak period, and off peak period. It gradually builds an understanding of how the water heater consumes electricity
-enabling the development of load shifting controls tailored to each specific site. To use this algorithm the input data must have timesteps
-at midnight (Not close to midnight, AT midnight)
+This model has now been modified to include an occupant behavior learning algorithm, Occupant_Behavior. It tracks the electricity consumption
+and hot water draws of the HPWH during the full day, peak period, and off peak period. It gradually builds an understanding of how the water
+heater is used, enabling the development of load shifting controls tailored to each specific site. Timesteps which span midnight or the
+start or end of the peak period are split between the periods, so the input data does not need timesteps at midnight.
+
+The performance of the heat pump is described by Performance_Map, which accepts either regression coefficients or tables of
+performance at gridded water and air temperatures, as published by manufacturers. Both are converted to a dense grid when the model is
+created and evaluated by bilinear interpolation, only while the heat pump is active.
+
+HPWH_Plant represents the central plant of a multifamily building, in which several tanks plumbed in series or parallel share the
+building's draws. Every tank in the plant is stored in one HPWH_MultipleNodes_Batch, so the plant is stepped as a single batch.
+
+The module only requires numpy, keeping it quick to import when starting simulation workers or embedding the model in a controller.
 
 @author: Peter Grant
 """
 
+import copy
+import math
+import time
+import warnings
 import numpy as np
-import pandas as pd
 
 Minutes_In_Hour = 60 #Conversion between hours and minutes
 Seconds_In_Minute = 60 #Conversion between minutes and seconds
@@ -27,7 +39,30 @@ Density_Water = 1000 #g/L
 kWh_In_Wh = 1/1000 #Conversion from Wh to kWh
 kWh_In_J = 2.7777777777e-7 #kWh per J
 
+# The input columns read by HPWH_MultipleNodes.calculate_timestep, if
+# present. Two rows with the same values in these columns, starting from the
+# same state, yield the same outputs. 'Timestamp' is also read, on the first
+# timestep only, to start the occupant behavior learning at its time of day,
+# so simulations using occupant behavior also depend on it
+Model_Inputs = ['Set Temperature, Heat Pump (deg C)', 'Set Temperature, Resistance (deg C)', 'Timestep (min)',
+                'Evaporator Air Inlet Temperature (deg C)', 'Ambient Temperature (deg C)',
+                'Inlet Water Temperature (deg C)', 'Hot Water Draw Volume (L)', 'Water Draw Volume (L)',
+                'Resistance Deadband (deg C)', 'Resistance Deadband, HP Active (deg C)']
+
+# The output columns written by HPWH_MultipleNodes.calculate_timestep, if present
+Model_Outputs = ['Heat Pump Heat Addition (kW)', 'PowerMultiplier', 'Electricity Consumed Heat Pump (kWh)',
+                 'Electricity Consumed Resistance (kWh)', 'Electricity Consumed Total (kWh)', 'Jacket Losses (kWh)',
+                 'Total Jacket Losses (kWh)', 'Energy Withdrawn (kWh)', 'Total Energy Withdrawn (kWh)',
+                 'Heat Added Heat Pump (kWh)', 'Total Heat Added Heat Pump (kWh)', 'Heat Added Backup (kWh)',
+                 'Total Heat Added Backup (kWh)', 'Total Heat Added (kWh)', 'Node Energy Change (kWh)',
+                 'Total Energy Change (kWh)', 'Node Temperatures (deg C)', 'Hot Water Draw Volume (L)',
+                 'Calculated Water Draw Volume (L)', 'Resistance Set Temperature (deg C)',
+                 'Resistance Set Temperature, HP Active (deg C)', 'State of Charge (%)']
+
 def Model_HPWH_MixedTank(Model, Parameters, Regression_COP, Regression_COP_Derate_Tamb):
+    # pandas is only needed here, so importing the module only requires numpy
+    import pandas as pd
+
     Coefficient_JacketLoss = Parameters[0]
     Power_Backup = Parameters[1]
     HeatAddition_HeatPump = Parameters[2]
@@ -123,6 +158,316 @@ def Model_HPWH_MixedTank(Model, Parameters, Regression_COP, Regression_COP_Derat
     
     return Model
 
+def plug_flow_advection(Node_Temperatures, Volume_Drawn, Volume_Node, T_Water_In):
+    '''
+    Moves the water in the tank up by the volume drawn, assuming plug flow.
+    Water at the inlet temperature enters the bottom of the tank and the same
+    volume leaves the top. The draw may be any fraction or multiple of the
+    node volume. The new temperature of each node is the average temperature
+    of the water which now occupies it, so the energy in the tank changes by
+    exactly the energy of the water entering minus that of the water leaving.
+
+    Uses array operations only, so it can be applied to a single tank or to
+    many tanks at once.
+
+    inputs:
+        Node_Temperatures: The temperature of each node, starting at the
+            bottom of the tank. Either a list, or an array with the nodes in
+            the last dimension and one row per tank. Expressed in deg C.
+        Volume_Drawn: The volume of water drawn during the timestep. Either a
+            single value or one value per tank. Expressed in L.
+        Volume_Node: The volume of each node. Expressed in L.
+        T_Water_In: The temperature of the water entering the tank. Either a
+            single value or one value per tank. Expressed in deg C.
+
+    outputs:
+        An array containing the new temperature of each node.
+    '''
+
+    Temperatures = np.asarray(Node_Temperatures, dtype = float)
+    Number_Nodes = Temperatures.shape[-1]
+    Shift = np.asarray(Volume_Drawn, dtype = float)[..., np.newaxis] / Volume_Node
+    T_Water_In = np.asarray(T_Water_In, dtype = float)[..., np.newaxis]
+
+    # After the draw each node holds the water which was Shift nodes below
+    # it. This is the water of at most two of the previous nodes, taking the
+    # fraction of a node drawn from the lower one. Water below the bottom of
+    # the tank is inlet water. Nodes receiving water at their own temperature
+    # keep it exactly, so well mixed parts of the tank stay uniform
+    Shape = np.broadcast_shapes(Temperatures.shape, Shift.shape, T_Water_In.shape)
+    Whole_Nodes = np.floor(Shift)
+    Fraction = Shift - Whole_Nodes
+    Temperatures_Inlet = np.concatenate([np.broadcast_to(T_Water_In, Shape[:-1] + (1,)),
+                                         np.broadcast_to(Temperatures, Shape)], axis = -1)
+    Index_Upper = np.broadcast_to(np.clip(np.arange(Number_Nodes) - Whole_Nodes + 1, 0, None).astype(int), Shape)
+    Upper = np.take_along_axis(Temperatures_Inlet, Index_Upper, -1)
+    Lower = np.take_along_axis(Temperatures_Inlet, np.maximum(Index_Upper - 1, 0), -1)
+    Mixed = np.where(Lower == Upper, Upper, Fraction * Lower + (1 - Fraction) * Upper)
+
+    return np.where(Shift > 0, Mixed, Temperatures)
+
+# The performance maps created by read_performance_map
+Performance_Maps = {}
+
+class Performance_Map():
+    '''
+    Calculates a heat pump performance multiplier, such as the heat addition
+    or power multiplier, as a function of the lower thermostat water
+    temperature and the evaporator air temperature.
+    
+    The performance may be described either by regression coefficients or by
+    a table of multipliers at gridded water and air temperatures, as
+    published by manufacturers. Either way it is converted to a dense,
+    evenly spaced grid when the map is created, so evaluating the map only
+    requires locating the grid cell and bilinear interpolation. Temperatures
+    outside the grid use the value at the nearest edge.
+    '''
+    
+    def __init__(self, Coefficients = None, Table = None, Resolution = 0.25, Water_Range = (0, 100),
+                 Air_Range = (-40, 60), Interaction = False):
+        '''
+        inputs:
+            Coefficients: The coefficients of a 2nd order regression, c0 +
+                c1 * T_water + c2 * T_air + c3 * T_water^2 + c4 * T_air^2.
+                A 6th coefficient multiplies T_water * T_air, and is only
+                used if Interaction is True.
+            Table: A dictionary containing the 'Water Temperatures (deg C)'
+                and 'Air Temperatures (deg C)' of the table, in ascending
+                order, and the 'Values' at each, with one row per water
+                temperature and one column per air temperature. The grid
+                spans the temperatures in the table, and Water_Range and
+                Air_Range are not used.
+            Resolution: The spacing of the dense grid, in deg C.
+            Water_Range: The minimum and maximum water temperature of the
+                grid used for Coefficients, in deg C.
+            Air_Range: The minimum and maximum air temperature of the grid
+                used for Coefficients, in deg C.
+            Interaction: Set to True to use the 6th coefficient.
+        '''
+        
+        if (Coefficients is None) == (Table is None):
+            raise ValueError('A performance map requires either coefficients or a table')
+        if Table is not None:
+            Water = np.asarray(Table['Water Temperatures (deg C)'], dtype = float)
+            Air = np.asarray(Table['Air Temperatures (deg C)'], dtype = float)
+            Values = np.asarray(Table['Values'], dtype = float)
+            if Values.shape != (len(Water), len(Air)):
+                raise ValueError('The performance table must contain one row per water temperature and one column per air temperature')
+            if np.any(np.diff(Water) <= 0) or np.any(np.diff(Air) <= 0):
+                raise ValueError('The temperatures of the performance table must be in ascending order')
+            Water_Range = (Water[0], Water[-1])
+            Air_Range = (Air[0], Air[-1])
+        
+        self.Water_Minimum = float(Water_Range[0])
+        self.Air_Minimum = float(Air_Range[0])
+        Number_Water = max(2, int(math.ceil((Water_Range[1] - Water_Range[0]) / Resolution)) + 1)
+        Number_Air = max(2, int(math.ceil((Air_Range[1] - Air_Range[0]) / Resolution)) + 1)
+        self.Water_Spacing = (Water_Range[1] - Water_Range[0]) / (Number_Water - 1)
+        self.Air_Spacing = (Air_Range[1] - Air_Range[0]) / (Number_Air - 1)
+        self.Water_Cells = Number_Water - 1
+        self.Air_Cells = Number_Air - 1
+        T_Water, T_Air = np.meshgrid(np.linspace(Water_Range[0], Water_Range[1], Number_Water),
+                                     np.linspace(Air_Range[0], Air_Range[1], Number_Air), indexing = 'ij')
+        
+        if Table is not None:
+            # Interpolate the table to the dense grid
+            i = np.clip(np.searchsorted(Water, T_Water, side = 'right') - 1, 0, len(Water) - 2)
+            j = np.clip(np.searchsorted(Air, T_Air, side = 'right') - 1, 0, len(Air) - 2)
+            fx = (T_Water - Water[i]) / (Water[i+1] - Water[i])
+            fy = (T_Air - Air[j]) / (Air[j+1] - Air[j])
+            self.Values = ((Values[i, j] * (1 - fx) + Values[i+1, j] * fx) * (1 - fy)
+                           + (Values[i, j+1] * (1 - fx) + Values[i+1, j+1] * fx) * fy)
+        else:
+            c = list(Coefficients)
+            self.Values = c[0] + c[1] * T_Water + c[2] * T_Air + c[3] * T_Water ** 2 + c[4] * T_Air ** 2
+            if Interaction == True:
+                if len(c) < 6:
+                    raise ValueError('The interaction term requires 6 coefficients')
+                self.Values = self.Values + c[5] * T_Water * T_Air
+    
+    def evaluate(self, T_Water, T_Air):
+        '''
+        Evaluates the map for arrays of water and air temperatures, in deg C,
+        using bilinear interpolation.
+        '''
+        
+        x = (np.clip(T_Water, self.Water_Minimum, self.Water_Minimum + self.Water_Cells * self.Water_Spacing) - self.Water_Minimum) / self.Water_Spacing
+        y = (np.clip(T_Air, self.Air_Minimum, self.Air_Minimum + self.Air_Cells * self.Air_Spacing) - self.Air_Minimum) / self.Air_Spacing
+        i = np.minimum(x.astype(int), self.Water_Cells - 1)
+        j = np.minimum(y.astype(int), self.Air_Cells - 1)
+        fx = x - i
+        fy = y - j
+        Values = self.Values
+        
+        return (Values[i, j] * (1 - fx) + Values[i+1, j] * fx) * (1 - fy) + (Values[i, j+1] * (1 - fx) + Values[i+1, j+1] * fx) * fy
+    
+    def evaluate_scalar(self, T_Water, T_Air):
+        '''
+        Evaluates the map for a single water and air temperature, in deg C.
+        Faster than evaluate for single values.
+        '''
+        
+        x = (min(max(T_Water, self.Water_Minimum), self.Water_Minimum + self.Water_Cells * self.Water_Spacing) - self.Water_Minimum) / self.Water_Spacing
+        y = (min(max(T_Air, self.Air_Minimum), self.Air_Minimum + self.Air_Cells * self.Air_Spacing) - self.Air_Minimum) / self.Air_Spacing
+        i = min(int(x), self.Water_Cells - 1)
+        j = min(int(y), self.Air_Cells - 1)
+        fx = x - i
+        fy = y - j
+        Values = self.Values
+        
+        return float((Values[i, j] * (1 - fx) + Values[i+1, j] * fx) * (1 - fy) + (Values[i, j+1] * (1 - fx) + Values[i+1, j+1] * fx) * fy)
+
+def read_performance_map(config, Name):
+    '''
+    Creates the performance map of the heat pump described in config. Maps
+    are stored in Performance_Maps, so models with the same heat pump share
+    the same grid instead of calculating it again.
+    
+    inputs:
+        config: The configuration of the HPWH.
+        Name: 'Heat Rate' or 'Power'. Uses the table in '<Name> Map' if
+            provided, otherwise the regression in '<Name> Coefficients'.
+    
+    outputs:
+        A Performance_Map.
+    '''
+    
+    Resolution = config.get('Performance Map Resolution (deg C)', 0.25)
+    Table = config.get('{} Map'.format(Name))
+    Interaction = config.get('Performance Map Interaction Term', False)
+    if Table is not None:
+        Key = (repr(Table), Resolution)
+    else:
+        Coefficients = list(config['{} Coefficients'.format(Name)])
+        Key = (repr(Coefficients), Resolution, Interaction == True)
+    
+    if Key not in Performance_Maps:
+        if Table is not None:
+            Performance_Maps[Key] = Performance_Map(Table = Table, Resolution = Resolution)
+        else:
+            # Only warned when the map is first created, not for every model
+            if len(Coefficients) > 5 and 'Performance Map Interaction Term' not in config:
+                warnings.warn("The 6th '{} Coefficients' entry is not used. Set 'Performance Map Interaction Term' "
+                              "to True to use it, or False to silence this warning".format(Name))
+            Performance_Maps[Key] = Performance_Map(Coefficients = Coefficients, Resolution = Resolution,
+                                                    Interaction = Interaction == True)
+    
+    return Performance_Maps[Key]
+
+class Occupant_Behavior():
+    '''
+    Learns how the occupants use a HPWH by tracking the electricity consumed
+    and the volume of water drawn during the full day, the peak period and
+    the off peak period. Statistics are kept for a rolling window of the most
+    recent complete days.
+    
+    Each call to update adds one timestep in constant time. The timestep is
+    assumed to use electricity and water at a constant rate, and is split
+    between the hours it spans, so timesteps do not need to line up with
+    midnight or the peak period. The statistics are calculated once at the
+    end of each day, so querying them during a simulation is also constant
+    time.
+    '''
+    
+    def __init__(self, Window_Days = 7, Peak_Period = (16, 21), Start_Time = 0):
+        '''
+        inputs:
+            Window_Days: The number of complete days included in the
+                statistics.
+            Peak_Period: The first hour of the peak period and the hour it
+                ends. The default is 4-9 PM.
+            Start_Time: The time of day at the start of the first timestep,
+                expressed in hours after midnight.
+        '''
+        
+        self.Window_Days = Window_Days
+        self.Peak_Hours = np.zeros(24, dtype = bool)
+        self.Peak_Hours[Peak_Period[0]:Peak_Period[1]] = True
+        self.Time = Start_Time
+        self.Day = 0
+        self.Days_Learned = 0
+        self.Electricity = [0.] * 24
+        self.Draw_Volume = [0.] * 24
+        # The hourly electricity and draws of each day in the window
+        self.History = np.zeros((Window_Days, 2, 24))
+        self.Statistics = {'Days Learned': 0}
+        self.Hourly_Profile = {'Electricity (kWh)': np.full(24, np.nan), 'Draw Volume (L)': np.full(24, np.nan)}
+        
+    def update(self, Timestep, Electricity, Draw_Volume):
+        '''
+        Adds one timestep.
+        
+        inputs:
+            Timestep: The duration of the timestep, in minutes.
+            Electricity: The electricity consumed during the timestep, in kWh.
+            Draw_Volume: The volume of water drawn during the timestep, in L.
+        '''
+        
+        Duration = Timestep / Minutes_In_Hour
+        if not Duration > 0:
+            return
+        Start = self.Time
+        End = Start + Duration
+        while Start < End:
+            Hour = math.floor(Start)
+            while Hour // 24 > self.Day:
+                self.complete_day()
+            Segment_End = min(End, Hour + 1)
+            Fraction = (Segment_End - Start) / Duration
+            self.Electricity[Hour % 24] += Electricity * Fraction
+            self.Draw_Volume[Hour % 24] += Draw_Volume * Fraction
+            Start = Segment_End
+        self.Time = End
+        
+    def complete_day(self):
+        '''
+        Stores the current day in the window and updates the statistics.
+        '''
+        
+        self.History[self.Days_Learned % self.Window_Days] = [self.Electricity, self.Draw_Volume]
+        self.Days_Learned += 1
+        self.Day += 1
+        self.Electricity = [0.] * 24
+        self.Draw_Volume = [0.] * 24
+        
+        Days = self.History[:min(self.Days_Learned, self.Window_Days)]
+        Totals = {'Daily': Days.sum(axis = 2),
+                  'Peak': Days[:, :, self.Peak_Hours].sum(axis = 2),
+                  'Off-Peak': Days[:, :, ~self.Peak_Hours].sum(axis = 2)}
+        self.Statistics = {'Days Learned': self.Days_Learned}
+        for Period, Total in Totals.items():
+            self.Statistics['{} Electricity (kWh)'.format(Period)] = Total[:, 0].mean()
+            self.Statistics['{} Electricity Std (kWh)'.format(Period)] = Total[:, 0].std()
+            self.Statistics['{} Draw Volume (L)'.format(Period)] = Total[:, 1].mean()
+            self.Statistics['{} Draw Volume Std (L)'.format(Period)] = Total[:, 1].std()
+        self.Hourly_Profile = {'Electricity (kWh)': Days[:, 0].mean(axis = 0), 'Draw Volume (L)': Days[:, 1].mean(axis = 0)}
+        
+    def get_statistics(self):
+        '''
+        Returns a dictionary containing the mean and standard deviation of the
+        daily, peak and off peak electricity consumption and draw volume
+        over the window, and the number of days learned. Only 'Days Learned'
+        is available before the first day is complete.
+        '''
+        
+        return self.Statistics
+    
+    def get_hourly_profile(self):
+        '''
+        Returns a dictionary containing the mean electricity consumption and
+        draw volume of each hour of the day over the window, each as an array
+        starting at midnight.
+        '''
+        
+        return self.Hourly_Profile
+    
+    def get_current_day(self):
+        '''
+        Returns the electricity consumed and volume drawn so far today.
+        '''
+        
+        return {'Electricity (kWh)': sum(self.Electricity), 'Draw Volume (L)': sum(self.Draw_Volume)}
+
 class HPWH_MultipleNodes():
     '''
     This tool represents a multi node model of electric HPWHs. It uses an 
@@ -202,6 +547,12 @@ class HPWH_MultipleNodes():
                     with ambient air and tank water temperatures. These 
                     coefficients define a 2nd order regression definin how the
                     heat rate is adjusted to match the current conditions.
+                    See Performance_Map. Not needed if 'Heat Rate Map' is
+                    provided.
+                Heat Rate Map: Optional. A table of heat rate multipliers
+                    at gridded water and air temperatures, in the format
+                    used by Performance_Map, used instead of the
+                    coefficients.
                 Heat Pump Activation Deadband (deg C): The deadband used for
                     the heat pump. The HPWH will activate the heat pump if the
                     water temperature is below the set temperature minus this
@@ -218,7 +569,18 @@ class HPWH_MultipleNodes():
                     function of the air and water temperatures. These 
                     coefficients define a 2nd order regression that modifies
                     the heat addition rate to find the current power 
-                    consumption.
+                    consumption. Not needed if 'Power Map' is provided.
+                Power Map: Optional. A table of power multipliers, in the
+                    same format as 'Heat Rate Map'.
+                Performance Map Resolution (deg C): Optional. The spacing of
+                    the grid used to evaluate the performance maps. Defaults
+                    to 0.25 deg C.
+                Performance Map Interaction Term: Optional. Set to True to
+                    use the 6th heat rate or power coefficient, which
+                    multiplies the product of the water and air temperatures.
+                    It is not used by default. If this is not stated and a
+                    6th coefficient is provided, a warning is issued once per
+                    set of coefficients.
                 Set Temperature (deg C): The set temperature of the HPWH.
                 Varying Set Temperature: States whether the set temperature
                     in the simulation varies or not. Used for load shifting
@@ -236,6 +598,71 @@ class HPWH_MultipleNodes():
                     thermostat is located.
                 Number of Nodes: The number of nodes representing different 
                     sections of the water in the tank used i nthe simulation.
+                Mixing Valve Set Temperature (deg C): Optional. The set
+                    temperature of a mixing valve at the outlet of the HPWH.
+                    If provided, the model calculates the hot water draw
+                    volume each timestep from the mixed 'Water Draw Volume
+                    (L)' input and the current upper thermostat temperature.
+                Adaptive Stratification Tolerance (deg C): Optional. If
+                    provided, adjacent nodes whose temperatures are within
+                    this tolerance are merged into a single layer and
+                    simulated together. Layers are split again when draws or
+                    heating create gradients. The thermostat nodes are never
+                    merged. Reduces the simulation time of tanks with many
+                    nodes, which are often well mixed after a recovery. Only
+                    used with the 'Explicit' integration scheme. A tolerance
+                    of 0 gives the same results as simulating every node.
+                    Larger tolerances can move the stratification layer below
+                    which the heat pump adds heat, so compare the results to
+                    a tolerance of 0 before relying on them.
+                Integration Scheme: Optional. 'Explicit' (default) updates
+                    each node with the energy transfers calculated from the
+                    temperatures at the start of the timestep. This becomes
+                    unstable when a draw exceeds the volume of a node, so the
+                    timestep must be kept short. 'Operator Split' applies the
+                    heating, the jacket losses and the water flow one after
+                    the other, using the exact solution for the jacket losses
+                    and an implicit solution for the water flow. It remains
+                    stable and conserves energy at 1-5 minute timesteps.
+                Draw Advection: Optional. The method used to move water
+                    through the tank during draws with the 'Operator Split'
+                    integration scheme. 'Implicit' (default) uses an implicit
+                    upwind solution, which smooths the temperature profile
+                    when draws are large. 'Plug Flow' moves the water up by
+                    exactly the volume drawn, keeping sharp temperature
+                    gradients between the inlet water and the stored water.
+                Maximum Control Timestep (min): Optional. If provided,
+                    timesteps longer than this are re-simulated in sub-steps
+                    of at most this length whenever the heat pump or
+                    resistance elements would switch on or off during the
+                    timestep. This keeps the control response of long
+                    timesteps close to that of short timesteps.
+                State of Charge Delivery Temperature (deg C): Optional. Only
+                    water above this temperature is counted as usable stored
+                    energy in the state of charge. Defaults to the mixing
+                    valve set temperature if provided, otherwise 43.3 deg C
+                    (110 deg F).
+                State of Charge Maximum Temperature (deg C): Optional. The
+                    state of charge is 100% when the whole tank is at this
+                    temperature. Defaults to the highest configured set
+                    temperature. Use the load up set temperature when
+                    simulating load shifting to keep the state of charge below
+                    100%. The state of charge is NaN if this does not exceed
+                    the delivery temperature.
+                Occupant Behavior Window (days): Optional. If provided, the
+                    model learns the electricity consumption and water draws
+                    of the site over this many days using Occupant_Behavior.
+                    The learned behavior is available to the control logic
+                    in self.Occupant_Behavior.
+                Occupant Behavior Peak Period (hr): Optional. The first hour
+                    of the peak period and the hour it ends. Defaults to
+                    [16, 21].
+                Start Time (hr): Optional. The time of day at the start of the
+                    simulation, in hours after midnight. Used to assign
+                    timesteps to hours when learning occupant behavior if the
+                    inputs do not contain a 'Timestamp' column, in which case
+                    the time of day of the first timestamp is used instead.
+                    Defaults to 0.
         '''
         
         self.Coefficient_JacketLoss = config['Jacket Loss Coefficient (W/K)'] / 1000
@@ -243,23 +670,24 @@ class HPWH_MultipleNodes():
         self.Upper_Resistance_Deadband = config['Resistance Deadband (deg C)']
         self.Upper_Resistance_Deadband_HPActive = config['Resistance Deadband, HP Active (deg C)']
         self.HeatAddition_HeatPump = config['Heat Pump Heat Addition Rate (W)'] / 1000
-        self.HeatRate_HP_Coefficients = config['Heat Rate Coefficients']
+        self.HeatRate_Map = read_performance_map(config, 'Heat Rate')
         self.HeatPump_Activation_Deadband = config['Heat Pump Activation Deadband (deg C)']
         self.HeatPump_ActivationDeadband_RecentSetChange = config['Heat Pump Activation Deadband, Recent Set Temperature Change (deg C)']
         self.HeatPump_ActivationDeadband_LowStratification = config['Heat Pump Activation Deadband, Low Stratification (deg C)']
         self.HeatPump_SetChange_TimeWindow = config['Heat Pump Deadband Time Period (s)']
         self.ThermalMass_Tank = config['Volume Tank (L)'] * SpecificHeat_Water * Density_Water * kWh_In_J
-        self.Power_Coefficients = config['Power Coefficients']
+        self.Power_Map = read_performance_map(config, 'Power')
         self.Set_Temperature_HeatPump = config['Set Temperature, Heat Pump (deg C)']
         self.Set_Temperature_Resistance = config['Set Temperature, Resistance (deg C)']
         self.Varying_Set_Temperature = config['Varying Set Temperature']
         self.Cutoff_Temperature = config['Cutoff Temperature (deg C)']
-        self.Node_Temperatures = config['Node Temperatures (deg C)']
+        self.Node_Temperatures = list(config['Node Temperatures (deg C)'])
         self.Upper_Thermostat_Node = config['Upper Thermostat Node']
         self.Lower_Thermostat_Node = config['Lower Thermostat Node']
         self.Number_Nodes = config['Number of Nodes']
         self.Time_Since_Set_Change = self.HeatPump_SetChange_TimeWindow + 1
         self.Control_Logic_Model = config['Control Logic Model']
+        self.Temperature_MixingValve_Set = config.get('Mixing Valve Set Temperature (deg C)', None)
 #        self.Tank_Model = config['Tank Model'] # Commented out b/c this capability is not yet implemented
 #        self.Resistance_Lockout_Time = config['Resistance Lockout Time (min)']
 #        self.Time_Since_HeatPump_Activation = 0
@@ -270,7 +698,460 @@ class HPWH_MultipleNodes():
         
         self.ThermalMass_Node = self.ThermalMass_Tank / self.Number_Nodes
         self.JacketLoss_Node = self.Coefficient_JacketLoss / self.Number_Nodes
-    
+        self.Volume_Node = config['Volume Tank (L)'] / self.Number_Nodes
+
+        # Layers of nodes with the same temperature, stored as
+        # [First Node, Number of Nodes, Temperature]. Only used in adaptive
+        # stratification mode, in which the layers are the state of the tank
+        # and self.Node_Temperatures only holds the thermostat temperatures
+        self.Stratification_Tolerance = config.get('Adaptive Stratification Tolerance (deg C)', None)
+        self.Thermostat_Nodes = {self.Upper_Thermostat_Node, self.Lower_Thermostat_Node}
+        self.Layers = None
+        self.Integration_Scheme = config.get('Integration Scheme', 'Explicit')
+        self.Draw_Advection = config.get('Draw Advection', 'Implicit')
+        self.Maximum_Control_Timestep = config.get('Maximum Control Timestep (min)', None)
+        self.Substepping = False
+        if self.Integration_Scheme not in ['Explicit', 'Operator Split']:
+            raise ValueError('Unknown Integration Scheme {}'.format(self.Integration_Scheme))
+        if self.Draw_Advection not in ['Plug Flow', 'Implicit']:
+            raise ValueError('Unknown Draw Advection {}'.format(self.Draw_Advection))
+        if self.Stratification_Tolerance is not None and self.Integration_Scheme == 'Explicit':
+            self.initialize_layers()
+
+        # The usable energy stored in the tank, relative to a full tank.
+        # Updated at the end of each timestep so the control logic can use it
+        self.Temperature_Delivery = config.get('State of Charge Delivery Temperature (deg C)',
+                                               self.Temperature_MixingValve_Set if self.Temperature_MixingValve_Set is not None else 43.3)
+        Temperature_Maximum = config.get('State of Charge Maximum Temperature (deg C)',
+                                         max(self.Set_Temperature_HeatPump, self.Set_Temperature_Resistance))
+        # The state of charge is undefined if no usable energy can be stored
+        if Temperature_Maximum > self.Temperature_Delivery:
+            self.Energy_Maximum = self.ThermalMass_Tank * (Temperature_Maximum - self.Temperature_Delivery)
+        else:
+            self.Energy_Maximum = np.nan
+        self.State_Of_Charge = self.calculate_state_of_charge()
+
+        self.Occupant_Behavior = None
+        if config.get('Occupant Behavior Window (days)') is not None:
+            self.Occupant_Behavior = Occupant_Behavior(config['Occupant Behavior Window (days)'],
+                                                       config.get('Occupant Behavior Peak Period (hr)', (16, 21)),
+                                                       config.get('Start Time (hr)', 0))
+        # The start time is read from the first timestamp when it is simulated
+        self.Occupant_Start_Pending = self.Occupant_Behavior is not None and 'Timestamp' in self.col_indx
+
+    def get_state(self):
+        '''
+        Returns a copy of the attributes which change during a simulation.
+        Together with the configuration this fully describes the HPWH at the
+        current timestep, allowing a simulation to be paused and resumed or
+        restarted from a different point in time.
+
+        outputs:
+            A dictionary containing the node temperatures, the set
+            temperatures, the time since the last set temperature change, and
+            the heat pump and resistance element status. Also contains the
+            learned occupant behavior, if used. The resistance deadbands are
+            not included because they are read from the configuration or the
+            inputs of each timestep.
+        '''
+
+        State = {'Node_Temperatures': self.get_node_temperatures(),
+                 'Set_Temperature_HeatPump': self.Set_Temperature_HeatPump,
+                 'Set_Temperature_Resistance': self.Set_Temperature_Resistance,
+                 'Time_Since_Set_Change': self.Time_Since_Set_Change,
+                 'HeatPump_Active': self.HeatPump_Active,
+                 'Resistance_Active': self.Resistance_Active}
+        if self.Occupant_Behavior is not None:
+            State['Occupant_Behavior'] = copy.deepcopy(self.Occupant_Behavior)
+
+        return State
+
+    def set_state(self, state):
+        '''
+        Restores a state previously returned by get_state.
+
+        inputs:
+            state: A dictionary in the format returned by get_state.
+        '''
+
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+        self.Node_Temperatures = list(state['Node_Temperatures'])
+        if 'Occupant_Behavior' in state:
+            self.Occupant_Behavior = copy.deepcopy(state['Occupant_Behavior'])
+            self.Occupant_Start_Pending = False
+        if self.Layers is not None:
+            self.initialize_layers()
+        self.State_Of_Charge = self.calculate_state_of_charge()
+
+    def calculate_state_of_charge(self):
+        '''
+        Calculates the state of charge of the tank: the energy stored in the
+        water above the delivery temperature, relative to the energy stored
+        when the whole tank is at the maximum temperature. Nodes below the
+        delivery temperature do not count. Uses the layers in adaptive
+        stratification mode, so each layer is only counted once.
+
+        outputs:
+            The state of charge, expressed in %.
+        '''
+
+        T_Delivery = self.Temperature_Delivery
+        if self.Layers is not None:
+            Excess = sum(Count * (Temperature - T_Delivery) for Start, Count, Temperature in self.Layers if Temperature > T_Delivery)
+        else:
+            Excess = sum(Temperature - T_Delivery for Temperature in self.Node_Temperatures if Temperature > T_Delivery)
+
+        return 100 * self.ThermalMass_Node * Excess / self.Energy_Maximum
+
+    def get_node_temperatures(self):
+        '''
+        Returns the temperature of each node, starting at the bottom of the
+        tank. In adaptive stratification mode the temperatures are expanded
+        from the layers.
+        '''
+
+        if self.Layers is None:
+            return list(self.Node_Temperatures)
+
+        Node_Temperatures = []
+        for Start, Count, Temperature in self.Layers:
+            Node_Temperatures += [Temperature] * Count
+
+        return Node_Temperatures
+
+    def initialize_layers(self):
+        '''
+        Creates the layers used in adaptive stratification mode from the
+        node temperatures in self.Node_Temperatures. Each node starts as its
+        own layer, then adjacent layers within the tolerance are merged.
+        '''
+
+        self.Layers = [[Node, 1, Temperature] for Node, Temperature in enumerate(self.Node_Temperatures)]
+        self.merge_layers()
+
+    def merge_layers(self):
+        '''
+        Merges adjacent layers whose temperatures differ by no more than the
+        stratification tolerance, whichever layer is warmer. The temperature
+        of the merged layer is the mass-weighted average of the two layers,
+        conserving the energy in the tank. Layers containing a thermostat
+        node are never merged, so each thermostat node remains a layer of its
+        own. Their temperatures are stored in self.Node_Temperatures, keyed by
+        node, for the control logic. Gradients smaller than the tolerance
+        are treated as mixed, so the heating logic only sees stratification
+        layers larger than the tolerance.
+        '''
+
+        Merged = [list(self.Layers[0])]
+        Stratified = False
+        for Start, Count, Temperature in self.Layers[1:]:
+            Previous = Merged[-1]
+            # The heating logic heats the nodes below the first layer which
+            # is warmer than the layer below it, so that boundary is kept.
+            # Above it a stratified tank is slightly warmer at each node, so
+            # layers merge regardless of which one is warmer
+            Boundary = not Stratified and Temperature > Previous[2]
+            Stratified = Stratified or Boundary
+            if (abs(Previous[2] - Temperature) <= self.Stratification_Tolerance and not Boundary
+                and Previous[0] not in self.Thermostat_Nodes and Start not in self.Thermostat_Nodes):
+                if Temperature != Previous[2]:
+                    Previous[2] = (Previous[2] * Previous[1] + Temperature * Count) / (Previous[1] + Count)
+                Previous[1] += Count
+            else:
+                Merged.append([Start, Count, Temperature])
+        self.Layers = Merged
+        self.Node_Temperatures = {Start: Temperature for Start, Count, Temperature in Merged if Start in self.Thermostat_Nodes}
+
+    def split_layer(self, Node):
+        '''
+        Splits the layer containing Node so that a new layer starts at Node.
+        Used when heating is applied to only part of a layer.
+        '''
+
+        for i, (Start, Count, Temperature) in enumerate(self.Layers):
+            if Start < Node < Start + Count:
+                self.Layers[i:i+1] = [[Start, Node - Start, Temperature], [Node, Start + Count - Node, Temperature]]
+                return
+
+    def split_layers_for_draw(self, T_Water_In):
+        '''
+        Splits the bottom node from each layer which receives water at a
+        different temperature during a draw. Assuming plug flow, only the
+        bottom node of a layer changes temperature, the nodes above it receive
+        water at their own temperature.
+        '''
+
+        Layers = []
+        T_Below = T_Water_In
+        for Start, Count, Temperature in self.Layers:
+            if Count > 1 and Temperature != T_Below:
+                Layers.append([Start, 1, Temperature])
+                Layers.append([Start + 1, Count - 1, Temperature])
+            else:
+                Layers.append([Start, Count, Temperature])
+            T_Below = Temperature
+        self.Layers = Layers
+
+    def count_nodes_below_stratification(self, Max_Nodes):
+        '''
+        Counts the nodes below the stratification layer, starting from the
+        bottom of the tank and stopping at the first node which is warmer than
+        the node below it.
+
+        inputs:
+            Max_Nodes: The maximum number of nodes which may be counted.
+
+        outputs:
+            The number of nodes below the stratification layer.
+        '''
+
+        if self.Layers is None:
+            Number_Nodes = 1
+            for node in range(1, Max_Nodes):
+                if self.Node_Temperatures[node] > self.Node_Temperatures[node-1]:
+                    break
+                else:
+                    Number_Nodes += 1
+            return Number_Nodes
+
+        # All nodes in a layer share the same temperature, so only the
+        # boundaries between layers can be stratification layers
+        Number_Nodes = self.Layers[0][1]
+        for i in range(1, len(self.Layers)):
+            if Number_Nodes >= Max_Nodes or self.Layers[i][2] > self.Layers[i-1][2]:
+                break
+            Number_Nodes += self.Layers[i][1]
+
+        return min(Number_Nodes, Max_Nodes)
+
+    def calculate_layers(self, data, Heating_HeatPump, Heating_Resistance, Heating_Boundaries):
+        '''
+        Calculates the heat transfer and new temperature of each layer in
+        adaptive stratification mode. Uses the same plug flow assumptions as
+        the node by node calculations in calculate_timestep, but calculates
+        each layer once.
+
+        inputs:
+            data: The row of data for the current timestep.
+            Heating_HeatPump: The heat pump heat addition rate of each node.
+            Heating_Resistance: The resistance element heat addition rate of
+                each node.
+            Heating_Boundaries: The nodes above the last node heated by the
+                heat pump or resistance elements. Layers are split at these
+                nodes so that each layer is heated evenly.
+
+        outputs:
+            A list containing the outputs of each layer, stored as [First
+            Node, Number of Nodes, Jacket Losses, Energy Withdrawn, Energy
+            Added Heat Pump, Energy Added Resistance, Energy Change, New
+            Temperature]. The energies are those of each node in the layer.
+            expand_layers converts them to one value per node.
+        '''
+
+        # Convert to floats, which are faster than numpy scalars in the loop
+        dt = float(data[self.col_indx['Timestep (min)']]) / Minutes_In_Hour
+        T_Ambient = float(data[self.col_indx['Ambient Temperature (deg C)']])
+        T_Water_In = float(data[self.col_indx['Inlet Water Temperature (deg C)']])
+        ThermalMassRemoved = float(data[self.col_indx['Hot Water Draw Volume (L)']]) * Density_Water * SpecificHeat_Water
+        JacketLoss_Node = self.JacketLoss_Node
+        ThermalMass_Node = self.ThermalMass_Node
+
+        for Node in Heating_Boundaries:
+            self.split_layer(Node)
+        if ThermalMassRemoved != 0:
+            self.split_layers_for_draw(T_Water_In)
+
+        Outputs = []
+        T_Below = T_Water_In
+        for Layer in self.Layers:
+            Start, Count, Temperature = Layer
+            Losses = -JacketLoss_Node * (Temperature - T_Ambient) * dt
+            Energy_Addition_HP = max(0, Heating_HeatPump[Start] * dt)
+            Energy_Addition_ER = max(0, Heating_Resistance[Start] * dt)
+            Withdrawn = ThermalMassRemoved * (T_Below - Temperature) * kWh_In_J
+            EnergyChange = Losses + Energy_Addition_HP + Energy_Addition_ER + Withdrawn
+            T_Below = Temperature
+            Layer[2] = EnergyChange / ThermalMass_Node + Temperature
+            Outputs.append([Start, Count, Losses, Withdrawn, Energy_Addition_HP, Energy_Addition_ER, EnergyChange,
+                            Layer[2]])
+
+        self.merge_layers()
+
+        return Outputs
+
+    def expand_layers(self, Outputs):
+        '''
+        Expands the outputs of calculate_layers to one value per node. Only
+        used when writing the outputs of a timestep.
+
+        inputs:
+            Outputs: The outputs returned by calculate_layers.
+
+        outputs:
+            The jacket losses, energy withdrawn, energy added by the heat pump,
+            energy added by the resistance elements, total energy change and
+            new temperature of each node, starting at the bottom of the tank.
+        '''
+
+        Outputs = np.array(Outputs, dtype = float)
+        Node_Outputs = np.repeat(Outputs[:, 2:], Outputs[:, 1].astype(int), axis = 0)
+
+        return tuple(Node_Outputs.T.tolist())
+
+    def calculate_hot_water_draw(self, data):
+        '''
+        Calculates the volume of hot water withdrawn from the tank to supply a
+        mixing valve with the mixed water draw volume. The hot water is
+        assumed to leave the tank at the upper thermostat temperature, and
+        never exceeds the mixed water draw volume.
+        
+        inputs:
+            data: The data for the current timestep. Must contain 'Water Draw
+                  Volume (L)', 'Inlet Water Temperature (deg C)' and 'Hot
+                  Water Draw Volume (L)'. The calculated hot water draw volume
+                  is stored in 'Hot Water Draw Volume (L)', and in 'Calculated
+                  Water Draw Volume (L)' before limiting if that column exists.
+        '''
+        
+        Volume = data[self.col_indx['Water Draw Volume (L)']]
+        T_Inlet = data[self.col_indx['Inlet Water Temperature (deg C)']]
+        Calculated = (Volume * T_Inlet - Volume * self.Temperature_MixingValve_Set) / (T_Inlet - self.Node_Temperatures[self.Upper_Thermostat_Node])
+        if 'Calculated Water Draw Volume (L)' in self.col_indx:
+            data[self.col_indx['Calculated Water Draw Volume (L)']] = Calculated
+        data[self.col_indx['Hot Water Draw Volume (L)']] = min(Calculated, Volume)
+
+    def calculate_operator_split(self, data, Heating_HeatPump, Heating_Resistance):
+        '''
+        Calculates the heat transfer and new temperature of each node using
+        operator splitting. The heat added by the heat pump and resistance
+        elements is applied first, then the jacket losses, then the water
+        flow. Each step is solved in a way that remains stable for any
+        timestep:
+            -The jacket losses use the exact exponential decay of each node
+             towards the ambient temperature.
+            -The water flow uses an implicit upwind solution, assuming plug
+             flow. Each node is mixed with the water entering from the node
+             below at its new temperature, so draws larger than a node do not
+             overshoot. The energy leaving the tank is the draw volume at the
+             new temperature of the top node, conserving energy. If 'Draw
+             Advection' is 'Plug Flow' the water is instead moved up by
+             exactly the volume drawn using plug_flow_advection.
+
+        inputs:
+            data: The row of data for the current timestep.
+            Heating_HeatPump: The heat pump heat addition rate of each node.
+            Heating_Resistance: The resistance element heat addition rate of
+                each node.
+
+        outputs:
+            The jacket losses, energy withdrawn, energy added by the heat pump,
+            energy added by the resistance elements, total energy change and
+            new temperature of each node, starting at the bottom of the tank.
+        '''
+
+        dt = data[self.col_indx['Timestep (min)']] / Minutes_In_Hour
+        T_Ambient = data[self.col_indx['Ambient Temperature (deg C)']]
+        T_Water_In = data[self.col_indx['Inlet Water Temperature (deg C)']]
+        Volume_Drawn = data[self.col_indx['Hot Water Draw Volume (L)']]
+
+        Temperatures = np.array(self.Node_Temperatures, dtype = float)
+
+        # Heating at a constant rate during the timestep
+        EnergyAdded_HP = np.maximum(0, np.array(Heating_HeatPump, dtype = float) * dt)
+        EnergyAdded_ER = np.maximum(0, np.array(Heating_Resistance, dtype = float) * dt)
+        Temperatures_Heated = Temperatures + (EnergyAdded_HP + EnergyAdded_ER) / self.ThermalMass_Node
+
+        # Exact solution for the jacket losses of each node
+        Decay = np.exp(-self.JacketLoss_Node * dt / self.ThermalMass_Node)
+        Temperatures_Cooled = T_Ambient + (Temperatures_Heated - T_Ambient) * Decay
+        JacketLosses = (Temperatures_Cooled - Temperatures_Heated) * self.ThermalMass_Node
+
+        # Move the water up the tank
+        Node_Temperatures = list(Temperatures_Cooled)
+        if Volume_Drawn > 0 and self.Draw_Advection == 'Plug Flow':
+            Node_Temperatures = list(plug_flow_advection(Temperatures_Cooled, Volume_Drawn, self.Volume_Node, T_Water_In))
+        elif Volume_Drawn > 0:
+            # Implicit solution, from the bottom of the tank up
+            Courant = Volume_Drawn / self.Volume_Node
+            T_Below = T_Water_In
+            for Node in range(self.Number_Nodes):
+                Node_Temperatures[Node] = (Node_Temperatures[Node] + Courant * T_Below) / (1 + Courant)
+                T_Below = Node_Temperatures[Node]
+        EnergyWithdrawn = (np.array(Node_Temperatures) - Temperatures_Cooled) * self.ThermalMass_Node
+
+        EnergyChange_Total = EnergyAdded_HP + EnergyAdded_ER + JacketLosses + EnergyWithdrawn
+        self.Node_Temperatures = Node_Temperatures
+
+        return (list(JacketLosses), list(EnergyWithdrawn), list(EnergyAdded_HP), list(EnergyAdded_ER),
+                list(EnergyChange_Total), list(Node_Temperatures))
+
+    def calculate_substeps(self, data):
+        '''
+        Simulates a timestep which is longer than the maximum control timestep.
+        The full timestep is simulated first. If the heat pump or resistance
+        elements would switch on or off by the end of it, the timestep is
+        instead simulated in sub-steps of at most the maximum control timestep
+        so that the switch happens at the right time.
+
+        The energy and volume outputs of the sub-steps are summed. The
+        temperature outputs are those at the end of the last sub-step.
+
+        inputs:
+            data: The row of data for the current timestep.
+
+        outputs:
+            Returns data containing the outputs of the timestep.
+        '''
+
+        State = self.get_state()
+        self.Substepping = True
+        try:
+            Result = self.calculate_timestep(data.copy())
+
+            # Check whether the control logic switches the heat pump or
+            # resistance elements during the timestep
+            State_End = self.get_state()
+            Heating = (self.HeatPump_Active, self.Resistance_Active)
+            self.control_logic(self.Control_Logic_Model, data)
+            Switched = (self.HeatPump_Active, self.Resistance_Active) != Heating
+            self.set_state(State_End)
+            if not Switched:
+                return Result
+
+            self.set_state(State)
+            Timestep = data[self.col_indx['Timestep (min)']]
+            Number_Substeps = int(np.ceil(Timestep / self.Maximum_Control_Timestep))
+            Substep = data.copy()
+            Substep[self.col_indx['Timestep (min)']] = Timestep / Number_Substeps
+            for column in ['Hot Water Draw Volume (L)', 'Water Draw Volume (L)']:
+                if column in self.col_indx:
+                    Substep[self.col_indx[column]] = data[self.col_indx[column]] / Number_Substeps
+
+            Extensive_Outputs = ['Hot Water Draw Volume (L)', 'Calculated Water Draw Volume (L)',
+                                 'Electricity Consumed Heat Pump (kWh)', 'Electricity Consumed Resistance (kWh)',
+                                 'Electricity Consumed Total (kWh)', 'Jacket Losses (kWh)',
+                                 'Total Jacket Losses (kWh)', 'Energy Withdrawn (kWh)', 'Total Energy Withdrawn (kWh)',
+                                 'Heat Added Heat Pump (kWh)', 'Total Heat Added Heat Pump (kWh)',
+                                 'Heat Added Backup (kWh)', 'Total Heat Added Backup (kWh)', 'Total Heat Added (kWh)',
+                                 'Node Energy Change (kWh)', 'Total Energy Change (kWh)']
+            Extensive_Outputs = [self.col_indx[column] for column in Extensive_Outputs if column in self.col_indx]
+            Totals = {}
+            for i in range(Number_Substeps):
+                Result = self.calculate_timestep(Substep.copy())
+                for column in Extensive_Outputs:
+                    Value = np.asarray(Result[column], dtype = float)
+                    Totals[column] = Totals[column] + Value if column in Totals else Value
+        finally:
+            self.Substepping = False
+
+        # Per-node outputs are stored as lists, totals as floats
+        for column, Value in Totals.items():
+            Result[column] = list(Value) if Value.ndim > 0 else float(Value)
+        Result[self.col_indx['Timestep (min)']] = Timestep
+
+        return Result
+
     def calculate_HP_power(self, T_Tank_Lower, T_Ambient):
         '''
         Calculates the power multiplier used to determine the power consumed by
@@ -287,7 +1168,7 @@ class HPWH_MultipleNodes():
             addition.
         '''
         
-        return self.Power_Coefficients[0] + self.Power_Coefficients[1] * T_Tank_Lower + self.Power_Coefficients[2] * T_Ambient + self.Power_Coefficients[3] * T_Tank_Lower ** 2 + self.Power_Coefficients[4] * T_Ambient ** 2
+        return self.Power_Map.evaluate_scalar(T_Tank_Lower, T_Ambient)
     
     def calculate_HP_HeatAddition(self, T_Tank_Lower, T_Ambient):
         '''
@@ -305,7 +1186,7 @@ class HPWH_MultipleNodes():
             addition.
         '''        
         
-        return self.HeatRate_HP_Coefficients[0] + self.HeatRate_HP_Coefficients[1] * T_Tank_Lower + self.HeatRate_HP_Coefficients[2] * T_Ambient + self.HeatRate_HP_Coefficients[3] * T_Tank_Lower ** 2 + self.HeatRate_HP_Coefficients[4] * T_Ambient ** 2
+        return self.HeatRate_Map.evaluate_scalar(T_Tank_Lower, T_Ambient)
 
     def control_logic(self, control_logic_model, data):
         '''
@@ -315,6 +1196,8 @@ class HPWH_MultipleNodes():
         inputs:
             control_logic_model: The name of the model to be used. Typically this matches control
                                  logic of a specific manufacturer & model HPWH.
+        The control logic may also use self.State_Of_Charge, the state of
+        charge of the tank at the start of the timestep.
                             
         ouotputs:
             Updates attributes of the HPWH
@@ -475,7 +1358,18 @@ class HPWH_MultipleNodes():
                    Inlet Water Temperature (deg C): The temperature of the 
                        water entering the HPWH when how water is consumed.
                    Hot Water Draw Volume (L): The volume of hot water withdrawn
-                       from the tank during the current timestep.
+                       from the tank during the current timestep. Calculated
+                       by the model if the configuration states a mixing
+                       valve set temperature.
+            4. Optionally contain the following data points:
+                   Water Draw Volume (L): The volume of mixed water used
+                       during the current timestep. Required if the
+                       configuration states a mixing valve set temperature.
+                   Resistance Deadband (deg C): Replaces the resistance
+                       deadband from the configuration for this timestep.
+                   Resistance Deadband, HP Active (deg C): Replaces the
+                       resistance deadband used while the heat pump is active
+                       for this timestep.
         
         This function uses the following steps:
             1. Initialize lists storing data for the active timestep.
@@ -494,6 +1388,17 @@ class HPWH_MultipleNodes():
         
         '''
         
+        if self.Occupant_Start_Pending:
+            Start = np.datetime64(data[self.col_indx['Timestamp']], 'ms')
+            self.Occupant_Behavior.Time = (Start - Start.astype('datetime64[D]')) / np.timedelta64(1, 'h')
+            self.Occupant_Start_Pending = False
+
+        # Simulate long timesteps in shorter sub-steps if the control logic
+        # switches during the timestep
+        if (self.Maximum_Control_Timestep is not None and not self.Substepping
+            and data[self.col_indx['Timestep (min)']] > self.Maximum_Control_Timestep):
+            return self.calculate_substeps(data)
+
         # Initialize lists for storing output data
         JacketLosses = []
         EnergyWithdrawn = []
@@ -504,13 +1409,38 @@ class HPWH_MultipleNodes():
         
         # Set the type of data to ensure that outputs can be stored
         data = data.astype('object')
+
+        # Apply the resistance deadbands for this timestep, if provided
+        if 'Resistance Deadband (deg C)' in self.col_indx:
+            self.Upper_Resistance_Deadband = data[self.col_indx['Resistance Deadband (deg C)']]
+        if 'Resistance Deadband, HP Active (deg C)' in self.col_indx:
+            self.Upper_Resistance_Deadband_HPActive = data[self.col_indx['Resistance Deadband, HP Active (deg C)']]
+
+        # Calculate the volume of hot water needed to supply the mixing valve
+        # at the current upper thermostat temperature
+        if self.Temperature_MixingValve_Set is not None:
+            self.calculate_hot_water_draw(data)
                 
-        # Identify the heat addition rate of the heat pump if active under
-        # current conditions
-        Heat_Addition_HP = self.HeatAddition_HeatPump * self.calculate_HP_HeatAddition(self.Node_Temperatures[self.Lower_Thermostat_Node], data[self.col_indx['Evaporator Air Inlet Temperature (deg C)']])
-        data[self.col_indx['Heat Pump Heat Addition (kW)']] = Heat_Addition_HP
-        
         self.control_logic(self.Control_Logic_Model, data)
+        
+        # Identify the heat addition rate of the heat pump under current
+        # conditions. The performance map is only evaluated when the heat
+        # pump is active
+        if self.HeatPump_Active == True:
+            Heat_Addition_HP = self.HeatAddition_HeatPump * self.calculate_HP_HeatAddition(self.Node_Temperatures[self.Lower_Thermostat_Node], data[self.col_indx['Evaporator Air Inlet Temperature (deg C)']])
+        else:
+            Heat_Addition_HP = 0
+        data[self.col_indx['Heat Pump Heat Addition (kW)']] = Heat_Addition_HP
+        # The resistance set temperatures are reported relative to the set
+        # temperature of this row, which self.Set_Temperature_Resistance
+        # only follows when 'Varying Set Temperature' is 1
+        if 'Resistance Set Temperature (deg C)' in self.col_indx:
+            if 'Set Temperature, Resistance (deg C)' in self.col_indx:
+                Set_Temperature = data[self.col_indx['Set Temperature, Resistance (deg C)']]
+            else:
+                Set_Temperature = self.Set_Temperature_Resistance
+            data[self.col_indx['Resistance Set Temperature (deg C)']] = Set_Temperature - self.Upper_Resistance_Deadband
+            data[self.col_indx['Resistance Set Temperature, HP Active (deg C)']] = Set_Temperature - self.Upper_Resistance_Deadband_HPActive
 
         # Start heating logic
         # Assumptions to emulate observed Rheem operation:
@@ -523,6 +1453,7 @@ class HPWH_MultipleNodes():
         #       stratification layer if the layer is low in the tank
         # Set resistance element heat rates based on status
         Heating_Resistance = []
+        Heating_Boundaries = []
         
         if self.Resistance_Active == True:
             if data[self.col_indx['Evaporator Air Inlet Temperature (deg C)']] < self.Cutoff_Temperature:
@@ -557,12 +1488,8 @@ class HPWH_MultipleNodes():
             elif self.Node_Temperatures[self.Lower_Thermostat_Node] < Temperature_Resistance_Target:
                 # Add heat to all nodes below the stratification layer. Use
                 # the full heating power
-                Number_Heated = 1
-                for node in range(1, self.Number_Nodes-1):
-                    if self.Node_Temperatures[node] > self.Node_Temperatures[node-1]:
-                        break
-                    else:
-                        Number_Heated += 1
+                Number_Heated = self.count_nodes_below_stratification(self.Number_Nodes - 1)
+                Heating_Boundaries.append(Number_Heated)
 
                 Heating_Resistance[0:Number_Heated] = [self.Power_Backup / Number_Heated] * Number_Heated
                 Heating_Resistance[Number_Heated:] = [0] * (self.Number_Nodes - Number_Heated)
@@ -582,87 +1509,106 @@ class HPWH_MultipleNodes():
         # Set HP heating rates for each node
         Heating_HeatPump = []
         if self.HeatPump_Active == True:
-            Number_Heated = 1
             # Identify the number of nodes below the stratification layer
-            for node in range(1, self.Number_Nodes):
-                if self.Node_Temperatures[node] > self.Node_Temperatures[node-1]:
-                    break
-                else:
-                    Number_Heated += 1
+            Number_Heated = self.count_nodes_below_stratification(self.Number_Nodes)
+            Heating_Boundaries.append(Number_Heated)
             
             # Add heat to nodes below the stratification layer
             Heating_HeatPump[0:Number_Heated] = [Heat_Addition_HP / Number_Heated] * Number_Heated
             Heating_HeatPump[Number_Heated:] = [0] * (self.Number_Nodes - Number_Heated)
         else:
-            Heating_HeatPump = [0] * len(self.Node_Temperatures)
+            Heating_HeatPump = [0] * self.Number_Nodes
             
         # End heating control logic
             
-        # Iterate through all nodes in the tank
-        # This section calculates the heat transfer and new temperature of each
-        # node in the tank
-        for i in range(self.Number_Nodes):
-            # Assume plug flow. Water from one node enters the higher node
-            # BEFORE cooling off in response to water flows
-            # Reverse operation of calculations to assume well mixed flow
-            # Prior work indicated that (in pipes) it's between the two, and a
-            # mixing coefficient could increase accuracy
-            # These calculations assume 0 mixing in the bottom of the tank
-            # caused by water flows. Likely not correct
-            Node = self.Number_Nodes - (i + 1)
-#            Node = i
-            # Calculate jacket losses for the node
-            # Could do jacket losses as an array to speed up
-            dT = self.Node_Temperatures[Node] - data[self.col_indx['Ambient Temperature (deg C)']]
-            dt = data[self.col_indx['Timestep (min)']] / Minutes_In_Hour
-            Losses = -self.JacketLoss_Node * dT * dt
-            JacketLosses.append(Losses)
+        T_Lower_Start = self.Node_Temperatures[self.Lower_Thermostat_Node]
+        if self.Integration_Scheme == 'Operator Split':
+            (JacketLosses, EnergyWithdrawn, EnergyAdded_HP, EnergyAdded_ER,
+             EnergyChange_Total, Node_Temperatures) = self.calculate_operator_split(data, Heating_HeatPump,
+                                                                                    Heating_Resistance)
+        # In adaptive stratification mode calculate each layer of nodes with
+        # the same temperature once
+        elif self.Layers is not None:
+            Layer_Outputs = self.calculate_layers(data, Heating_HeatPump, Heating_Resistance, Heating_Boundaries)
+        else:
+            # Iterate through all nodes in the tank
+            # This section calculates the heat transfer and new temperature of each
+            # node in the tank
+            for i in range(self.Number_Nodes):
+                # Assume plug flow. Water from one node enters the higher node
+                # BEFORE cooling off in response to water flows
+                # Reverse operation of calculations to assume well mixed flow
+                # Prior work indicated that (in pipes) it's between the two, and a
+                # mixing coefficient could increase accuracy
+                # These calculations assume 0 mixing in the bottom of the tank
+                # caused by water flows. Likely not correct
+                Node = self.Number_Nodes - (i + 1)
+#                Node = i
+                # Calculate jacket losses for the node
+                # Could do jacket losses as an array to speed up
+                dT = self.Node_Temperatures[Node] - data[self.col_indx['Ambient Temperature (deg C)']]
+                dt = data[self.col_indx['Timestep (min)']] / Minutes_In_Hour
+                Losses = -self.JacketLoss_Node * dT * dt
+                JacketLosses.append(Losses)
             
-            # Calculate energy transfer caused by water flows and heat addition
-            # Could do heat rate as an array to speed up
-            if Node == 0:
-                T_Water_In = data[self.col_indx['Inlet Water Temperature (deg C)']]
-            else:
-                T_Water_In = self.Node_Temperatures[Node-1]
+                # Calculate energy transfer caused by water flows and heat addition
+                # Could do heat rate as an array to speed up
+                if Node == 0:
+                    T_Water_In = data[self.col_indx['Inlet Water Temperature (deg C)']]
+                else:
+                    T_Water_In = self.Node_Temperatures[Node-1]
                 
-            # Could do most of these calculations as an array to speed up
-            #Energy_Addition = Heating * data[self.col_indx, etc]
-            Energy_Addition_HP = max(0, Heating_HeatPump[Node] * data[self.col_indx['Timestep (min)']] / Minutes_In_Hour)
-            Energy_Addition_ER = max(0, Heating_Resistance[Node] * data[self.col_indx['Timestep (min)']] / Minutes_In_Hour)
-            EnergyAdded_HP.append(Energy_Addition_HP)
-            EnergyAdded_ER.append(Energy_Addition_ER)
+                # Could do most of these calculations as an array to speed up
+                #Energy_Addition = Heating * data[self.col_indx, etc]
+                Energy_Addition_HP = max(0, Heating_HeatPump[Node] * data[self.col_indx['Timestep (min)']] / Minutes_In_Hour)
+                Energy_Addition_ER = max(0, Heating_Resistance[Node] * data[self.col_indx['Timestep (min)']] / Minutes_In_Hour)
+                EnergyAdded_HP.append(Energy_Addition_HP)
+                EnergyAdded_ER.append(Energy_Addition_ER)
                 
-            # Calcualte the energy withdrawn via hot water consumption
-            dT = T_Water_In - self.Node_Temperatures[Node]
-            ThermalMassRemoved = data[self.col_indx['Hot Water Draw Volume (L)']] * Density_Water * SpecificHeat_Water
-            Withdrawn = ThermalMassRemoved * dT * kWh_In_J
-            EnergyWithdrawn.append(Withdrawn)
+                # Calcualte the energy withdrawn via hot water consumption
+                dT = T_Water_In - self.Node_Temperatures[Node]
+                ThermalMassRemoved = data[self.col_indx['Hot Water Draw Volume (L)']] * Density_Water * SpecificHeat_Water
+                Withdrawn = ThermalMassRemoved * dT * kWh_In_J
+                EnergyWithdrawn.append(Withdrawn)
             
-            # Calculate the energy change in each node of the tank
-            # Could pull this out of the for loop, do as an array to speed up
-            EnergyChange = Losses + Energy_Addition_HP + Energy_Addition_ER + Withdrawn
-            EnergyChange_Total.append(EnergyChange)
-            
-            # Calculate the new node temperature
-            # Could pull this out of the for loop, do as an array to speed up
-            Node_Temperature = EnergyChange / self.ThermalMass_Node + self.Node_Temperatures[Node]
-            Node_Temperatures.append(Node_Temperature)
-            self.Node_Temperatures[Node] = Node_Temperature
+                # Calculate the energy change in each node of the tank
+                # Could pull this out of the for loop, do as an array to speed up
+                EnergyChange = Losses + Energy_Addition_HP + Energy_Addition_ER + Withdrawn
+                EnergyChange_Total.append(EnergyChange)
             
+                # Calculate the new node temperature
+                # Could pull this out of the for loop, do as an array to speed up
+                Node_Temperature = EnergyChange / self.ThermalMass_Node + self.Node_Temperatures[Node]
+                Node_Temperatures.append(Node_Temperature)
+                self.Node_Temperatures[Node] = Node_Temperature
+
+            #Calculate the outputs
+            # Need to reverse when assuming plug flow b/c perform calcualtions in
+            # opposite order
+            JacketLosses.reverse()
+            EnergyWithdrawn.reverse()
+            EnergyAdded_HP.reverse()
+            EnergyAdded_ER.reverse()
+            EnergyChange_Total.reverse()
+            Node_Temperatures.reverse()
+
         # This could be removed from do_step() and added to a post_process() function    
         # Calculate the power HP power multiplier
-        data[self.col_indx['PowerMultiplier']] = max(0, self.calculate_HP_power(self.Node_Temperatures[self.Lower_Thermostat_Node], data[self.col_indx['Evaporator Air Inlet Temperature (deg C)']]))
-        
-        #Calculate the outputs
-        # Need to reverse when assuming plug flow b/c perform calcualtions in
-        # opposite order
-        JacketLosses.reverse()
-        EnergyWithdrawn.reverse()
-        EnergyAdded_HP.reverse()
-        EnergyAdded_ER.reverse()
-        EnergyChange_Total.reverse()
-        Node_Temperatures.reverse()
+        T_Lower = self.Node_Temperatures[self.Lower_Thermostat_Node]
+        if self.Integration_Scheme == 'Operator Split':
+            # Use the average lower thermostat temperature during the timestep,
+            # which remains accurate for long timesteps
+            T_Lower = (T_Lower_Start + T_Lower) / 2
+        if self.HeatPump_Active == True:
+            data[self.col_indx['PowerMultiplier']] = max(0, self.calculate_HP_power(T_Lower, data[self.col_indx['Evaporator Air Inlet Temperature (deg C)']]))
+        else:
+            data[self.col_indx['PowerMultiplier']] = 0
         
+        # The layers are only expanded to the nodes for the outputs
+        if self.Layers is not None:
+            (JacketLosses, EnergyWithdrawn, EnergyAdded_HP, EnergyAdded_ER,
+             EnergyChange_Total, Node_Temperatures) = self.expand_layers(Layer_Outputs)
+
         JacketLosses_Total = sum(JacketLosses)
         EnergyWithdrawn_Total = sum(EnergyWithdrawn)
         EnergyAddedHP_Total = sum(EnergyAdded_HP)
@@ -688,6 +1634,556 @@ class HPWH_MultipleNodes():
         data[self.col_indx['Total Energy Change (kWh)']] = EnergyChange_Tank
         data[self.col_indx['Node Temperatures (deg C)']] = Node_Temperatures
 
+        self.State_Of_Charge = self.calculate_state_of_charge()
+        if 'State of Charge (%)' in self.col_indx:
+            data[self.col_indx['State of Charge (%)']] = self.State_Of_Charge
+
+        if self.Occupant_Behavior is not None:
+            if 'Water Draw Volume (L)' in self.col_indx:
+                Draw_Volume = data[self.col_indx['Water Draw Volume (L)']]
+            else:
+                Draw_Volume = data[self.col_indx['Hot Water Draw Volume (L)']]
+            self.Occupant_Behavior.update(data[self.col_indx['Timestep (min)']],
+                                          data[self.col_indx['Electricity Consumed Total (kWh)']], Draw_Volume)
+
         return data
             
-            
\ No newline at end of file
+            
+class HPWH_MultipleNodes_Batch():
+    '''
+    Simulates many HPWHs at once using the equations of HPWH_MultipleNodes.
+    The state of every HPWH is stored in arrays with one row per HPWH, so each
+    timestep is calculated for all of them using array operations instead of
+    looping over the nodes of each HPWH. This is useful when simulating the
+    same draw profile in several climate zones, or many similar HPWHs.
+    
+    The 'Explicit' and 'Operator Split' integration schemes and the 'Rheem
+    PROPH80' control logic are available. Adaptive stratification and
+    'Maximum Control Timestep (min)' are not used; each HPWH is simulated with
+    every node at every timestep, yielding the same node temperatures as
+    HPWH_MultipleNodes without those options.
+    '''
+    
+    def __init__(self, config, Number_HPWHs, Parameters = None, dtype = float):
+        '''
+        Initializes the model.
+        
+        inputs:
+        config: A configuration in the format used by HPWH_MultipleNodes.
+                'Column Index' is not needed.
+        Number_HPWHs: The number of HPWHs simulated together.
+        Parameters: Optional. A dictionary of configuration entries which
+                    differ between the HPWHs, each containing one value per
+                    HPWH. For instance, {'Volume Tank (L)': [280, 340.69]}.
+                    'Node Temperatures (deg C)' may contain one row of node
+                    temperatures per HPWH.
+        dtype: The data type of the arrays storing the state of the HPWHs.
+               np.float32 halves the memory required for large simulations.
+        '''
+        
+        if Parameters is None:
+            Parameters = {}
+        self.Number_HPWHs = Number_HPWHs
+        self.dtype = dtype
+        
+        def get_parameter(name, default = None):
+            value = Parameters.get(name, config.get(name, default))
+            return np.broadcast_to(np.asarray(value, dtype = dtype), (Number_HPWHs,)).copy()
+        
+        self.Coefficient_JacketLoss = get_parameter('Jacket Loss Coefficient (W/K)') / 1000
+        self.Power_Backup = get_parameter('Backup Element Power (W)') / 1000
+        self.Upper_Resistance_Deadband = get_parameter('Resistance Deadband (deg C)')
+        self.Upper_Resistance_Deadband_HPActive = get_parameter('Resistance Deadband, HP Active (deg C)')
+        self.HeatAddition_HeatPump = get_parameter('Heat Pump Heat Addition Rate (W)') / 1000
+        self.HeatRate_Map = read_performance_map(config, 'Heat Rate')
+        self.HeatPump_Activation_Deadband = get_parameter('Heat Pump Activation Deadband (deg C)')
+        self.HeatPump_ActivationDeadband_RecentSetChange = get_parameter('Heat Pump Activation Deadband, Recent Set Temperature Change (deg C)')
+        self.HeatPump_ActivationDeadband_LowStratification = get_parameter('Heat Pump Activation Deadband, Low Stratification (deg C)')
+        self.HeatPump_SetChange_TimeWindow = config['Heat Pump Deadband Time Period (s)']
+        self.Volume_Tank = get_parameter('Volume Tank (L)')
+        self.ThermalMass_Tank = self.Volume_Tank * SpecificHeat_Water * Density_Water * kWh_In_J
+        self.Power_Map = read_performance_map(config, 'Power')
+        self.Set_Temperature_HeatPump = get_parameter('Set Temperature, Heat Pump (deg C)')
+        self.Set_Temperature_Resistance = get_parameter('Set Temperature, Resistance (deg C)')
+        self.Varying_Set_Temperature = config['Varying Set Temperature']
+        self.Cutoff_Temperature = get_parameter('Cutoff Temperature (deg C)')
+        self.Upper_Thermostat_Node = config['Upper Thermostat Node']
+        self.Lower_Thermostat_Node = config['Lower Thermostat Node']
+        self.Number_Nodes = config['Number of Nodes']
+        self.Control_Logic_Model = config['Control Logic Model']
+        self.Temperature_MixingValve_Set = config.get('Mixing Valve Set Temperature (deg C)', None)
+        self.Integration_Scheme = config.get('Integration Scheme', 'Explicit')
+        self.Draw_Advection = config.get('Draw Advection', 'Implicit')
+        if self.Control_Logic_Model != 'Rheem PROPH80':
+            raise ValueError('Unknown Control Logic Model {}'.format(self.Control_Logic_Model))
+        if self.Integration_Scheme not in ['Explicit', 'Operator Split']:
+            raise ValueError('Unknown Integration Scheme {}'.format(self.Integration_Scheme))
+        if self.Draw_Advection not in ['Plug Flow', 'Implicit']:
+            raise ValueError('Unknown Draw Advection {}'.format(self.Draw_Advection))
+        
+        Node_Temperatures = Parameters.get('Node Temperatures (deg C)', config['Node Temperatures (deg C)'])
+        self.Node_Temperatures = np.broadcast_to(np.asarray(Node_Temperatures, dtype = dtype),
+                                                 (Number_HPWHs, self.Number_Nodes)).copy()
+        self.Time_Since_Set_Change = np.full(Number_HPWHs, self.HeatPump_SetChange_TimeWindow + 1, dtype = dtype)
+        self.Resistance_Active = np.zeros(Number_HPWHs, dtype = bool)
+        self.HeatPump_Active = np.zeros(Number_HPWHs, dtype = bool)
+        
+        self.ThermalMass_Node = (self.ThermalMass_Tank / self.Number_Nodes)[:, np.newaxis]
+        self.JacketLoss_Node = (self.Coefficient_JacketLoss / self.Number_Nodes)[:, np.newaxis]
+        self.Volume_Node = (self.Volume_Tank / self.Number_Nodes)[:, np.newaxis]
+        self.Node_Index = np.arange(self.Number_Nodes)
+        
+        if self.Temperature_MixingValve_Set is not None:
+            self.Temperature_Delivery = get_parameter('State of Charge Delivery Temperature (deg C)', self.Temperature_MixingValve_Set)
+        else:
+            self.Temperature_Delivery = get_parameter('State of Charge Delivery Temperature (deg C)', 43.3)
+        Temperature_Maximum = get_parameter('State of Charge Maximum Temperature (deg C)',
+                                            np.maximum(self.Set_Temperature_HeatPump, self.Set_Temperature_Resistance))
+        self.Energy_Maximum = np.where(Temperature_Maximum > self.Temperature_Delivery,
+                                       self.ThermalMass_Tank * (Temperature_Maximum - self.Temperature_Delivery), np.nan)
+        self.State_Of_Charge = self.calculate_state_of_charge()
+    
+    def get_state(self):
+        '''
+        Returns a copy of the attributes which change during a simulation, in
+        the format used by HPWH_MultipleNodes.get_state but with one value
+        per HPWH.
+        '''
+        
+        return {'Node_Temperatures': self.Node_Temperatures.copy(),
+                'Set_Temperature_HeatPump': self.Set_Temperature_HeatPump.copy(),
+                'Set_Temperature_Resistance': self.Set_Temperature_Resistance.copy(),
+                'Time_Since_Set_Change': self.Time_Since_Set_Change.copy(),
+                'HeatPump_Active': self.HeatPump_Active.copy(),
+                'Resistance_Active': self.Resistance_Active.copy()}
+    
+    def set_state(self, state):
+        '''
+        Restores a state previously returned by get_state.
+        '''
+        
+        for attribute, value in state.items():
+            setattr(self, attribute, np.array(value))
+        self.State_Of_Charge = self.calculate_state_of_charge()
+    
+    def calculate_state_of_charge(self):
+        '''
+        Calculates the state of charge of each HPWH, in %. See
+        HPWH_MultipleNodes.calculate_state_of_charge.
+        '''
+        
+        Excess = np.maximum(self.Node_Temperatures - self.Temperature_Delivery[:, np.newaxis], 0).sum(axis = 1)
+        
+        return 100 * self.ThermalMass_Node[:, 0] * Excess / self.Energy_Maximum
+    
+    def calculate_HP_power(self, T_Tank_Lower, T_Ambient):
+        '''
+        Calculates the power multiplier of each heat pump. See
+        HPWH_MultipleNodes.calculate_HP_power.
+        '''
+        
+        return self.Power_Map.evaluate(T_Tank_Lower, T_Ambient)
+    
+    def calculate_HP_HeatAddition(self, T_Tank_Lower, T_Ambient):
+        '''
+        Calculates the heat addition multiplier of each heat pump. See
+        HPWH_MultipleNodes.calculate_HP_HeatAddition.
+        '''
+        
+        return self.HeatRate_Map.evaluate(T_Tank_Lower, T_Ambient)
+    
+    def count_nodes_below_stratification(self, Max_Nodes):
+        '''
+        Counts the nodes below the stratification layer of each HPWH, starting
+        from the bottom of the tank and stopping at the first node which is
+        warmer than the node below it. Returns at most Max_Nodes.
+        '''
+        
+        Warmer = self.Node_Temperatures[:, 1:Max_Nodes] > self.Node_Temperatures[:, :Max_Nodes-1]
+        
+        return np.where(Warmer.any(axis = 1), np.argmax(Warmer, axis = 1) + 1, Max_Nodes)
+    
+    def control_logic(self, data):
+        '''
+        Determines whether the heat pump and resistance elements of each HPWH
+        are active, using the 'Rheem PROPH80' control logic in
+        HPWH_MultipleNodes.control_logic.
+        '''
+        
+        if self.Varying_Set_Temperature == True:
+            Changed = np.abs(self.Set_Temperature_HeatPump - data['Set Temperature, Heat Pump (deg C)']) > 0
+            self.Time_Since_Set_Change = np.where(Changed, 0, self.Time_Since_Set_Change + data['Timestep (min)'] * Seconds_In_Minute)
+            self.Set_Temperature_HeatPump = np.broadcast_to(data['Set Temperature, Heat Pump (deg C)'], (self.Number_HPWHs,)).astype(self.dtype)
+            self.Set_Temperature_Resistance = np.broadcast_to(data['Set Temperature, Resistance (deg C)'], (self.Number_HPWHs,)).astype(self.dtype)
+        
+        HeatPump_Deadband = np.where(self.Time_Since_Set_Change < self.HeatPump_SetChange_TimeWindow,
+                                     self.HeatPump_ActivationDeadband_RecentSetChange, self.HeatPump_Activation_Deadband)
+        
+        T_Lower = self.Node_Temperatures[:, self.Lower_Thermostat_Node]
+        T_Upper = self.Node_Temperatures[:, self.Upper_Thermostat_Node]
+        Set_HP = self.Set_Temperature_HeatPump
+        Set_ER = self.Set_Temperature_Resistance
+        Cold = data['Evaporator Air Inlet Temperature (deg C)'] < self.Cutoff_Temperature
+        
+        # Heat pump control logic
+        Continue_HP = (T_Lower < Set_HP) & (T_Upper < Set_HP + 1)
+        Start_HP = np.where(T_Lower <= Set_HP - HeatPump_Deadband, ~(T_Upper > Set_HP),
+                            (T_Upper <= Set_HP - self.HeatPump_ActivationDeadband_LowStratification) & (T_Upper - T_Lower < 5))
+        self.HeatPump_Active = ~Cold & np.where(self.HeatPump_Active, Continue_HP, Start_HP)
+        
+        # Resistance element control logic
+        Resistance_Deadband = np.where(self.HeatPump_Active, self.Upper_Resistance_Deadband_HPActive,
+                                       self.Upper_Resistance_Deadband)
+        Resistance_Cold = np.where(self.Resistance_Active, (T_Lower < Set_HP - 0.5) | (T_Upper < Set_HP - 0.5),
+                                   (T_Lower <= Set_HP - HeatPump_Deadband) | (T_Upper <= Set_ER - Resistance_Deadband))
+        Resistance_Warm = (T_Upper < Set_ER - Resistance_Deadband) | (self.Resistance_Active & ((T_Upper < Set_ER - 1) | ((T_Lower < Set_ER - 1) & (T_Upper < Set_ER + 1))))
+        self.Resistance_Active = np.where(Cold, Resistance_Cold, Resistance_Warm)
+    
+    def calculate_timestep(self, data):
+        '''
+        Performs the calculations for one timestep of every HPWH.
+        
+        inputs:
+            data: A dictionary containing the inputs of this timestep, using
+                  the columns in Model_Inputs. Each entry is either a single
+                  value used for every HPWH or an array with one value per
+                  HPWH. 'Resistance Deadband (deg C)', 'Resistance Deadband,
+                  HP Active (deg C)' and 'Water Draw Volume (L)' are optional,
+                  as in HPWH_MultipleNodes.calculate_timestep.
+        
+        outputs:
+            A dictionary containing the outputs of this timestep, with one
+            value per HPWH. Uses the names of the scalar outputs in
+            Model_Outputs, plus 'Outlet Water Temperature (deg C)', the
+            temperature of the top node at the end of the timestep. The node
+            temperatures are available in self.Node_Temperatures.
+        '''
+        
+        Timestep = data['Timestep (min)']
+        T_Evaporator = data['Evaporator Air Inlet Temperature (deg C)']
+        T_Ambient = np.asarray(data['Ambient Temperature (deg C)'])[..., np.newaxis]
+        T_Water_In = data['Inlet Water Temperature (deg C)']
+        if 'Resistance Deadband (deg C)' in data:
+            self.Upper_Resistance_Deadband = np.broadcast_to(data['Resistance Deadband (deg C)'], (self.Number_HPWHs,)).astype(self.dtype)
+        if 'Resistance Deadband, HP Active (deg C)' in data:
+            self.Upper_Resistance_Deadband_HPActive = np.broadcast_to(data['Resistance Deadband, HP Active (deg C)'], (self.Number_HPWHs,)).astype(self.dtype)
+        
+        # Calculate the volume of hot water needed to supply the mixing valve
+        # at the current upper thermostat temperature
+        if self.Temperature_MixingValve_Set is not None:
+            Volume = data['Water Draw Volume (L)']
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                Calculated = (Volume * T_Water_In - Volume * self.Temperature_MixingValve_Set) / (T_Water_In - self.Node_Temperatures[:, self.Upper_Thermostat_Node])
+            Volume_Drawn = np.minimum(Calculated, Volume)
+        else:
+            Volume_Drawn = np.broadcast_to(data['Hot Water Draw Volume (L)'], (self.Number_HPWHs,))
+        
+        T_Lower_Start = self.Node_Temperatures[:, self.Lower_Thermostat_Node]
+        self.control_logic(data)
+        
+        # Only evaluate the performance map for the heat pumps which are active
+        Active = self.HeatPump_Active
+        Heat_Addition_HP = np.zeros(self.Number_HPWHs, dtype = self.dtype)
+        if Active.any():
+            Heat_Addition_HP[Active] = self.HeatAddition_HeatPump[Active] * self.calculate_HP_HeatAddition(T_Lower_Start[Active],
+                                                                                                           np.broadcast_to(T_Evaporator, (self.Number_HPWHs,))[Active])
+        
+        # Heating logic, see HPWH_MultipleNodes.calculate_timestep. The upper
+        # element heats the upper thermostat node, the lower element and the
+        # heat pump heat the nodes below the stratification layer
+        T_Resistance_Target = np.where(T_Evaporator < self.Cutoff_Temperature,
+                                       np.maximum(self.Set_Temperature_HeatPump, self.Set_Temperature_Resistance),
+                                       self.Set_Temperature_Resistance)
+        Upper_Element = self.Resistance_Active & (self.Node_Temperatures[:, self.Upper_Thermostat_Node] < T_Resistance_Target - 0.5)
+        Lower_Element = self.Resistance_Active & ~Upper_Element & (T_Lower_Start < T_Resistance_Target)
+        Number_Heated_ER = self.count_nodes_below_stratification(self.Number_Nodes - 1)
+        Heating_Resistance = np.where(Lower_Element[:, np.newaxis] & (self.Node_Index < Number_Heated_ER[:, np.newaxis]),
+                                      (self.Power_Backup / Number_Heated_ER.astype(self.dtype))[:, np.newaxis], 0)
+        Heating_Resistance[:, self.Upper_Thermostat_Node] += np.where(Upper_Element, self.Power_Backup, 0)
+        
+        Number_Heated_HP = self.count_nodes_below_stratification(self.Number_Nodes)
+        Heating_HeatPump = np.where(self.HeatPump_Active[:, np.newaxis] & (self.Node_Index < Number_Heated_HP[:, np.newaxis]),
+                                    (Heat_Addition_HP / Number_Heated_HP.astype(self.dtype))[:, np.newaxis], 0)
+        
+        Temperatures = self.Node_Temperatures
+        Timestep_Node = np.asarray(Timestep)[..., np.newaxis]
+        T_Water_In_Node = np.asarray(T_Water_In)[..., np.newaxis]
+        Volume_Drawn_Node = np.asarray(Volume_Drawn)[..., np.newaxis]
+        if self.Integration_Scheme == 'Operator Split':
+            dt = Timestep_Node / Minutes_In_Hour
+            EnergyAdded_HP = np.maximum(0, Heating_HeatPump * dt)
+            EnergyAdded_ER = np.maximum(0, Heating_Resistance * dt)
+            Temperatures_Heated = Temperatures + (EnergyAdded_HP + EnergyAdded_ER) / self.ThermalMass_Node
+            
+            # Exact solution for the jacket losses of each node
+            Decay = np.exp(-self.JacketLoss_Node * dt / self.ThermalMass_Node)
+            Temperatures_Cooled = T_Ambient + (Temperatures_Heated - T_Ambient) * Decay
+            JacketLosses = (Temperatures_Cooled - Temperatures_Heated) * self.ThermalMass_Node
+            
+            # Move the water up the tank
+            if self.Draw_Advection == 'Plug Flow':
+                Node_Temperatures = plug_flow_advection(Temperatures_Cooled, np.maximum(Volume_Drawn, 0),
+                                                        self.Volume_Node, T_Water_In)
+            else:
+                Courant = np.maximum(Volume_Drawn_Node, 0) / self.Volume_Node
+                Node_Temperatures = Temperatures_Cooled.copy()
+                T_Below = np.broadcast_to(T_Water_In, (self.Number_HPWHs,))
+                for Node in range(self.Number_Nodes):
+                    Node_Temperatures[:, Node] = (Node_Temperatures[:, Node] + Courant[:, 0] * T_Below) / (1 + Courant[:, 0])
+                    T_Below = Node_Temperatures[:, Node]
+            EnergyWithdrawn = (Node_Temperatures - Temperatures_Cooled) * self.ThermalMass_Node
+            EnergyChange_Total = EnergyAdded_HP + EnergyAdded_ER + JacketLosses + EnergyWithdrawn
+        else:
+            # Every node uses the temperatures at the start of the timestep,
+            # including the temperature of the node below
+            JacketLosses = -self.JacketLoss_Node * (Temperatures - T_Ambient) * (Timestep_Node / Minutes_In_Hour)
+            EnergyAdded_HP = np.maximum(0, Heating_HeatPump * Timestep_Node / Minutes_In_Hour)
+            EnergyAdded_ER = np.maximum(0, Heating_Resistance * Timestep_Node / Minutes_In_Hour)
+            T_Below = np.concatenate([np.broadcast_to(T_Water_In_Node, (self.Number_HPWHs, 1)), Temperatures[:, :-1]], axis = 1)
+            EnergyWithdrawn = Volume_Drawn_Node * Density_Water * SpecificHeat_Water * (T_Below - Temperatures) * kWh_In_J
+            EnergyChange_Total = JacketLosses + EnergyAdded_HP + EnergyAdded_ER + EnergyWithdrawn
+            Node_Temperatures = EnergyChange_Total / self.ThermalMass_Node + Temperatures
+        self.Node_Temperatures = Node_Temperatures.astype(self.dtype, copy = False)
+        
+        # Calculate the power HP power multiplier
+        T_Lower = self.Node_Temperatures[:, self.Lower_Thermostat_Node]
+        if self.Integration_Scheme == 'Operator Split':
+            T_Lower = (T_Lower_Start + T_Lower) / 2
+        PowerMultiplier = np.zeros(self.Number_HPWHs, dtype = self.dtype)
+        if Active.any():
+            PowerMultiplier[Active] = np.maximum(0, self.calculate_HP_power(T_Lower[Active], np.broadcast_to(T_Evaporator, (self.Number_HPWHs,))[Active]))
+        
+        Outputs = {'Heat Pump Heat Addition (kW)': Heat_Addition_HP,
+                   'PowerMultiplier': PowerMultiplier,
+                   'Electricity Consumed Heat Pump (kWh)': PowerMultiplier * self.HeatAddition_HeatPump * Timestep / Minutes_In_Hour * self.HeatPump_Active,
+                   'Total Jacket Losses (kWh)': JacketLosses.sum(axis = 1),
+                   'Total Energy Withdrawn (kWh)': EnergyWithdrawn.sum(axis = 1),
+                   'Total Heat Added Heat Pump (kWh)': EnergyAdded_HP.sum(axis = 1),
+                   'Total Heat Added Backup (kWh)': EnergyAdded_ER.sum(axis = 1),
+                   'Total Energy Change (kWh)': EnergyChange_Total.sum(axis = 1),
+                   'Hot Water Draw Volume (L)': Volume_Drawn,
+                   'Outlet Water Temperature (deg C)': self.Node_Temperatures[:, -1]}
+        Outputs['Electricity Consumed Resistance (kWh)'] = Outputs['Total Heat Added Backup (kWh)'] / 0.99
+        Outputs['Electricity Consumed Total (kWh)'] = Outputs['Electricity Consumed Heat Pump (kWh)'] + Outputs['Electricity Consumed Resistance (kWh)']
+        Outputs['Total Heat Added (kWh)'] = Outputs['Total Heat Added Heat Pump (kWh)'] + Outputs['Total Heat Added Backup (kWh)']
+        self.State_Of_Charge = self.calculate_state_of_charge()
+        Outputs['State of Charge (%)'] = self.State_Of_Charge
+        
+        return Outputs
+    
+    def simulate(self, Inputs, Outputs = None, Update_Frequency = None):
+        '''
+        Simulates every timestep of the inputs.
+        
+        inputs:
+            Inputs: A dictionary containing the inputs of every timestep,
+                    using the columns in Model_Inputs. Each entry is an array
+                    with one row per timestep, containing either a single
+                    value used for every HPWH or one column per HPWH.
+            Outputs: The outputs to store, using the names returned by
+                     calculate_timestep. Defaults to every output.
+            Update_Frequency: Prints a status update after this many seconds.
+                              None disables the updates.
+        
+        outputs:
+            A dictionary containing an array for each output, with one row
+            per timestep and one column per HPWH.
+        '''
+        
+        Inputs = {column: np.asarray(value) for column, value in Inputs.items()}
+        Number_Timesteps = len(Inputs['Timestep (min)'])
+        Results = None
+        Time_Last_Update = time.time()
+        for row in range(Number_Timesteps):
+            Step = self.calculate_timestep({column: value[row] for column, value in Inputs.items()})
+            if Results is None:
+                if Outputs is None:
+                    Outputs = list(Step.keys())
+                Results = {output: np.empty((Number_Timesteps, self.Number_HPWHs), dtype = self.dtype) for output in Outputs}
+            for output in Outputs:
+                Results[output][row] = Step[output]
+            
+            if Update_Frequency is not None and time.time() - Time_Last_Update >= Update_Frequency:
+                print('completed row {} of {}'.format(row, Number_Timesteps))
+                Time_Last_Update = time.time()
+        
+        return Results
+
+class HPWH_Plant():
+    '''
+    Simulates a central plant serving a multifamily building using several
+    HPWHs which share the building's draws. The tanks are plumbed in parallel
+    chains: the draw is split between the chains, and within a chain the
+    water leaving each tank enters the next one. 'Parallel' plants have one
+    tank per chain, 'Series' plants one chain containing every tank.
+    
+    Every tank is stored in a single HPWH_MultipleNodes_Batch, so each
+    timestep is calculated for the whole plant at once. The tanks are coupled
+    explicitly: a tank in series is supplied at the outlet temperature of
+    the tank before it at the start of the timestep. That water is often
+    warmer than the bottom of the tank, so it rises by buoyancy; after each
+    timestep the nodes of tanks in series are rearranged from coldest to
+    warmest, which conserves their energy. The mixing valve, if
+    any, is at the outlet of the plant; the hot water drawn from each chain
+    is calculated from the temperature at the upper thermostat of its last
+    tank.
+    '''
+    
+    def __init__(self, config, Number_Tanks, Arrangement = 'Parallel', Upstream = None, Flow_Fractions = None,
+                 Parameters = None, dtype = float):
+        '''
+        Initializes the model.
+        
+        inputs:
+        config: A configuration in the format used by HPWH_MultipleNodes_Batch,
+                describing each tank.
+        Number_Tanks: The number of tanks in the plant.
+        Arrangement: 'Parallel' or 'Series'. Ignored if Upstream is provided.
+        Upstream: Optional. The index of the tank supplying each tank, or -1
+                  if the tank is supplied by the inlet of the plant. Each tank
+                  must be listed after the tank supplying it and may supply
+                  at most one other tank.
+        Flow_Fractions: Optional. The fraction of the draw supplied by each
+                        chain, in the order of the first tank of each chain.
+                        Defaults to splitting the draw evenly.
+        Parameters: Optional. Configuration entries which differ between the
+                    tanks, as in HPWH_MultipleNodes_Batch.
+        dtype: The data type of the arrays storing the state of the tanks.
+        '''
+        
+        if Upstream is None:
+            if Arrangement == 'Parallel':
+                Upstream = [-1] * Number_Tanks
+            elif Arrangement == 'Series':
+                Upstream = [-1] + list(range(Number_Tanks - 1))
+            else:
+                raise ValueError('Unknown Arrangement {}'.format(Arrangement))
+        self.Upstream = np.asarray(Upstream, dtype = int)
+        if len(self.Upstream) != Number_Tanks:
+            raise ValueError('Upstream must contain one value per tank')
+        if (self.Upstream >= np.arange(Number_Tanks)).any() or (self.Upstream < -1).any():
+            raise ValueError('Each tank must be listed after the tank supplying it')
+        Supplying = self.Upstream[self.Upstream >= 0]
+        if len(np.unique(Supplying)) != len(Supplying):
+            raise ValueError('Each tank may supply at most one other tank')
+        
+        # The chain containing each tank, identified by its first tank, and
+        # the last tank of each chain
+        self.Number_Tanks = Number_Tanks
+        self.First_Tanks = np.flatnonzero(self.Upstream == -1)
+        self.Chain = np.empty(Number_Tanks, dtype = int)
+        for tank in range(Number_Tanks):
+            self.Chain[tank] = np.searchsorted(self.First_Tanks, tank) if self.Upstream[tank] == -1 else self.Chain[self.Upstream[tank]]
+        Last_Tanks = np.setdiff1d(np.arange(Number_Tanks), Supplying)
+        self.Last_Tanks = Last_Tanks[np.argsort(self.Chain[Last_Tanks])]
+        self.Supplied = self.Upstream >= 0
+        
+        if Flow_Fractions is None:
+            Flow_Fractions = np.full(len(self.First_Tanks), 1 / len(self.First_Tanks))
+        self.Flow_Fractions = np.asarray(Flow_Fractions, dtype = float)
+        if len(self.Flow_Fractions) != len(self.First_Tanks) or not math.isclose(self.Flow_Fractions.sum(), 1):
+            raise ValueError('Flow_Fractions must contain one value per chain and sum to 1')
+        
+        # The mixing valve is modeled at the outlet of the plant, so the
+        # tanks are simulated with the volume of hot water drawn from each
+        self.Temperature_MixingValve_Set = config.get('Mixing Valve Set Temperature (deg C)', None)
+        Parameters = dict(Parameters) if Parameters is not None else {}
+        if self.Temperature_MixingValve_Set is not None:
+            Parameters.setdefault('State of Charge Delivery Temperature (deg C)',
+                                  config.get('State of Charge Delivery Temperature (deg C)', self.Temperature_MixingValve_Set))
+        config = dict(config, **{'Mixing Valve Set Temperature (deg C)': None})
+        self.Tanks = HPWH_MultipleNodes_Batch(config, Number_Tanks, Parameters, dtype = dtype)
+        self.Tank_Outputs = None
+    
+    def calculate_timestep(self, data):
+        '''
+        Performs the calculations for one timestep of the plant.
+        
+        inputs:
+            data: A dictionary containing the inputs of the plant in this
+                  timestep, using the columns in Model_Inputs. 'Water Draw
+                  Volume (L)' is required if the configuration includes a
+                  mixing valve, otherwise 'Hot Water Draw Volume (L)'.
+        
+        outputs:
+            A dictionary containing the energy and electricity outputs of
+            HPWH_MultipleNodes_Batch summed across the tanks, the 'Hot Water
+            Draw Volume (L)' drawn from the plant, the mixed 'Outlet Water
+            Temperature (deg C)' of the chains, the 'State of Charge (%)' of
+            the plant and the number of 'Heat Pumps Active'. The outputs of
+            each tank are available in self.Tank_Outputs.
+        '''
+        
+        T_Water_In = data['Inlet Water Temperature (deg C)']
+        
+        # The volume of hot water drawn from each chain
+        if self.Temperature_MixingValve_Set is not None:
+            Volume = data['Water Draw Volume (L)'] * self.Flow_Fractions
+            T_Chain = self.Tanks.Node_Temperatures[self.Last_Tanks, self.Tanks.Upper_Thermostat_Node]
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                Calculated = (Volume * T_Water_In - Volume * self.Temperature_MixingValve_Set) / (T_Water_In - T_Chain)
+            Volume_Chain = np.minimum(Calculated, Volume)
+        else:
+            Volume_Chain = data['Hot Water Draw Volume (L)'] * self.Flow_Fractions
+        
+        # Tanks in series are supplied by the outlet of the tank before them
+        T_Outlet = self.Tanks.Node_Temperatures[:, -1]
+        Tank_Data = dict(data)
+        Tank_Data['Inlet Water Temperature (deg C)'] = np.where(self.Supplied, T_Outlet[self.Upstream], T_Water_In)
+        Tank_Data['Hot Water Draw Volume (L)'] = Volume_Chain[self.Chain]
+        Tank_Data.pop('Water Draw Volume (L)', None)
+        
+        self.Tank_Outputs = self.Tanks.calculate_timestep(Tank_Data)
+        if self.Supplied.any():
+            self.Tanks.Node_Temperatures[self.Supplied] = np.sort(self.Tanks.Node_Temperatures[self.Supplied], axis = 1)
+            self.Tank_Outputs['Outlet Water Temperature (deg C)'] = self.Tanks.Node_Temperatures[:, -1]
+        
+        Outputs = {output: self.Tank_Outputs[output].sum() for output in
+                   ['Electricity Consumed Heat Pump (kWh)', 'Electricity Consumed Resistance (kWh)',
+                    'Electricity Consumed Total (kWh)', 'Total Jacket Losses (kWh)', 'Total Energy Withdrawn (kWh)',
+                    'Total Heat Added Heat Pump (kWh)', 'Total Heat Added Backup (kWh)', 'Total Heat Added (kWh)',
+                    'Total Energy Change (kWh)']}
+        Volume_Drawn = Volume_Chain.sum()
+        Outputs['Hot Water Draw Volume (L)'] = Volume_Drawn
+        T_Chain = self.Tank_Outputs['Outlet Water Temperature (deg C)'][self.Last_Tanks]
+        Outputs['Outlet Water Temperature (deg C)'] = (Volume_Chain * T_Chain).sum() / Volume_Drawn if Volume_Drawn > 0 else T_Chain.mean()
+        Outputs['State of Charge (%)'] = (self.Tanks.State_Of_Charge * self.Tanks.Energy_Maximum).sum() / self.Tanks.Energy_Maximum.sum()
+        Outputs['Heat Pumps Active'] = self.Tanks.HeatPump_Active.sum()
+        
+        return Outputs
+    
+    def simulate(self, Inputs, Outputs = None, Update_Frequency = None):
+        '''
+        Simulates every timestep of the inputs.
+        
+        inputs:
+            Inputs: A dictionary containing an array of each input of the
+                    plant, with one value per timestep.
+            Outputs: The outputs to store, using the names returned by
+                     calculate_timestep. Defaults to every output.
+            Update_Frequency: Prints a status update after this many seconds.
+                              None disables the updates.
+        
+        outputs:
+            A dictionary containing an array for each output, with one value
+            per timestep.
+        '''
+        
+        Inputs = {column: np.asarray(value) for column, value in Inputs.items()}
+        Number_Timesteps = len(Inputs['Timestep (min)'])
+        Results = None
+        Time_Last_Update = time.time()
+        for row in range(Number_Timesteps):
+            Step = self.calculate_timestep({column: value[row] for column, value in Inputs.items()})
+            if Results is None:
+                if Outputs is None:
+                    Outputs = list(Step.keys())
+                Results = {output: np.empty(Number_Timesteps) for output in Outputs}
+            for output in Outputs:
+                Results[output][row] = Step[output]
+            
+            if Update_Frequency is not None and time.time() - Time_Last_Update >= Update_Frequency:
+                print('completed row {} of {}'.format(row, Number_Timesteps))
+                Time_Last_Update = time.time()
+        
+        return Results
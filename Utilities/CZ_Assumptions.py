@@ -8,8 +8,63 @@ and overwrite any monitored data to allow simulations in other climate zones.
 The functions work in degrees Fahrenheit and are intended to modify the inputs
 BEFORE they are converted to deg C.
 
+The CBECC-Res files are loaded through Data_Registry.py. Use
+get_assumption_channels to gather the hourly assumptions of several climate
+zones at once, for instance when simulating one draw profile in every climate
+zone.
+
 @author: Peter Grant
 """
+
+import os
+import numpy as np
+import pandas as pd
+
+from Time_Utilities import get_hour_of_year
+from Data_Registry import load_dataset
+
+# The climate zones provided in 'CBECC Inputs'
+Climate_Zones = ['03', '06', '10', '12', '15', '16']
+
+def read_assumptions(CZ):
+    '''
+    Reads the hourly CBECC-Res simulation assumptions for a climate zone. The
+    file extension may be upper or lower case. Each file is only parsed once,
+    see Data_Registry.py.
+    
+    inputs:
+        CZ: string. The climate zone, including '0' for single digit climate
+            zones.
+            
+    outputs:
+        assumption: pd.DataFrame. One row per hour of the year, starting on
+            Jan 1 at midnight.
+    '''
+    
+    try:
+        return load_dataset('CBECC-Res CZ{}'.format(CZ))
+    except KeyError:
+        raise FileNotFoundError('No CBECC-Res assumptions for CZ {}'.format(CZ))
+    
+def get_assumption_channels(Timestamps, CZs, assumption_col_name):
+    '''
+    Gathers the hourly simulation assumptions of several climate zones for
+    each timestamp. Every timestamp within an hour uses the value of that
+    hour. February 29 uses the values of February 28.
+    
+    inputs:
+        Timestamps: The timestamps of the monitored data set.
+        CZs: list. The climate zones, as used in read_assumptions.
+        assumption_col_name: The name of the column in the CBECC-Res data.
+            For instance, inlet water temperature is 't_Inlet'
+    
+    outputs:
+        np.array with one row per timestamp and one column per climate zone.
+    '''
+    
+    Channels = np.column_stack([read_assumptions(CZ)[assumption_col_name].to_numpy(dtype = float) for CZ in CZs])
+    
+    return Channels[get_hour_of_year(Timestamps)]
     
 def overwrite_parameter(CZ, data, data_col_name, assumption_col_name):
     '''
@@ -42,26 +97,8 @@ def overwrite_parameter(CZ, data, data_col_name, assumption_col_name):
             changes.
     '''
     
-    import pandas as pd
-    import os
-    import datetime
-    
     mod = data.copy(deep = True)
-    mod['Timestamp'] = mod.index.month.astype(str) + ' ' + mod.index.day.astype(str) \
-        + ' ' + mod.index.hour.astype(str)
-    mod['Timestamp'] = pd.to_datetime(mod['Timestamp'], format = '%m %d %H')    
-
-    assumption = pd.read_csv(os.path.join('CBECC Inputs', 'RESULTSDHWHR_CZ{}.csv'.format(CZ)),
-                             skiprows=3)   
-    assumption.loc[0, 'Timestamp'] = datetime.datetime(1900, 1, 1, 0)
-    assumption.loc[1:, 'Timestamp'] = assumption.loc[0, 'Timestamp'] + pd.to_timedelta(assumption.index[1:], unit = 'h')    
-    assumption.index = assumption['Timestamp']    
-    
-    temp = mod['Timestamp']
-    t_outdoor = assumption[assumption_col_name].to_dict()
-    
-    temp = temp.map(t_outdoor)
-    mod[data_col_name] = temp
+    mod[data_col_name] = get_assumption_channels(mod.index, [CZ], assumption_col_name)[:, 0]
 
     return mod
 
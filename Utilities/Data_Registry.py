@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:44:53 2026
+
+This script contains a registry of the reference data sets bundled with
+Flexi-HPWH: the measured closet and attic temperature differences, the
+Creekside water temperatures in Utilities/Data, and the CBECC-Res climate
+zone assumptions in 'CBECC Inputs'. Data sets are requested by name and
+located relative to this file, so they can be read from any working
+directory.
+
+Nothing is read when this script is imported. Each data set is parsed the
+first time it is requested and kept in memory for the rest of the process.
+The parsed columns are also stored as compact NumPy arrays in a cache folder,
+so later processes load the arrays instead of parsing the CSV file again.
+Integer columns are stored using the smallest integer type which holds their
+values and text is stored as fixed width strings; other columns keep their
+type. A cached data set is parsed again if its CSV file changes.
+
+The cache folder is 'Flexi-HPWH Data' in the temporary folder of this
+computer, or the folder in the FLEXI_HPWH_DATA_CACHE environment variable.
+
+Usage:
+    python Data_Registry.py
+lists the registered data sets and the files they are read from.
+
+@author: Peter Grant
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+Root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The file containing each data set, relative to the repository, and the
+# arguments used to parse it
+Datasets = {'Closet Temperature Differences': {'Path': ['Utilities', 'Data', 'TCloset-TOutdoor_C.csv']},
+            'Standard Attic Temperature Differences': {'Path': ['Utilities', 'Data', 'TAttic-TOutdoor_Standard_C.csv'],
+                                                       'Index Column': 0},
+            'HP Attic Temperature Differences': {'Path': ['Utilities', 'Data', 'TAttic-TOutdoor_HPAttic_C.csv'],
+                                                 'Index Column': 0},
+            'Creekside Closet Temperature Differences': {'Path': ['Utilities', 'Data', 'Creekside_TCloset-TOutdoor.csv']},
+            'Creekside Closet Temperature Differences (deg F)': {'Path': ['Utilities', 'Data', 'Creekside_TCloset-TOutdoor_F.csv']},
+            'Creekside Water Temperatures': {'Path': ['Utilities', 'Data', 'Creekside_WaterTemperatures.csv'],
+                                             'Index Column': 0}}
+for CZ in ['03', '06', '10', '12', '15', '16']:
+    Datasets['CBECC-Res CZ{}'.format(CZ)] = {'Path': ['CBECC Inputs', 'RESULTSDHWHR_CZ{}.csv'.format(CZ)],
+                                             'Skip Rows': 3}
+
+Cache_Folder = os.environ.get('FLEXI_HPWH_DATA_CACHE', os.path.join(tempfile.gettempdir(), 'Flexi-HPWH Data'))
+
+# Increase when the format of the cached arrays changes
+Cache_Version = 1
+
+# The data sets already loaded by this process, keyed by name
+Loaded = {}
+
+def get_path(Name):
+    '''
+    Returns the path to the file containing a data set. The file extension
+    may be upper or lower case.
+    '''
+
+    if Name not in Datasets:
+        raise KeyError('Unknown data set {}. Options are {}'.format(Name, list(Datasets)))
+    Path = os.path.normpath(os.path.join(Root, *Datasets[Name]['Path']))
+    Folder, File = os.path.split(Path)
+    if not os.path.exists(Path) and os.path.isdir(Folder):
+        Files = [file for file in os.listdir(Folder) if file.lower() == File.lower()]
+        if Files:
+            Path = os.path.join(Folder, Files[0])
+    if not os.path.exists(Path):
+        raise FileNotFoundError('The file for data set {} does not exist: {}'.format(Name, Path))
+
+    return Path
+
+def get_cache_path(Name, Path):
+    '''
+    Returns the path to the cached arrays of a data set. The path changes
+    when the source file is modified, so outdated arrays are never read.
+    '''
+
+    Status = os.stat(Path)
+    Key = hashlib.sha1(json.dumps([Name, os.path.abspath(Path), Status.st_size, Status.st_mtime_ns,
+                                   Cache_Version]).encode()).hexdigest()
+
+    return os.path.join(Cache_Folder, '{}.npz'.format(Key))
+
+def compact(Values):
+    '''
+    Converts a column to a compact NumPy array. Integer columns use the
+    smallest integer type which holds their values, text is stored as fixed
+    width strings.
+    '''
+
+    Values = np.asarray(Values)
+    if np.issubdtype(Values.dtype, np.integer) and len(Values) > 0:
+        for dtype in [np.int8, np.int16, np.int32]:
+            if np.iinfo(dtype).min <= Values.min() and Values.max() <= np.iinfo(dtype).max:
+                return Values.astype(dtype)
+    elif Values.dtype == object:
+        return Values.astype(str)
+
+    return Values
+
+def parse_dataset(Name, Path):
+    '''
+    Parses the CSV file of a data set into compact arrays.
+
+    outputs:
+        A dictionary containing the 'Index', the 'Columns' and the array of
+        each column as 'Values'.
+    '''
+
+    Settings = Datasets[Name]
+    Data = pd.read_csv(Path, index_col = Settings.get('Index Column'), skiprows = Settings.get('Skip Rows', 0))
+    Index = Data.index.to_numpy()
+
+    return {'Index': Index.astype(str) if Index.dtype == object else Index,
+            'Columns': [str(column) for column in Data.columns],
+            'Values': [compact(Data[column].to_numpy()) for column in Data.columns]}
+
+def save_arrays(Arrays, Cache_Path):
+    '''
+    Stores the arrays of a data set in the cache. The file is written under a
+    temporary name and then moved into place, so other processes never read
+    a partially written file.
+    '''
+
+    os.makedirs(os.path.dirname(Cache_Path), exist_ok = True)
+    Handle, Temporary_Path = tempfile.mkstemp(dir = os.path.dirname(Cache_Path), suffix = '.npz')
+    with os.fdopen(Handle, 'wb') as f:
+        np.savez(f, Index = Arrays['Index'], Columns = np.array(Arrays['Columns']),
+                 **{'Column_{}'.format(i): Values for i, Values in enumerate(Arrays['Values'])})
+    os.replace(Temporary_Path, Cache_Path)
+
+def load_arrays(Name):
+    '''
+    Returns the compact arrays of a data set, reading them from the cache if
+    they were stored by an earlier process and parsing the CSV file
+    otherwise.
+
+    outputs:
+        A dictionary containing the 'Index', the 'Columns' and the array of
+        each column as 'Values'.
+    '''
+
+    if Name in Loaded:
+        return Loaded[Name]
+
+    Path = get_path(Name)
+    Cache_Path = get_cache_path(Name, Path)
+    Arrays = None
+    if os.path.exists(Cache_Path):
+        try:
+            with np.load(Cache_Path) as Stored:
+                Columns = Stored['Columns'].tolist()
+                Arrays = {'Index': Stored['Index'], 'Columns': Columns,
+                          'Values': [Stored['Column_{}'.format(i)] for i in range(len(Columns))]}
+        except (OSError, ValueError, KeyError):
+            Arrays = None
+    if Arrays is None:
+        Arrays = parse_dataset(Name, Path)
+        try:
+            save_arrays(Arrays, Cache_Path)
+        except OSError:
+            # The data set can still be used if the cache folder is read only
+            pass
+    Loaded[Name] = Arrays
+
+    return Arrays
+
+def load_dataset(Name):
+    '''
+    Returns a data set as a pd.DataFrame, in the format returned by
+    pd.read_csv. The data set is loaded the first time it is requested, and
+    later calls return a copy of the stored data.
+
+    inputs:
+        Name: The name of the data set, as listed in Datasets.
+    '''
+
+    Arrays = load_arrays(Name)
+
+    return pd.DataFrame(dict(zip(Arrays['Columns'], Arrays['Values'])), index = Arrays['Index'])
+
+def clear_cache():
+    '''
+    Removes the data sets loaded by this process from memory. The arrays
+    stored in the cache folder are kept.
+    '''
+
+    Loaded.clear()
+
+if __name__ == '__main__':
+    for Name in Datasets:
+        print('{}: {}'.format(Name, get_path(Name)))
+    print('Cache folder: {}'.format(Cache_Folder))
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:19:28 2026
+
+This script calculates the carbon emissions caused by the electricity
+consumption of simulated HPWHs, and creates set temperature schedules which
+reduce those emissions.
+
+Emission factors are provided as 8760 hourly values for each grid scenario,
+for instance the marginal and average emission factors of the grid in several
+future years. The factors are stored in a table with one row per hour of the
+year and one column per scenario. Each timestep of a simulation is assigned
+the hour of the year containing it, so the factors are gathered from the
+table using that index instead of being matched by timestamp. The electricity
+consumption of every simulation is summed into the 8760 hours, and the
+emissions of every simulation under every scenario are then calculated in a
+single matrix multiplication.
+
+The emission factor files are CSV files with the hour of the year in the
+first column and one column per scenario, expressed in kg CO2e/kWh. They are
+read once per process and cached.
+
+@author: Peter Grant
+"""
+
+import numpy as np
+import pandas as pd
+
+from Preprocessing_Cache import hash_file
+from Time_Utilities import get_hour_of_year
+
+Hours_In_Year = 8760
+
+# Emission factor tables which were already read, keyed by the hash of the file
+Emission_Factor_Cache = {}
+
+def read_emission_factors(Path):
+    '''
+    Reads a table of hourly emission factors. Each file is only read once per
+    process, later calls return the cached table.
+
+    inputs:
+        Path: The path to the CSV file containing the emission factors.
+
+    outputs:
+        A pd.DataFrame with 8760 rows and one column per scenario.
+    '''
+
+    key = hash_file(Path)
+    if key not in Emission_Factor_Cache:
+        Emission_Factors = pd.read_csv(Path, index_col = 0)
+        if len(Emission_Factors) != Hours_In_Year:
+            raise ValueError('{} contains {} hours, expected {}'.format(Path, len(Emission_Factors), Hours_In_Year))
+        Emission_Factor_Cache[key] = Emission_Factors.astype(float)
+
+    return Emission_Factor_Cache[key]
+
+def get_emission_factors(Timestamps, Emission_Factors):
+    '''
+    Returns the emission factors of each timestep, in kg CO2e/kWh, as a
+    pd.DataFrame with one column per scenario.
+    '''
+
+    return pd.DataFrame(np.asarray(Emission_Factors)[get_hour_of_year(Timestamps)],
+                        index = Timestamps, columns = Emission_Factors.columns)
+
+class Emissions_Accumulator():
+    '''
+    Accumulates the hourly electricity consumption of one or more simulations
+    so the emissions can be calculated for many grid scenarios. Call update
+    with each part of the simulation results, then calculate_emissions. The
+    simulations must share the same timestamps.
+    '''
+
+    def __init__(self, Simulations = 1):
+        '''
+        inputs:
+            Simulations: The number of simulations, or a list of their names.
+        '''
+
+        if isinstance(Simulations, int):
+            Simulations = list(range(Simulations))
+        self.Simulations = list(Simulations)
+        self.Energy = np.zeros((Hours_In_Year, len(self.Simulations)))
+
+    def update(self, Timestamps, Electricity):
+        '''
+        Adds the electricity consumption of part of the simulation.
+
+        inputs:
+            Timestamps: The timestamps of this part of the simulation.
+            Electricity: The electricity consumed during each timestep, in
+                kWh. A 1D array for one simulation, or a 2D array with one
+                column per simulation.
+        '''
+
+        Electricity = np.asarray(Electricity, dtype = float).reshape(len(Timestamps), -1)
+        Hours = get_hour_of_year(Timestamps)
+        for i in range(Electricity.shape[1]):
+            self.Energy[:, i] += np.bincount(Hours, weights = Electricity[:, i], minlength = Hours_In_Year)
+
+    def calculate_emissions(self, Emission_Factors):
+        '''
+        Calculates the emissions of every simulation under every scenario.
+
+        inputs:
+            Emission_Factors: A pd.DataFrame with 8760 rows and one column per
+                scenario, in kg CO2e/kWh.
+
+        outputs:
+            A pd.DataFrame with one row per simulation and one column per
+            scenario, containing the emissions in kg CO2e.
+        '''
+
+        return pd.DataFrame(self.Energy.T @ np.asarray(Emission_Factors), index = self.Simulations,
+                            columns = Emission_Factors.columns)
+
+def calculate_emissions(Timestamps, Electricity, Emission_Factors):
+    '''
+    Calculates the emissions of complete simulation results under many grid
+    scenarios.
+
+    inputs:
+        Timestamps: The timestamps of the simulation results.
+        Electricity: The electricity consumed during each timestep, in kWh.
+            Either a pd.Series or 1D array for one simulation, or a
+            pd.DataFrame or 2D array with one column per simulation.
+        Emission_Factors: A pd.DataFrame with 8760 rows and one column per
+            scenario, in kg CO2e/kWh.
+
+    outputs:
+        A pd.DataFrame with one row per simulation and one column per
+        scenario, containing the emissions in kg CO2e.
+    '''
+
+    if isinstance(Electricity, pd.DataFrame):
+        Simulations = list(Electricity.columns)
+    elif isinstance(Electricity, pd.Series):
+        Simulations = [Electricity.name if Electricity.name is not None else 0]
+    else:
+        Simulations = np.asarray(Electricity).reshape(len(Timestamps), -1).shape[1]
+
+    Accumulator = Emissions_Accumulator(Simulations)
+    Accumulator.update(Timestamps, Electricity)
+
+    return Accumulator.calculate_emissions(Emission_Factors)
+
+def create_emissions_schedule(Emission_Factors, Set_Temperature, Set_Temperature_LoadUp, Set_Temperature_Shed,
+                              Hours_LoadUp = 4, Hours_Shed = 4):
+    '''
+    Creates a set temperature schedule which shifts electricity consumption
+    away from the hours with the highest emissions. Each day the HPWH sheds
+    load during the consecutive hours with the highest average emission
+    factor, and loads up during the consecutive hours with the lowest average
+    emission factor which end before the shed period starts. If the shed
+    period starts too early in the day to load up before it, that day has no
+    load up period.
+
+    inputs:
+        Emission_Factors: The 8760 hourly emission factors of one scenario.
+        Set_Temperature: The set temperature used outside of the load up and
+            shed periods, in deg C.
+        Set_Temperature_LoadUp: The set temperature used during the load up
+            period, in deg C.
+        Set_Temperature_Shed: The set temperature used during the shed
+            period, in deg C.
+        Hours_LoadUp: The duration of the load up period, in hours.
+        Hours_Shed: The duration of the shed period, in hours.
+
+    outputs:
+        An array containing the set temperature of each hour of the year.
+        Use get_set_temperatures to find the set temperature of each
+        timestep.
+    '''
+
+    Factors = np.asarray(Emission_Factors, dtype = float).reshape(365, 24)
+
+    # The average emission factor of the periods starting in each hour
+    def period_averages(Hours):
+        Sums = np.concatenate([np.zeros((365, 1)), np.cumsum(Factors, axis = 1)], axis = 1)
+        return (Sums[:, Hours:] - Sums[:, :-Hours]) / Hours
+
+    Start_Shed = np.argmax(period_averages(Hours_Shed), axis = 1)
+    Averages_LoadUp = period_averages(Hours_LoadUp)
+    Allowed = np.arange(Averages_LoadUp.shape[1]) + Hours_LoadUp <= Start_Shed[:, np.newaxis]
+    Start_LoadUp = np.argmin(np.where(Allowed, Averages_LoadUp, np.inf), axis = 1)
+
+    Hour = np.arange(24)
+    Shed = (Hour >= Start_Shed[:, np.newaxis]) & (Hour < Start_Shed[:, np.newaxis] + Hours_Shed)
+    LoadUp = ((Hour >= Start_LoadUp[:, np.newaxis]) & (Hour < Start_LoadUp[:, np.newaxis] + Hours_LoadUp)
+              & Allowed.any(axis = 1)[:, np.newaxis])
+
+    Schedule = np.full((365, 24), float(Set_Temperature))
+    Schedule[LoadUp] = Set_Temperature_LoadUp
+    Schedule[Shed] = Set_Temperature_Shed
+
+    return Schedule.reshape(-1)
+
+def get_set_temperatures(Timestamps, Schedule):
+    '''
+    Returns the set temperature of each timestamp from an 8760 hour schedule.
+    '''
+
+    return np.asarray(Schedule)[get_hour_of_year(Timestamps)]
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:49:35 2026
+
+This script simulates fleets of thousands of HPWHs to create the aggregate
+load shapes used in utility program planning. Simulating each HPWH with
+HPWH_MultipleNodes is far too slow at that scale, so the fleet is simulated
+using HPWH_MultipleNodes_Batch: the state of every HPWH is stored in arrays
+with one row per HPWH and each timestep advances all of them at once.
+
+The HPWHs may differ in:
+    Profile: The inputs of each HPWH are taken from one of a set of profiles,
+        such as the prepared draw profile of a site in a given installation
+        configuration and climate zone. Each profile is stored once, however
+        many HPWHs use it.
+    Draw Scale: An optional multiplier applied to the draws of each HPWH.
+    Design: The columns in Design_Parameters, such as the tank volume,
+        compressor size and UA of each HPWH.
+
+By default only aggregated results are kept: the total load of the fleet in
+each timestep and the distribution of the annual KPIs of the HPWHs. The
+results of each HPWH are accumulated in running totals, so memory does not
+grow with the length of the simulation. The state is stored in float32 by
+default, halving the memory required; totals are accumulated in float64.
+If tariffs are provided, the bill of each HPWH is accumulated the same way
+using Tariffs.Bill_Accumulator, which is updated once per Bill_Update_Length
+timesteps, and reported with the other KPIs.
+
+The profiles may also be read from an Input_Store, which packs the prepared
+inputs of many sites into memory-mapped arrays on disk. The profiles are then
+never loaded into memory as a whole: each process maps the same files and
+reads only the timesteps in the store's window.
+
+Large fleets are divided into partitions which are simulated in separate
+processes and combined afterwards. Scripts using these functions on Windows
+must protect their entry point with if __name__ == '__main__': so the worker
+processes do not re-run the script.
+
+@author: Peter Grant
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from HPWH_Utilities import Design_Parameters
+from Input_Store import Input_Store
+from Tariffs import Bill_Accumulator
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from HPWH_Model import HPWH_MultipleNodes_Batch, Model_Inputs
+
+# The outputs summed across the fleet in each timestep
+Load_Outputs = ['Electricity Consumed Total (kWh)', 'Electricity Consumed Heat Pump (kWh)',
+                'Electricity Consumed Resistance (kWh)']
+
+# The KPIs of each HPWH, using the names in the summary created by
+# Simulate_MonitoredData, and the output each is summed from
+KPI_Outputs = {'Electricity Consumed (kWh)': 'Electricity Consumed Total (kWh)',
+               'Electricity Consumed Heat Pump (kWh)': 'Electricity Consumed Heat Pump (kWh)',
+               'Electricity Consumed Backup (kWh)': 'Electricity Consumed Resistance (kWh)',
+               'Energy Added Heat Pump (kWh)': 'Total Heat Added Heat Pump (kWh)',
+               'Hot Water Draw Volume (L)': 'Hot Water Draw Volume (L)'}
+
+# The percentiles reported in the KPI distribution
+Percentiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# The number of timesteps of electricity consumption stored between updates
+# of the bills
+Bill_Update_Length = 1440
+
+def read_profile(input_data, config):
+    '''
+    Converts an input data set prepared for HPWH_MultipleNodes, such as the
+    output of Prepare_Inputs or Prepare_Creekside_InputData, into a profile.
+
+    outputs:
+        A dictionary containing an array of each column in Model_Inputs.
+    '''
+
+    col_index = config['Column Index']
+
+    return {column: input_data[:, col_index[column]].astype(float) for column in Model_Inputs
+            if column in col_index}
+
+def stack_profiles(Profiles, dtype = np.float32):
+    '''
+    Stacks the profiles into one array per input column, with one row per
+    timestep and one column per profile.
+
+    inputs:
+        Profiles: A dictionary of profiles, as returned by read_profile. Every
+            profile must have the same number of timesteps and columns.
+        dtype: The data type of the stacked arrays.
+
+    outputs:
+        The names of the profiles and a dictionary containing the stacked
+        array of each column.
+    '''
+
+    Names = list(Profiles.keys())
+    Columns = list(Profiles[Names[0]].keys())
+    for Name in Names:
+        if sorted(Profiles[Name].keys()) != sorted(Columns):
+            raise ValueError('Profile {} does not contain the same columns as profile {}'.format(Name, Names[0]))
+        if len(Profiles[Name]['Timestep (min)']) != len(Profiles[Names[0]]['Timestep (min)']):
+            raise ValueError('Profile {} does not contain the same number of timesteps as profile {}'.format(Name, Names[0]))
+
+    return Names, {column: np.column_stack([np.asarray(Profiles[Name][column], dtype = dtype) for Name in Names])
+                   for column in Columns}
+
+def simulate_partition(config, Names, Stacked, Fleet, Peak, dtype = np.float32, Update_Frequency = None,
+                       Tariffs = None, Timestamps = None):
+    '''
+    Simulates one partition of the fleet.
+
+    inputs:
+        config: The configuration shared by every HPWH.
+        Names: The names of the profiles, from stack_profiles.
+        Stacked: The stacked profiles, from stack_profiles, or an
+            Input_Store.
+        Fleet: A pd.DataFrame with one row per HPWH in this partition. See
+            simulate_fleet.
+        Peak: A boolean array stating whether each timestep is in the peak
+            period.
+        dtype: The data type used to store the state of the HPWHs.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+        Tariffs: Optional. A dictionary of tariffs, in the format described
+            in Tariffs.py, used to calculate the bill of each HPWH.
+        Timestamps: The timestamp of each timestep. Required if Tariffs is
+            provided.
+
+    outputs:
+        A dictionary containing the total of each output in Load_Outputs in
+        each timestep, 'Heat Pumps Active', the number of heat pumps active
+        in each timestep, and the KPIs of each HPWH, including the bill under
+        each tariff if Tariffs is provided.
+    '''
+
+    Number_HPWHs = len(Fleet)
+    Number_Timesteps = len(Peak)
+    Parameters = {parameter: Fleet[column].to_numpy(dtype = float) for column, parameter in Design_Parameters.items()
+                  if column in Fleet.columns}
+    HPWH = HPWH_MultipleNodes_Batch(config, Number_HPWHs, Parameters, dtype = dtype)
+
+    # The profile used by each HPWH. Columns which are the same for every
+    # profile are passed to the model as single values
+    Profile_Index = pd.Index(Names).get_indexer(Fleet['Profile'])
+    if (Profile_Index < 0).any():
+        raise ValueError('Unknown profiles {}'.format(sorted(set(Fleet['Profile'][Profile_Index < 0]))))
+    if isinstance(Stacked, Input_Store):
+        Shared = Stacked.Shared
+        Stacked = Stacked.get_columns()
+    else:
+        Shared = {column: bool((values == values[:, :1]).all()) for column, values in Stacked.items()}
+    Draw_Scale = Fleet['Draw Scale'].to_numpy(dtype = float) if 'Draw Scale' in Fleet.columns else None
+
+    Load = {output: np.zeros(Number_Timesteps) for output in Load_Outputs}
+    Load['Heat Pumps Active'] = np.zeros(Number_Timesteps)
+    Totals = {KPI: np.zeros(Number_HPWHs) for KPI in KPI_Outputs}
+    Totals['Electricity Consumed Peak (kWh, 4-9P)'] = np.zeros(Number_HPWHs)
+    if Tariffs is not None:
+        Accumulator = Bill_Accumulator(Tariffs, Number_HPWHs)
+        Electricity = np.zeros((min(Bill_Update_Length, Number_Timesteps), Number_HPWHs))
+
+    Time_Last_Update = time.time()
+    for row in range(Number_Timesteps):
+        data = {}
+        for column, values in Stacked.items():
+            data[column] = values[row, 0] if Shared[column] else values[row, Profile_Index]
+        if Draw_Scale is not None:
+            for column in ['Hot Water Draw Volume (L)', 'Water Draw Volume (L)']:
+                if column in data:
+                    data[column] = data[column] * Draw_Scale
+
+        Step = HPWH.calculate_timestep(data)
+        for output in Load_Outputs:
+            Load[output][row] = Step[output].sum(dtype = float)
+        Load['Heat Pumps Active'][row] = HPWH.HeatPump_Active.sum()
+        for KPI, output in KPI_Outputs.items():
+            Totals[KPI] += Step[output]
+        if Peak[row]:
+            Totals['Electricity Consumed Peak (kWh, 4-9P)'] += Step['Electricity Consumed Total (kWh)']
+        if Tariffs is not None:
+            Electricity[row % Bill_Update_Length] = Step['Electricity Consumed Total (kWh)']
+            if (row + 1) % Bill_Update_Length == 0 or row == Number_Timesteps - 1:
+                First = row - row % Bill_Update_Length
+                Accumulator.update(Timestamps[First:row + 1], Electricity[:row + 1 - First])
+
+        if Update_Frequency is not None and time.time() - Time_Last_Update >= Update_Frequency:
+            print('completed row {} of {}'.format(row, Number_Timesteps))
+            Time_Last_Update = time.time()
+
+    if Tariffs is not None:
+        Bills = Accumulator.calculate_bills()['Total Bill ($)'].unstack('Tariff')
+        for Tariff in Tariffs:
+            Totals['Bill, {} ($)'.format(Tariff)] = Bills[Tariff].to_numpy()
+
+    return {'Load': Load, 'KPIs': Totals}
+
+def summarize_kpis(Unit_KPIs):
+    '''
+    Describes the distribution of each KPI across the fleet, including the
+    mean, standard deviation, minimum, maximum and Percentiles.
+    '''
+
+    return Unit_KPIs.describe(percentiles = Percentiles).T.drop(columns = 'count')
+
+def simulate_fleet(config, Profiles, Fleet, Timestamps = None, Number_Workers = None, dtype = np.float32,
+                   Peak_Period = (16, 21), Unit_KPIs = False, Update_Frequency = None, Tariffs = None):
+    '''
+    Simulates a fleet of HPWHs.
+
+    inputs:
+        config: The configuration shared by every HPWH, in the format used by
+            HPWH_MultipleNodes_Batch.
+        Profiles: A dictionary of profiles, as returned by read_profile, or an
+            Input_Store. Every profile must have the same timesteps.
+        Fleet: A pd.DataFrame with one row per HPWH. 'Profile' states the
+            profile used by each HPWH. 'Draw Scale' and the columns in
+            Design_Parameters are optional.
+        Timestamps: The timestamp of each timestep. Defaults to the
+            timestamps of the Input_Store.
+        Number_Workers: The number of processes. The fleet is divided into
+            one partition per process. Defaults to the number of cores on
+            this computer.
+        dtype: The data type used to store the state of the HPWHs.
+        Peak_Period: The first hour of the peak period and the hour it ends.
+        Unit_KPIs: Set to True to also return the KPIs of each HPWH.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+        Tariffs: Optional. A dictionary of tariffs, in the format described
+            in Tariffs.py. The bill of each HPWH under each tariff is
+            reported as the KPI 'Bill, <tariff> ($)'.
+
+    outputs:
+        Load_Shape: A pd.DataFrame indexed by timestamp containing the total
+            of each output in Load_Outputs across the fleet and the number of
+            'Heat Pumps Active'.
+        KPI_Distribution: A pd.DataFrame with one row per KPI describing its
+            distribution across the fleet.
+        Unit_KPIs: A pd.DataFrame with the KPIs of each HPWH, indexed like
+            Fleet, if Unit_KPIs is True. Otherwise None.
+    '''
+
+    start_time = time.time()
+    if Number_Workers is None:
+        Number_Workers = os.cpu_count()
+    Number_Workers = max(1, min(Number_Workers, len(Fleet)))
+    if isinstance(Profiles, Input_Store):
+        Names, Stacked = Profiles.Names, Profiles
+        Number_Timesteps = len(Profiles)
+        if Timestamps is None:
+            Timestamps = Profiles.Timestamps
+    else:
+        Names, Stacked = stack_profiles(Profiles, dtype)
+        Number_Timesteps = len(Stacked['Timestep (min)'])
+    if Timestamps is None:
+        raise ValueError('Timestamps must be provided unless the profiles are read from an Input_Store')
+    Timestamps = pd.DatetimeIndex(Timestamps)
+    Peak = (Timestamps.hour >= Peak_Period[0]) & (Timestamps.hour < Peak_Period[1])
+    if len(Timestamps) != Number_Timesteps:
+        raise ValueError('The profiles contain {} timesteps but {} timestamps were provided'.format(Number_Timesteps, len(Timestamps)))
+
+    Partitions = [Fleet.iloc[Rows] for Rows in np.array_split(np.arange(len(Fleet)), Number_Workers)]
+    print('Simulating {} HPWHs in {} partitions, {} timestamps'.format(len(Fleet), len(Partitions), len(Timestamps)))
+    if Number_Workers > 1:
+        with ProcessPoolExecutor(max_workers = Number_Workers) as executor:
+            Results = list(executor.map(simulate_partition, [config] * len(Partitions), [Names] * len(Partitions),
+                                        [Stacked] * len(Partitions), Partitions, [Peak] * len(Partitions),
+                                        [dtype] * len(Partitions), [Update_Frequency] * len(Partitions),
+                                        [Tariffs] * len(Partitions), [Timestamps] * len(Partitions)))
+    else:
+        Results = [simulate_partition(config, Names, Stacked, Fleet, Peak, dtype, Update_Frequency, Tariffs, Timestamps)]
+
+    Load_Shape = pd.DataFrame({output: sum(Result['Load'][output] for Result in Results)
+                               for output in Results[0]['Load']}, index = Timestamps)
+    KPIs = pd.DataFrame({KPI: np.concatenate([Result['KPIs'][KPI] for Result in Results])
+                         for KPI in Results[0]['KPIs']}, index = Fleet.index)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        KPIs['Average Heat Pump COP'] = KPIs['Energy Added Heat Pump (kWh)'] / KPIs['Electricity Consumed Heat Pump (kWh)']
+    print('processing time is {} min'.format((time.time() - start_time)/60))
+
+    return Load_Shape, summarize_kpis(KPIs), KPIs if Unit_KPIs else None
@@ -14,14 +14,16 @@ import math
 import numpy as np
 import os
 import sys
-from Installation_Configuration import get_temperatures
+from Installation_Configuration import get_temperatures, get_temperature_coefficients, apply_temperature_coefficients
 from Set_Temperature_Profiles import get_profile
-from CZ_Assumptions import overwrite_parameter
-from sklearn.metrics import mean_squared_error
+from CZ_Assumptions import overwrite_parameter, get_assumption_channels, Climate_Zones
+from Parallel_Simulation import find_reinitialization_rows, split_segments, simulate_segments
+from Preprocessing_Cache import hash_dataframe, get_cache_key, save_dataframe, load_dataframe
+from Tariffs import calculate_bills
+from Emissions import calculate_emissions, get_set_temperatures
 
-cwd = os.getcwd()
-sys.path.append(cwd, '..')
-from HPWH_Model import HPWH_MultipleNodes
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from HPWH_Model import HPWH_MultipleNodes, HPWH_MultipleNodes_Batch
 
 #Constants used in water-based calculations
 SpecificHeat_Water = 4.190 #J/g-C
@@ -44,6 +46,12 @@ kWh_In_MWh = 1000 #kWh in MWh
 Liters_In_Gallon = 3.78541 #The number of liters in a gallon
 Temperature_MixingValve_Set = 48.9
 
+# The columns describing a HPWH design, as used in Test_Matrix_Planner.py, and
+# the configuration entries they set
+Design_Parameters = {'Tank volume (L)': 'Volume Tank (L)',
+                     'UA (W/K)': 'Jacket Loss Coefficient (W/K)',
+                     'Compressor size (W)': 'Heat Pump Heat Addition Rate (W)'}
+
 def Prepare_Creekside_DrawProfile(data, config, Installation_Configuration, note):
     '''
     This function accepts a Creekside draw profile and performs the
@@ -137,6 +145,120 @@ def Prepare_Creekside_DrawProfile(data, config, Installation_Configuration, note
     
     return Draw_Profile
 
+def Apply_Case_Type(Draw_Profile, Case_Type):
+    '''
+    Scales the water draws in a Creekside draw profile to represent the number
+    of dwellings served by the HPWH.
+    
+    inputs:
+        Draw_Profile: The prepared draw profile.
+        Case_Type: 'SF' reduces the flow rate to 25%, representing a single
+            dwelling. '3' reduces the flow rate to 75%, representing 3
+            dwellings. '4' does not modify the flow rate.
+    
+    Buildings served by several HPWHs sharing the draws can be simulated
+    using HPWH_Plant in HPWH_Model.
+    '''
+    
+    if Case_Type == 'SF':
+        print('Reducing flow to 25%')
+        Draw_Profile['Water Draw Volume (L)'] = Draw_Profile['Water Draw Volume (L)'] * 0.25
+    elif Case_Type == '3':
+        print('Reducing flow to 75%')
+        Draw_Profile['Water Draw Volume (L)'] = Draw_Profile['Water Draw Volume (L)'] * 0.75
+        
+    return Draw_Profile
+
+def get_draw_profile_cache_key(Draw_Hash, Installation_Configuration, note, Case_Type):
+    '''
+    Returns the key identifying a prepared Creekside draw profile in the
+    preprocessing cache. Only the climate zone in the note changes the
+    prepared data set.
+    '''
+    
+    if note.startswith('CZ'):
+        cz = note.split(' ')[-1].zfill(2)
+    else:
+        cz = None
+        
+    return get_cache_key(Draw_Hash, Installation_Configuration, cz, Case_Type)
+
+def Prepare_Creekside_DrawProfile_Cached(data, config, Installation_Configuration, note, Case_Type,
+                                         Cache_Folder, Draw_Hash = None):
+    '''
+    Returns the prepared Creekside draw profile from the preprocessing cache,
+    preparing and storing it first if this combination of draw profile,
+    installation configuration, climate zone and case type has not been
+    prepared before.
+    
+    inputs:
+        data: The Creekside draw profile being used in this simulation. May
+            be None if the prepared draw profile is known to be in the cache.
+        config: The configuration file used to specify the HPWH.
+        Installation_Configuration: The manner in which this HPWH is installed.
+        note: The note from the test matrix. Only the climate zone is used.
+        Case_Type: The case type, as used in Apply_Case_Type.
+        Cache_Folder: The folder used to store the prepared draw profiles.
+        Draw_Hash: A hash identifying the draw profile, such as the hash of
+            the input file. Calculated from data if not provided.
+    '''
+    
+    if Draw_Hash is None:
+        Draw_Hash = hash_dataframe(data)
+    key = get_draw_profile_cache_key(Draw_Hash, Installation_Configuration, note, Case_Type)
+    
+    Draw_Profile = load_dataframe(Cache_Folder, key)
+    if Draw_Profile is None:
+        if data is None:
+            raise ValueError('The prepared draw profile {} is not in the cache {} and no draw profile was '
+                             'provided to prepare it'.format(key, Cache_Folder))
+        print('Preparing draw profile and storing it in the cache')
+        Draw_Profile = Prepare_Creekside_DrawProfile(data, config, Installation_Configuration, note)
+        Draw_Profile = Apply_Case_Type(Draw_Profile, Case_Type)
+        save_dataframe(Draw_Profile, Cache_Folder, key)
+    else:
+        print('Read prepared draw profile from the cache')
+        
+    return Draw_Profile
+
+def Apply_Set_Temperature_Profile(Draw_Profile, Set_Temperature_Profile):
+    '''
+    Sets the set temperature of each timestep in the prepared draw profile.
+    
+    inputs:
+        Draw_Profile: The prepared draw profile.
+        Set_Temperature_Profile: The name of a profile in
+            Set_Temperature_Profiles.py, an array containing the set
+            temperature of each hour of the year, or False to keep the
+            monitored set temperature.
+    '''
+    
+    if isinstance(Set_Temperature_Profile, np.ndarray):
+        Draw_Profile['Set Temperature (deg C)'] = get_set_temperatures(Draw_Profile.index, Set_Temperature_Profile)
+    elif Set_Temperature_Profile != False:    
+        Temperature_Tank_Set = get_profile(Set_Temperature_Profile)
+        Draw_Profile['Hour'] = Draw_Profile['Hour'].astype(str)
+        Draw_Profile['Set Temperature (deg C)'] = Draw_Profile['Hour'].map(Temperature_Tank_Set)
+        Draw_Profile['Hour'] = Draw_Profile['Hour'].astype(int)    
+        
+    return Draw_Profile
+
+def Apply_ER_Adjustment(Draw_Profile, config, note):
+    '''
+    If the note starts with 'ER', adjusts the resistance deadbands so the
+    resistance elements activate at 40.55 deg C whenever the set temperature
+    is raised.
+    '''
+    
+    if note.startswith('ER'):
+        Set_Temperature = Draw_Profile['Set Temperature (deg C)']
+        Draw_Profile['Resistance Deadband (deg C)'] = np.where(Set_Temperature != 51.6, Set_Temperature - 40.55, 
+                                                                config['Resistance Deadband (deg C)'])
+        Draw_Profile['Resistance Deadband, HP Active (deg C)'] = np.where(Set_Temperature != 51.6, Set_Temperature - 40.55, 
+                                                                           config['Resistance Deadband, HP Active (deg C)'])
+        
+    return Draw_Profile
+
 def Calculate_InitialTemps_Creekside(config, Draw_Profile):
     
     # Initialize tank temperatures using a linear regression between the measured
@@ -158,6 +280,12 @@ def Prepare_Creekside_InputData(Draw_Profile, config):
                              'Timestep (min)', 'Inlet Water Temperature (deg C)', 'Water Draw Volume (L)',
                              'Water_RemoteTemp_C', 'Hot Water Draw Volume (L)', 
                              'Calculated Water Draw Volume (L)', 'Evaporator Air Inlet Temperature (deg C)']]
+    input_data['Set Temperature, Heat Pump (deg C)'] = input_data['Set Temperature (deg C)']
+    input_data['Set Temperature, Resistance (deg C)'] = input_data['Set Temperature (deg C)']
+    # Include the resistance deadbands if they vary during the simulation
+    for column in ['Resistance Deadband (deg C)', 'Resistance Deadband, HP Active (deg C)']:
+        if column in Draw_Profile.columns:
+            input_data[column] = Draw_Profile[column]
 
     # Initialize model output columns
     input_data['Jacket Losses (kWh)'] = 0
@@ -183,6 +311,7 @@ def Prepare_Creekside_InputData(Draw_Profile, config):
     input_data['Heat Pump Deadband (deg C)'] = 0
     input_data['Resistance Set Temperature (deg C)'] = 0
     input_data['Resistance Set Temperature, HP Active (deg C)'] = 0
+    input_data['State of Charge (%)'] = 0
 
     # Add the column index to the configuration
     col_index = dict(zip(input_data.columns, list(range(0,len(input_data.columns)))))
@@ -194,98 +323,153 @@ def Prepare_Creekside_InputData(Draw_Profile, config):
     
     return input_data, config
     
-def calc_rmse(Model, config, rejected, Update_Frequency):
-    
-        Model_month = Model.copy(deep = True)
-        Model_month['Power_EnergySum_kWh'] -= Model_month.loc[Model_month.index[0], 'Power_EnergySum_kWh']
-        print('First timestep is {} min'.format(Model_month.loc[Model_month.index[0], 'Timestep (min)']))      
-
-        input_data = Model_month.copy(deep = True)
-        input_data = input_data[['Set Temperature (deg C)', 'Ambient Temperature (deg C)', 
-           'Timestep (min)', 'Inlet Water Temperature (deg C)',
-           'Hot Water Draw Volume (L)', 'Evaporator Air Inlet Temperature (deg C)']]
-
-        input_data['Jacket Losses (kWh)'] = 0
-        input_data['Energy Withdrawn (kWh)'] = 0
-        input_data['Heat Added Heat Pump (kWh)'] = 0
-        input_data['Heat Added Backup (kWh)'] = 0    
-        input_data['Total Energy Change (kWh)'] = 0  
-        input_data['Node Temperatures (deg C)'] = 0
-        input_data['COP Adjust Tamb'] = 0
-        input_data['COP'] = 0
-        input_data['Electricity Consumed Heat Pump (kWh)'] = 0
-        input_data['Electricity Consumed Resistance (kWh)'] = 0
-        input_data['Electricity Consumed Total (kWh)'] = 0
-        input_data['Total Jacket Losses (kWh)'] = 0
-        input_data['Total Energy Withdrawn (kWh)'] = 0
-        input_data['Total Heat Added Heat Pump (kWh)'] = 0
-        input_data['Total Heat Added Backup (kWh)'] = 0
-        input_data['Total Heat Added (kWh)'] = 0
-        input_data['Node Energy Change (kWh)'] = 0
-        input_data['Heat Pump Heat Addition (kW)'] = 0
-        print(input_data.index)
-        col_index = dict(zip(input_data.columns, list(range(0,len(input_data.columns)))))
-        config['Column Index'] = col_index
-        input_data = input_data.to_numpy()
-        input_data = input_data.astype('object')
-
-        print('created input data set')
-
-        HPWH = HPWH_MultipleNodes(config)
-        print('initialized model')
-
-        start_time = time.time()
-
-        print('{} timestamps'.format(len(input_data)))
-
-        Time_Since_Update = time.time()
-        for row in range(0, len(input_data)):
-            timestamp = Model_month.loc[Model_month.index[row], 'Timestamp']
-            prior_date = timestamp - pd.Timedelta(1, unit = 'd')
-            if len(rejected.index > 0):
-                if prior_date in rejected.index:
-                    print('Re-initializing at {}'.format(timestamp))
-                    x = [config['Lower Thermostat Node'], config['Upper Thermostat Node']]
-                    y = [Model_month.loc[timestamp, 'T_Tank_Lower_C'], Model_month.loc[timestamp, 'T_Tank_Upper_C']]
-                    coefficients = np.polyfit(x, y, 1)
-                    regression = np.poly1d(coefficients)
-                    Nodes = range(config['Number of Nodes'])
-                    HPWH.Node_Temperatures = regression(Nodes)
-                    input_data[row, col_index['Timestep (min)']] = 0
-                    dQ_Measured = Model_month.loc[Model_month.index[row], 'Power_EnergySum_kWh'] - Model_month.loc[Model_month.index[row-1], 'Power_EnergySum_kWh']
-                    Model_month.loc[Model_month.index[row]:, 'Power_EnergySum_kWh'] += -dQ_Measured
-            output = HPWH.calculate_timestep(input_data[row])
-
-            input_data[row] = output
-
-            if time.time() - Time_Since_Update >= Update_Frequency:
-                print('completed timestamp {}'.format(timestamp))
-                Time_Since_Update = time.time()
-                
-        result = pd.DataFrame(input_data, index = Model.index, columns = col_index.keys())
-        end_time = time.time()
-        print('processing time is {}'.format(end_time - start_time))
-        print('time per iteration is {}'.format((end_time - start_time)/len(input_data)))
-
-        columns = []
-        for i in range(len(result.loc[result.index[0], 'Node Temperatures (deg C)'])):
-            columns.append('Node Temperature {} (deg C)'.format(i))
-        result[columns] = pd.DataFrame(result['Node Temperatures (deg C)'].tolist(), index = result.index)
-
-        if result['Node Temperature {} (deg C)'.format(HPWH.Lower_Thermostat_Node)].isnull().values.any() == False:
-            rmse = math.sqrt(mean_squared_error(Model_month['T_Tank_Lower_C'], result['Node Temperature {} (deg C)'.format(HPWH.Lower_Thermostat_Node)]))
+def Simulate_Monitored_Period(Model, config, rejected, Update_Frequency = None, Number_Workers = None):
+    '''
+    Simulates a prepared Creekside data set for comparison with the
+    measurements. The model is initialized from the measured thermostat
+    temperatures, and re-initialized on each day following a rejected day.
+    Used by calc_rmse and Validation.py.
+    
+    inputs:
+        Model: The prepared Creekside draw profile, as returned by
+            Prepare_Creekside_DrawProfile.
+        config: The configuration of the HPWH, including the initial node
+            temperatures.
+        rejected: A pd.DataFrame indexed by the dates that were rejected from
+            the monitored data set.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+        Number_Workers: The number of processes used to simulate the
+            segments between re-initializations.
+    
+    outputs:
+        result: A pd.DataFrame containing the model outputs, including the
+            temperature of each node.
+        Model_month: A copy of Model in which 'Power_EnergySum_kWh' starts at
+            0 and excludes the measured energy consumption across each
+            re-initialization.
+    '''
+    
+    Model_month = Model.copy(deep = True)
+    Model_month['Power_EnergySum_kWh'] -= Model_month.loc[Model_month.index[0], 'Power_EnergySum_kWh']
+    print('First timestep is {} min'.format(Model_month.loc[Model_month.index[0], 'Timestep (min)']))      
+
+    input_data = Model_month.copy(deep = True)
+    input_data = input_data[['Set Temperature (deg C)', 'Ambient Temperature (deg C)', 
+       'Timestep (min)', 'Inlet Water Temperature (deg C)',
+       'Hot Water Draw Volume (L)', 'Evaporator Air Inlet Temperature (deg C)']]
+    input_data['Set Temperature, Heat Pump (deg C)'] = input_data['Set Temperature (deg C)']
+    input_data['Set Temperature, Resistance (deg C)'] = input_data['Set Temperature (deg C)']
+
+    input_data['Jacket Losses (kWh)'] = 0
+    input_data['Energy Withdrawn (kWh)'] = 0
+    input_data['Heat Added Heat Pump (kWh)'] = 0
+    input_data['Heat Added Backup (kWh)'] = 0    
+    input_data['Total Energy Change (kWh)'] = 0  
+    input_data['Node Temperatures (deg C)'] = 0
+    input_data['COP Adjust Tamb'] = 0
+    input_data['COP'] = 0
+    input_data['PowerMultiplier'] = 0
+    input_data['Electricity Consumed Heat Pump (kWh)'] = 0
+    input_data['Electricity Consumed Resistance (kWh)'] = 0
+    input_data['Electricity Consumed Total (kWh)'] = 0
+    input_data['Total Jacket Losses (kWh)'] = 0
+    input_data['Total Energy Withdrawn (kWh)'] = 0
+    input_data['Total Heat Added Heat Pump (kWh)'] = 0
+    input_data['Total Heat Added Backup (kWh)'] = 0
+    input_data['Total Heat Added (kWh)'] = 0
+    input_data['Node Energy Change (kWh)'] = 0
+    input_data['Heat Pump Heat Addition (kW)'] = 0
+    print(input_data.index)
+    col_index = dict(zip(input_data.columns, list(range(0,len(input_data.columns)))))
+    config['Column Index'] = col_index
+    input_data = input_data.to_numpy()
+    input_data = input_data.astype('object')
+
+    print('created input data set')
+
+    # The model is re-initialized from the thermostat measurements on each
+    # day following a rejected day. Identify those rows up front and split
+    # the data set into segments that can be simulated independently
+    Reinitialization_Rows = find_reinitialization_rows(Model_month['Timestamp'], rejected)
+    Segments = split_segments(len(input_data), Reinitialization_Rows)
+
+    Initial_Node_Temperatures = []
+    Nodes = range(config['Number of Nodes'])
+    x = [config['Lower Thermostat Node'], config['Upper Thermostat Node']]
+    for start, end in Segments:
+        if start in Reinitialization_Rows:
+            print('Re-initializing at {}'.format(Model_month.loc[Model_month.index[start], 'Timestamp']))
+            y = [Model_month.loc[Model_month.index[start], 'T_Tank_Lower_C'], Model_month.loc[Model_month.index[start], 'T_Tank_Upper_C']]
+            coefficients = np.polyfit(x, y, 1)
+            regression = np.poly1d(coefficients)
+            Initial_Node_Temperatures.append(regression(Nodes))
+        else:
+            Initial_Node_Temperatures.append(config['Node Temperatures (deg C)'])
+    input_data[Reinitialization_Rows, col_index['Timestep (min)']] = 0
+
+    # Remove the measured energy consumption across each re-initialization
+    # so the cumulative measurement stays aligned with the model
+    Energy_Measured = Model_month['Power_EnergySum_kWh'].to_numpy(dtype = float)
+    dQ_Measured = np.zeros(len(Energy_Measured))
+    Offset_Rows = Reinitialization_Rows[Reinitialization_Rows > 0]
+    dQ_Measured[Offset_Rows] = Energy_Measured[Offset_Rows] - Energy_Measured[Offset_Rows - 1]
+    Model_month['Power_EnergySum_kWh'] = Energy_Measured - np.cumsum(dQ_Measured)
+
+    print('initialized model')
+
+    start_time = time.time()
+
+    print('{} timestamps'.format(len(input_data)))
+
+    input_data = simulate_segments(config, input_data, Segments, Initial_Node_Temperatures,
+                                   Number_Workers = Number_Workers, Update_Frequency = Update_Frequency)
+            
+    result = pd.DataFrame(input_data, index = Model.index, columns = col_index.keys())
+    end_time = time.time()
+    print('processing time is {}'.format(end_time - start_time))
+    print('time per iteration is {}'.format((end_time - start_time)/len(input_data)))
+
+    columns = []
+    for i in range(len(result.loc[result.index[0], 'Node Temperatures (deg C)'])):
+        columns.append('Node Temperature {} (deg C)'.format(i))
+    result[columns] = pd.DataFrame(result['Node Temperatures (deg C)'].tolist(), index = result.index)
+
+    return result, Model_month
+
+def calc_rmse(Model, config, rejected, Update_Frequency, Number_Workers = None, Output_Path = None):
+        '''
+        Simulates the monitored data and returns the root mean squared error
+        of the lower thermostat temperature. If Output_Path is provided the
+        measured and modelled temperatures are saved there, so they can be
+        plotted later using Reports.py.
+        '''
+    
+        result, Model_month = Simulate_Monitored_Period(Model, config, rejected, Update_Frequency, Number_Workers)
+
+        Lower_Thermostat_Node = config['Lower Thermostat Node']
+        if result['Node Temperature {} (deg C)'.format(Lower_Thermostat_Node)].isnull().values.any() == False:
+            Error = (Model_month['T_Tank_Lower_C'].to_numpy(dtype = float)
+                     - result['Node Temperature {} (deg C)'.format(Lower_Thermostat_Node)].to_numpy(dtype = float))
+            rmse = math.sqrt(np.mean(Error**2))
         else:
             print('config yielded NaN')
             rmse = 1000
 
-        Model_month['T_Tank_Lower_C'].plot(figsize = (12, 6))
-        result['Node Temperature {} (deg C)'.format(HPWH.Lower_Thermostat_Node)].plot(figsize = (12, 6))
+        if Output_Path is not None:
+            Temperatures = pd.DataFrame({'Measured Temperature, Lower Thermostat (deg C)': Model_month['T_Tank_Lower_C'].to_numpy(dtype = float),
+                                         'Modelled Temperature, Lower Thermostat (deg C)': result['Node Temperature {} (deg C)'.format(Lower_Thermostat_Node)].to_numpy(dtype = float)},
+                                        index = Model_month.index)
+            Temperatures.to_csv(Output_Path)
         
         print('rmse is {}'.format(rmse))
         
+        return rmse
+        
 def Simulate_MonitoredData(Draw_Profile, config, Set_Temperature_Profile, Installation_Configuration, 
                            output_folder, Simulation_Name, Case_Type, note, Reduced_Output, summary, 
-                           simulation):
+                           simulation, Cache_Folder = None, Draw_Hash = None, Tariffs = None,
+                           Emission_Factors = None, KPI_Only = False):
     '''
     This function can be called to run a simulation using monitored data
     from Creekside. It is used by the multi simulation tool
@@ -295,7 +479,9 @@ def Simulate_MonitoredData(Draw_Profile, config, Set_Temperature_Profile, Instal
         config: The configuration file for the HPWH
         Set_Temperature_Profile: The name of the set temperature profile to
             use in the simulation. Must match a profile indicated in 
-            Set_Temperature_Profiles.py
+            Set_Temperature_Profiles.py. Can also be an array containing the
+            set temperature of each hour of the year, such as those created
+            by create_emissions_schedule in Emissions.py
         Installation_Configuration: The name of the installation configuration
            to use in the simulation. Must match a configuration listed in 
            Installation_Configuration.py
@@ -316,27 +502,39 @@ def Simulate_MonitoredData(Draw_Profile, config, Set_Temperature_Profile, Instal
             series of simulations. The script will store results in new columns
             in this file.
         simulation: The test number of the current simulation.
+        Cache_Folder: The folder used to store prepared draw profiles. If
+            provided, the prepared draw profile is read from the cache when
+            available instead of being prepared again.
+        Draw_Hash: A hash identifying the draw profile, such as the hash of
+            the input file. Calculated from Draw_Profile if not provided.
+        Tariffs: A dictionary of tariffs in the format described in
+            Tariffs.py. If provided, the total bill under each tariff is
+            added to summary.
+        Emission_Factors: A pd.DataFrame containing the hourly emission
+            factors of one or more grid scenarios, as read by
+            read_emission_factors in Emissions.py. If provided, the emissions
+            under each scenario are added to summary.
+        KPI_Only: Set to True to only add the results to summary, without
+            saving the results of each timestep or the daily and monthly COP.
     '''
     
     print('In Simulate_MonitoredData')
     beginning = time.time()
 
-    Draw_Profile = Prepare_Creekside_DrawProfile(Draw_Profile, 
-                                                 config, 
-                                                 Installation_Configuration,
-                                                 note)
-    if Set_Temperature_Profile != False:    
-        Temperature_Tank_Set = get_profile(Set_Temperature_Profile)
-        Draw_Profile['Hour'] = Draw_Profile['Hour'].astype(str)
-        Draw_Profile['Set Temperature (deg C)'] = Draw_Profile['Hour'].map(Temperature_Tank_Set)
-        Draw_Profile['Hour'] = Draw_Profile['Hour'].astype(int)    
-
-    if Case_Type == 'SF':
-        print('Reducing flow to 25%')
-        Draw_Profile['Water Draw Volume (L)'] = Draw_Profile['Water Draw Volume (L)'] * 0.25
-    elif Case_Type == '3':
-        print('Reducing flow to 75%')
-        Draw_Profile['Water Draw Volume (L)'] = Draw_Profile['Water Draw Volume (L)'] * 0.75
+    if Cache_Folder is None:
+        Draw_Profile = Prepare_Creekside_DrawProfile(Draw_Profile, 
+                                                     config, 
+                                                     Installation_Configuration,
+                                                     note)
+        Draw_Profile = Apply_Case_Type(Draw_Profile, Case_Type)
+    else:
+        Draw_Profile = Prepare_Creekside_DrawProfile_Cached(Draw_Profile, config, Installation_Configuration, 
+                                                            note, Case_Type, Cache_Folder, Draw_Hash)
+
+    Draw_Profile = Apply_Set_Temperature_Profile(Draw_Profile, Set_Temperature_Profile)
+    adjusting_ER = note.startswith('ER')
+    Draw_Profile = Apply_ER_Adjustment(Draw_Profile, config, note)
+    config['Mixing Valve Set Temperature (deg C)'] = Temperature_MixingValve_Set
     
     config = Calculate_InitialTemps_Creekside(config, Draw_Profile)
     input_data, config = Prepare_Creekside_InputData(Draw_Profile, config)
@@ -353,34 +551,15 @@ def Simulate_MonitoredData(Draw_Profile, config, Set_Temperature_Profile, Instal
 
     print('{} timestamps'.format(len(input_data)))
 
-    result = pd.DataFrame(columns = col_index.keys())
+    # The mixing valve and resistance deadband calculations are performed by
+    # the model, so the loop only needs to step through the rows
+    Timestamps = Draw_Profile['Timestamp'].to_numpy()
     Time_Last_Update = time.time()
-    adjusting_ER = False
     for row in range(0, len(input_data)):
-        timestamp = Draw_Profile.loc[Draw_Profile.index[row], 'Timestamp']
-        Set_Temperature = Draw_Profile.loc[Draw_Profile.index[row], 'Set Temperature (deg C)']
-        if note.startswith('ER'):
-            adjusting_ER = True
-            if Set_Temperature != 51.6:
-                HPWH.Upper_Resistance_Deadband = Set_Temperature - 40.55
-                HPWH.Upper_Resistance_Deadband_HPActive = Set_Temperature - 40.55
-            else:
-                HPWH.Upper_Resistance_Deadband = config['Resistance Deadband (deg C)']
-                HPWH.Upper_Resistance_Deadband_HPActive = config['Resistance Deadband, HP Active (deg C)']
-        input_data[row, col_index['Resistance Set Temperature (deg C)']] = Set_Temperature - HPWH.Upper_Resistance_Deadband
-        input_data[row, col_index['Resistance Set Temperature, HP Active (deg C)']] = Set_Temperature - HPWH.Upper_Resistance_Deadband_HPActive
-        
-        input_data[row, col_index['Calculated Water Draw Volume (L)']] = (input_data[row, col_index['Water Draw Volume (L)']] * input_data[row, col_index['Water_RemoteTemp_C']] - 
-            input_data[row, col_index['Water Draw Volume (L)']] * Temperature_MixingValve_Set) / (input_data[row, col_index['Water_RemoteTemp_C']] - HPWH.Node_Temperatures[HPWH.Upper_Thermostat_Node])
-        input_data[row, col_index['Hot Water Draw Volume (L)']] = np.minimum(input_data[row, col_index['Calculated Water Draw Volume (L)']],
-            input_data[row, col_index['Water Draw Volume (L)']])        
-
-        output = HPWH.calculate_timestep(input_data[row])
-
-        input_data[row] = output
+        input_data[row] = HPWH.calculate_timestep(input_data[row])
      
         if time.time() - Time_Last_Update >= Update_Frequency:
-            print('completed timestamp {}'.format(timestamp))
+            print('completed timestamp {}'.format(Timestamps[row]))
             Time_Last_Update = time.time()
 
     result = pd.DataFrame(input_data, index = Draw_Profile.index, columns = col_index.keys())
@@ -408,6 +587,15 @@ def Simulate_MonitoredData(Draw_Profile, config, Set_Temperature_Profile, Instal
     summary.loc[simulation, 'Electricity Consumed Peak (kWh, 4-9P)'] = result.loc[(result.index.hour >= 16) & (result.index.hour < 21), 'Electricity Consumed Total (kWh)'].sum()
     summary.loc[simulation, 'Water Draw Volume (gal)'] = result['Water Draw Volume (L)'].sum() / Liters_In_Gallon
     summary.loc[simulation, 'Annual COP'] = result['Energy Supplied (kWh)'].sum() / summary.loc[simulation, 'Electricity Consumed (kWh)']
+    if Tariffs is not None:
+        Bills = calculate_bills(Tariffs, result.index, result['Electricity Consumed Total (kWh)'].to_numpy(dtype = float))
+        for Tariff, Bill in Bills['Total Bill ($)'].droplevel('Simulation').items():
+            summary.loc[simulation, 'Bill, {} ($)'.format(Tariff)] = Bill
+    if Emission_Factors is not None:
+        Emissions = calculate_emissions(result.index, result['Electricity Consumed Total (kWh)'].to_numpy(dtype = float),
+                                        Emission_Factors)
+        for Scenario in Emissions.columns:
+            summary.loc[simulation, 'Emissions, {} (kg CO2e)'.format(Scenario)] = Emissions.loc[0, Scenario]
     
     daily = result[['Energy Supplied (kWh)', 'Electricity Consumed Total (kWh)', 'Electricity Consumed Heat Pump (kWh)', 'Electricity Consumed Resistance (kWh)']].groupby(result.index.date).sum()
     daily['HPWH COP'] = daily['Energy Supplied (kWh)'] / daily['Electricity Consumed Total (kWh)']
@@ -435,16 +623,146 @@ def Simulate_MonitoredData(Draw_Profile, config, Set_Temperature_Profile, Instal
     print('processing time is {} min'.format((end_time - start_time)/Seconds_In_Minute))
     print('time per iteration is {}'.format((end_time - start_time)/len(input_data)))    
     print('Electricity consumption is {}'.format(result['Electricity Consumed Total (kWh)'].sum()))
-    
-    cumsum = result['Electricity Consumed Total (kWh)'].cumsum()
-    cumsum.plot(figsize = (12, 6))
 
-    import os
-    output_path = os.path.join(output_folder, Simulation_Name)
-    result.to_csv(output_path)
-    
-    daily.to_csv(os.path.join(output_folder, 'daily COP', 'daily_COP_{}.csv'.format(Simulation_Number)))
-    monthly.to_csv(os.path.join(output_folder, 'monthly COP', 'monthly_COP_{}.csv'.format(Simulation_Number)))
+    # Figures are created afterwards from the saved results, see Reports.py
+    if KPI_Only == False:
+        output_path = os.path.join(output_folder, Simulation_Name)
+        result.to_csv(output_path)
+        
+        daily.to_csv(os.path.join(output_folder, 'daily COP', 'daily_COP_{}.csv'.format(Simulation_Number)))
+        monthly.to_csv(os.path.join(output_folder, 'monthly COP', 'monthly_COP_{}.csv'.format(Simulation_Number)))
 
     return summary
-    
\ No newline at end of file
+    
+def Simulate_ClimateZones(Draw_Profile, config, Set_Temperature_Profile, Installation_Configuration,
+                          Case_Type, note = '', CZs = None, Tariffs = None, Emission_Factors = None,
+                          Designs = None):
+    '''
+    Simulates one Creekside draw profile in several climate zones in a single
+    pass. The draw profile is prepared once. The inlet water and outdoor air
+    temperatures of every climate zone are then gathered from the CBECC-Res
+    assumptions as one column per climate zone, the ambient and evaporator
+    air inlet temperatures are calculated for every column at once, and all
+    climate zones are simulated together using HPWH_MultipleNodes_Batch.
+    Yields the same results as calling Simulate_MonitoredData with the note
+    'CZ #' for each climate zone.
+    
+    inputs:
+        Draw_Profile: The Creekside draw profile used in this simulation.
+        config: The configuration file for the HPWH.
+        Set_Temperature_Profile: The set temperature profile, as used in
+            Simulate_MonitoredData.
+        Installation_Configuration: The name of the installation configuration
+           to use in the simulation. Must match a configuration listed in 
+           Installation_Configuration.py
+        Case_Type: The case type, as used in Apply_Case_Type.
+        note: A note specified in the test matrix. Only notes starting with
+            'ER' are used. Climate zones in the note are ignored.
+        CZs: The climate zones to simulate. Defaults to every climate zone in
+            'CBECC Inputs'.
+        Tariffs: A dictionary of tariffs in the format described in
+            Tariffs.py. If provided, the total bill under each tariff is
+            added to the summary.
+        Emission_Factors: A pd.DataFrame containing the hourly emission
+            factors of one or more grid scenarios. If provided, the emissions
+            under each scenario are added to the summary.
+        Designs: Optional. A pd.DataFrame with one row per HPWH design and
+            any of the columns in Design_Parameters. Every design is
+            simulated in every climate zone in the same batch. Columns
+            which are not provided use the values in config.
+            
+    outputs:
+        summary: A pd.DataFrame with one row per climate zone, containing the
+            summary columns of Simulate_MonitoredData. If Designs is
+            provided, there is one row per climate zone and design, indexed
+            by both, and the design parameters are included.
+    '''
+    
+    if CZs is None:
+        CZs = Climate_Zones
+    CZs = [str(CZ).zfill(2) for CZ in CZs]
+    start_time = time.time()
+    
+    Draw_Profile = Prepare_Creekside_DrawProfile(Draw_Profile, config, Installation_Configuration, '')
+    Draw_Profile = Apply_Case_Type(Draw_Profile, Case_Type)
+    Draw_Profile = Apply_Set_Temperature_Profile(Draw_Profile, Set_Temperature_Profile)
+    Draw_Profile = Apply_ER_Adjustment(Draw_Profile, config, note)
+    config['Mixing Valve Set Temperature (deg C)'] = Temperature_MixingValve_Set
+    config = Calculate_InitialTemps_Creekside(config, Draw_Profile)
+    
+    # Build the temperatures of every climate zone, with one column per
+    # climate zone
+    Timestamps = Draw_Profile.index
+    T_Inlet = (get_assumption_channels(Timestamps, CZs, 't_Inlet') - 32) * 1/K_To_F_MagnitudeOnly
+    T_Outdoor = (get_assumption_channels(Timestamps, CZs, 't_outdoor_drybulb') - 32) * 1/K_To_F_MagnitudeOnly
+    T_Ambient_Monitored = ((Draw_Profile['T_Cabinet_F'] - 32) * 1/K_To_F_MagnitudeOnly).to_numpy(dtype = float)
+    T_Ambient, T_Evaporator = apply_temperature_coefficients(Timestamps, T_Outdoor, T_Ambient_Monitored,
+                                                             get_temperature_coefficients(Installation_Configuration))
+    
+    # Repeat the climate zone temperatures for every design, so each HPWH
+    # is one combination of climate zone and design
+    Parameters = {}
+    if Designs is not None:
+        Number_Designs = len(Designs)
+        T_Inlet = np.repeat(T_Inlet, Number_Designs, axis = 1)
+        T_Ambient = np.repeat(T_Ambient, Number_Designs, axis = 1)
+        T_Evaporator = np.repeat(T_Evaporator, Number_Designs, axis = 1)
+        for column, parameter in Design_Parameters.items():
+            if column in Designs.columns:
+                Parameters[parameter] = np.tile(Designs[column].to_numpy(dtype = float), len(CZs))
+    
+    Inputs = {'Set Temperature, Heat Pump (deg C)': Draw_Profile['Set Temperature (deg C)'],
+              'Set Temperature, Resistance (deg C)': Draw_Profile['Set Temperature (deg C)'],
+              'Timestep (min)': Draw_Profile['Timestep (min)'],
+              'Evaporator Air Inlet Temperature (deg C)': T_Evaporator,
+              'Ambient Temperature (deg C)': T_Ambient,
+              'Inlet Water Temperature (deg C)': T_Inlet,
+              'Water Draw Volume (L)': Draw_Profile['Water Draw Volume (L)']}
+    for column in ['Resistance Deadband (deg C)', 'Resistance Deadband, HP Active (deg C)']:
+        if column in Draw_Profile.columns:
+            Inputs[column] = Draw_Profile[column]
+    Inputs = {column: np.asarray(value, dtype = float) for column, value in Inputs.items()}
+    
+    if Designs is not None:
+        Index = pd.MultiIndex.from_product([CZs, Designs.index], names = ['Climate Zone', Designs.index.name or 'Design'])
+    else:
+        Index = pd.Index(CZs, name = 'Climate Zone')
+    print('Simulating {} climate zones, {} timestamps'.format(len(CZs), len(Timestamps)))
+    HPWH = HPWH_MultipleNodes_Batch(config, len(Index), Parameters)
+    result = HPWH.simulate(Inputs, ['Electricity Consumed Total (kWh)', 'Electricity Consumed Heat Pump (kWh)',
+                                    'Electricity Consumed Resistance (kWh)', 'Total Heat Added Heat Pump (kWh)',
+                                    'Total Jacket Losses (kWh)', 'Hot Water Draw Volume (L)',
+                                    'Outlet Water Temperature (deg C)'], Update_Frequency)
+    Energy_Supplied = result['Hot Water Draw Volume (L)'] * SpecificHeat_Water * Density_Water * (result['Outlet Water Temperature (deg C)'] - T_Inlet) * 2.7777777777e-7
+    Peak = (Timestamps.hour >= 16) & (Timestamps.hour < 21)
+    
+    summary = pd.DataFrame(index = Index)
+    if Designs is not None:
+        for column in Designs.columns:
+            summary[column] = np.tile(Designs[column].to_numpy(), len(CZs))
+    summary['Electricity Consumed (kWh)'] = result['Electricity Consumed Total (kWh)'].sum(axis = 0)
+    summary['Electricity Consumed Heat Pump (kWh)'] = result['Electricity Consumed Heat Pump (kWh)'].sum(axis = 0)
+    summary['Energy Added Heat Pump (kWh)'] = result['Total Heat Added Heat Pump (kWh)'].sum(axis = 0)
+    summary['Electricity Consumed Backup (kWh)'] = result['Electricity Consumed Resistance (kWh)'].sum(axis = 0)
+    summary['Jacket Losses (kWh)'] = result['Total Jacket Losses (kWh)'].sum(axis = 0)
+    summary['Mean Ambient Temperature (deg F)'] = 1.8 * T_Ambient.mean(axis = 0) + 32
+    summary['Min Ambient Temperature (deg F)'] = 1.8 * T_Ambient.min(axis = 0) + 32
+    summary['Max Ambient Temperature (deg F)'] = 1.8 * T_Ambient.max(axis = 0) + 32
+    summary['Mean Evaporator Air Inlet Temperature (deg F)'] = 1.8 * T_Evaporator.mean(axis = 0) + 32
+    summary['Average Inlet Temperature (deg F)'] = 1.8 * T_Inlet.mean(axis = 0) + 32
+    summary['Average Heat Pump COP'] = summary['Energy Added Heat Pump (kWh)'] / summary['Electricity Consumed Heat Pump (kWh)']
+    summary['Electricity Consumed Peak (kWh, 4-9P)'] = result['Electricity Consumed Total (kWh)'][Peak].sum(axis = 0)
+    summary['Water Draw Volume (gal)'] = Inputs['Water Draw Volume (L)'].sum() / Liters_In_Gallon
+    summary['Annual COP'] = Energy_Supplied.sum(axis = 0) / summary['Electricity Consumed (kWh)']
+    if Tariffs is not None:
+        Bills = calculate_bills(Tariffs, Timestamps, result['Electricity Consumed Total (kWh)'])
+        for (Simulation, Tariff), Bill in Bills['Total Bill ($)'].items():
+            summary.loc[summary.index[Simulation], 'Bill, {} ($)'.format(Tariff)] = Bill
+    if Emission_Factors is not None:
+        Emissions = calculate_emissions(Timestamps, result['Electricity Consumed Total (kWh)'], Emission_Factors)
+        for Scenario in Emissions.columns:
+            summary['Emissions, {} (kg CO2e)'.format(Scenario)] = Emissions[Scenario].to_numpy()
+    
+    print('processing time is {} min'.format((time.time() - start_time)/Seconds_In_Minute))
+    
+    return summary
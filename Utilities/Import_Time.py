@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:32:14 2026
+
+This script measures how long it takes to import the Flexi-HPWH modules in a
+fresh Python process, and checks the results against a budget. Simulation
+workers and controllers embedding the model pay this cost every time they
+start, so the model core should stay light.
+
+Each module is imported in a new interpreter started from outside the
+repository, so the measurement includes importing its dependencies and
+confirms the module does not depend on the working directory. HPWH_Model is
+also checked to confirm it only imports numpy.
+
+Run it from the command line. It prints the import time of each module and
+exits with an error if any module exceeds its budget:
+    python Utilities/Import_Time.py
+
+@author: Peter Grant
+"""
+
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+Root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The module, the folder it is imported from, and the maximum cold-start
+# import time in seconds
+Budgets = {'HPWH_Model': (Root, 0.5),
+           'HPWH_Utilities': (os.path.join(Root, 'Utilities'), 1.5)}
+
+# Modules which must not be imported with the model core
+Excluded_Modules = {'HPWH_Model': ['pandas', 'sklearn', 'matplotlib']}
+
+def measure_import(Module, Folder, Repeats = 3):
+    '''
+    Imports a module in a fresh interpreter and returns the import time.
+
+    inputs:
+        Module: The name of the module.
+        Folder: The folder containing the module.
+        Repeats: The number of interpreters started. The fastest is reported,
+            reducing the influence of other processes on this computer.
+
+    outputs:
+        The fastest import time, in seconds, and the list of modules loaded
+        by the import.
+    '''
+
+    Script = ('import sys, time, json\n'
+              'sys.path.insert(0, {!r})\n'
+              'Before = set(sys.modules)\n'
+              'Start = time.perf_counter()\n'
+              'import {}\n'
+              'Duration = time.perf_counter() - Start\n'
+              'print(json.dumps([Duration, sorted(set(sys.modules) - Before)]))\n').format(os.path.abspath(Folder), Module)
+
+    Times = []
+    for Repeat in range(Repeats):
+        # Start outside the repository so relative paths are not resolved
+        # from the working directory
+        Output = subprocess.run([sys.executable, '-c', Script], cwd = tempfile.gettempdir(), capture_output = True,
+                                text = True, check = True)
+        Duration, Loaded = json.loads(Output.stdout.strip().splitlines()[-1])
+        Times.append(Duration)
+
+    return min(Times), Loaded
+
+def check_budgets(Budgets = Budgets, Excluded_Modules = Excluded_Modules):
+    '''
+    Measures the import time of every module in the budget.
+
+    outputs:
+        A list describing each module which exceeded its budget or imported
+        an excluded module. Empty if all checks passed.
+    '''
+
+    Failures = []
+    for Module, (Folder, Budget) in Budgets.items():
+        Duration, Loaded = measure_import(Module, Folder)
+        print('{}: {:.3f} s (budget {} s)'.format(Module, Duration, Budget))
+        if Duration > Budget:
+            Failures.append('{} took {:.3f} s to import, exceeding the budget of {} s'.format(Module, Duration, Budget))
+        Loaded_Roots = set(name.split('.')[0] for name in Loaded)
+        for Excluded in Excluded_Modules.get(Module, []):
+            if Excluded in Loaded_Roots:
+                Failures.append('{} imports {}'.format(Module, Excluded))
+
+    return Failures
+
+if __name__ == '__main__':
+    Failures = check_budgets()
+    for Failure in Failures:
+        print('FAILED: {}'.format(Failure))
+    sys.exit(1 if Failures else 0)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:05:15 2026
+
+This script contains functions used to re-simulate only the part of a
+simulation that changed since an earlier run. Each run stores its inputs, its
+outputs, and the state of the HPWH at regular checkpoints. When a follow-up run
+uses the same configuration, the stored runs are searched for the one whose
+inputs match the new inputs for the longest time. The model is restored from
+the last checkpoint before the first changed timestep, the outputs before that
+checkpoint are copied from the stored run, and only the remaining timesteps
+are simulated.
+
+This is useful when evaluating small changes to the inputs, such as a set
+temperature profile which only differs in the afternoon or a schedule which
+only changes in the last month of the year.
+
+@author: Peter Grant
+"""
+
+import os
+import sys
+import json
+import glob
+import pickle
+import hashlib
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from HPWH_Model import HPWH_MultipleNodes, Model_Inputs, Model_Outputs
+
+def get_config_key(config):
+    '''
+    Creates a key identifying the configuration and output columns of a
+    simulation. Only runs with the same key can share outputs.
+    '''
+
+    description = json.dumps(config, sort_keys = True, default = lambda value: np.asarray(value).tolist())
+
+    return hashlib.sha1(description.encode()).hexdigest()
+
+def get_model_inputs(input_data, config):
+    '''
+    Returns the columns of input_data read by the model as a float array.
+    The timestamps, in seconds, are included if the model learns occupant
+    behavior, because they set the time of day at which it starts.
+    '''
+
+    col_index = config['Column Index']
+    Inputs = input_data[:, [col_index[column] for column in Model_Inputs if column in col_index]].astype(float)
+    if config.get('Occupant Behavior Window (days)') is not None and 'Timestamp' in col_index:
+        Timestamps = np.array(list(input_data[:, col_index['Timestamp']]), dtype = 'datetime64[s]')
+        Inputs = np.column_stack([Inputs, Timestamps.astype(np.int64).astype(float)])
+
+    return Inputs
+
+def find_first_difference(Inputs, Stored_Inputs):
+    '''
+    Finds the first row at which two sets of model inputs differ. Rows where
+    both inputs are NaN are treated as equal.
+
+    outputs:
+        Returns the index of the first differing row. Returns the length of
+        the shorter input set if one is a prefix of the other.
+    '''
+
+    Length = min(len(Inputs), len(Stored_Inputs))
+    a = Inputs[:Length]
+    b = Stored_Inputs[:Length]
+    Different = ~((a == b) | (np.isnan(a) & np.isnan(b))).all(axis = 1)
+    if Different.any():
+        return int(np.argmax(Different))
+
+    return Length
+
+def find_best_run(Checkpoint_Folder, config_key, Inputs):
+    '''
+    Searches the stored runs with the same configuration for the one matching
+    the new inputs for the most timesteps.
+
+    outputs:
+        Returns the folder of the best stored run and the number of matching
+        timesteps, or (None, 0) if no stored run matches the first timestep.
+    '''
+
+    Best_Run = None
+    Best_Match = 0
+    for Run in glob.glob(os.path.join(Checkpoint_Folder, config_key, '*')):
+        if not os.path.exists(os.path.join(Run, 'checkpoints.pkl')):
+            continue
+        Stored_Inputs = np.load(os.path.join(Run, 'inputs.npy'), mmap_mode = 'r')
+        Match = find_first_difference(Inputs, Stored_Inputs)
+        if Match > Best_Match:
+            Best_Run = Run
+            Best_Match = Match
+
+    return Best_Run, Best_Match
+
+def simulate_incremental(config, input_data, Checkpoint_Folder, Checkpoint_Interval = 1440,
+                         Update_Frequency = None):
+    '''
+    Performs a simulation, re-using the outputs of a stored run with the same
+    configuration for every timestep before the first changed input.
+
+    inputs:
+        config: The configuration of the HPWH, including 'Column Index' and
+            'Node Temperatures (deg C)'.
+        input_data: The numpy array of inputs for the full simulation.
+        Checkpoint_Folder: The folder used to store previous runs.
+        Checkpoint_Interval: The number of timesteps between stored states.
+            Smaller intervals reduce the number of re-simulated timesteps
+            but require more storage.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+
+    outputs:
+        Returns input_data with the model outputs stored in each row.
+    '''
+
+    col_index = config['Column Index']
+    config_key = get_config_key(config)
+    Inputs = get_model_inputs(input_data, config)
+
+    HPWH = HPWH_MultipleNodes(config)
+    Checkpoints = {}
+    Start_Row = 0
+    Best_Run, Match = find_best_run(Checkpoint_Folder, config_key, Inputs)
+    if Best_Run is not None:
+        with open(os.path.join(Best_Run, 'checkpoints.pkl'), 'rb') as f:
+            Stored_Checkpoints = pickle.load(f)
+        # If every timestep matches the whole run can be re-used. Otherwise
+        # restart from the last checkpoint before the first difference
+        Start_Row = max(row for row in Stored_Checkpoints if row <= Match)
+        if Start_Row > 0:
+            Stored_Outputs = np.load(os.path.join(Best_Run, 'outputs.npy'), allow_pickle = True)
+            Output_Columns = [col_index[column] for column in Model_Outputs if column in col_index]
+            input_data[:Start_Row, Output_Columns] = Stored_Outputs[:Start_Row, Output_Columns]
+            HPWH.set_state(Stored_Checkpoints[Start_Row])
+            Checkpoints = {row: state for row, state in Stored_Checkpoints.items() if row <= Start_Row}
+    print('Re-using {} of {} timesteps from a previous run'.format(Start_Row, len(input_data)))
+
+    Time_Last_Update = time.time()
+    for row in range(Start_Row, len(input_data)):
+        if row % Checkpoint_Interval == 0:
+            Checkpoints[row] = HPWH.get_state()
+        input_data[row] = HPWH.calculate_timestep(input_data[row])
+
+        if Update_Frequency is not None and time.time() - Time_Last_Update >= Update_Frequency:
+            print('completed row {} of {}'.format(row, len(input_data)))
+            Time_Last_Update = time.time()
+    Checkpoints[len(input_data)] = HPWH.get_state()
+
+    # Store this run, keyed by its inputs, for use in later runs
+    Run = os.path.join(Checkpoint_Folder, config_key, hashlib.sha1(Inputs.tobytes()).hexdigest())
+    if not os.path.exists(os.path.join(Run, 'checkpoints.pkl')):
+        os.makedirs(Run, exist_ok = True)
+        np.save(os.path.join(Run, 'inputs.npy'), Inputs)
+        np.save(os.path.join(Run, 'outputs.npy'), input_data, allow_pickle = True)
+        # Written last, marking the run as complete
+        with open(os.path.join(Run, 'checkpoints.pkl'), 'wb') as f:
+            pickle.dump(Checkpoints, f)
+
+    return input_data
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:50:45 2026
+
+This script contains functions used to pack the prepared inputs of many sites
+into a single input store on disk. Fleet and test matrix simulations using
+hundreds of sites otherwise read and parse each site's draw profile
+separately, which takes longer than the simulation and requires every profile
+to be held in memory.
+
+The store is a folder containing one .npy file per input column, with one row
+per timestep and one column per site, the timestamps in index.npy and a
+manifest describing the sites and columns. Every site shares the same
+timestamps, so the values of all sites in a timestep are stored next to each
+other. The store is written one site at a time, so it never needs to fit in
+memory.
+
+The files are memory-mapped read only when the store is opened. Processes
+simulating the same store share the pages cached by the operating system
+instead of each holding a copy, and only the timesteps in the requested
+window are read from disk. Passing an Input_Store to another process only
+sends the folder and window; the worker opens the files itself.
+
+@author: Peter Grant
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+Manifest_File = 'manifest.json'
+
+def create_input_store(Folder, Names, Timestamps, read_site, Columns = None, dtype = np.float32):
+    '''
+    Writes the prepared inputs of a set of sites to an input store.
+
+    The store is written to a temporary folder first and then moved into
+    place, so other processes never open a partially written store. An
+    existing store in Folder is replaced.
+
+    inputs:
+        Folder: The folder to write the store to.
+        Names: The names of the sites.
+        Timestamps: The timestamp of each timestep. Every site must contain
+            the same timesteps.
+        read_site: A function returning the profile of a site, in the format
+            returned by Fleet_Simulation.read_profile, when called with its
+            name. It is called once per site.
+        Columns: The columns to store. Defaults to the columns in the profile
+            of the first site.
+        dtype: The data type of the stored values.
+
+    outputs:
+        The Input_Store.
+    '''
+
+    Folder = os.path.abspath(Folder)
+    Names = [str(Name) for Name in Names]
+    if len(set(Names)) != len(Names):
+        raise ValueError('The site names must be unique')
+    Timestamps = pd.DatetimeIndex(Timestamps)
+    Parent = os.path.dirname(Folder)
+    os.makedirs(Parent, exist_ok = True)
+    Temporary_Folder = tempfile.mkdtemp(dir = Parent)
+
+    try:
+        np.save(os.path.join(Temporary_Folder, 'index.npy'), Timestamps.to_numpy(dtype = 'datetime64[ns]').view('int64'))
+        Arrays = None
+        for i, Name in enumerate(Names):
+            Profile = read_site(Name)
+            if Arrays is None:
+                if Columns is None:
+                    Columns = list(Profile.keys())
+                Arrays = [np.lib.format.open_memmap(os.path.join(Temporary_Folder, '{}.npy'.format(j)), mode = 'w+',
+                                                    dtype = dtype, shape = (len(Timestamps), len(Names)))
+                          for j in range(len(Columns))]
+                Shared = [True] * len(Columns)
+            for j, column in enumerate(Columns):
+                if column not in Profile:
+                    raise ValueError('Site {} does not contain column {}'.format(Name, column))
+                values = np.asarray(Profile[column], dtype = dtype)
+                if len(values) != len(Timestamps):
+                    raise ValueError('Site {} contains {} timesteps but {} timestamps were provided'.format(Name, len(values), len(Timestamps)))
+                Arrays[j][:, i] = values
+                if Shared[j] and i > 0:
+                    Shared[j] = bool(np.array_equal(values, Arrays[j][:, 0]))
+        for values in Arrays:
+            values.flush()
+        del Arrays
+
+        manifest = {'names': Names, 'columns': list(Columns), 'shared': Shared, 'dtype': np.dtype(dtype).name}
+        with open(os.path.join(Temporary_Folder, Manifest_File), 'w') as f:
+            json.dump(manifest, f)
+
+        if os.path.exists(Folder):
+            shutil.rmtree(Folder)
+        os.replace(Temporary_Folder, Folder)
+    except BaseException:
+        shutil.rmtree(Temporary_Folder, ignore_errors = True)
+        raise
+
+    return Input_Store(Folder)
+
+class Input_Store():
+    '''
+    An input store opened for reading, optionally limited to a window of
+    timesteps.
+
+    inputs:
+        Folder: The folder containing the store.
+        Start: The first timestamp in the window. Defaults to the start of
+            the store.
+        End: The window contains the timestamps before End. Defaults to the
+            end of the store.
+    '''
+
+    def __init__(self, Folder, Start = None, End = None):
+        self.Folder = os.path.abspath(Folder)
+        self.Start = Start
+        self.End = End
+        if not os.path.exists(os.path.join(self.Folder, Manifest_File)):
+            raise FileNotFoundError('{} does not contain an input store'.format(self.Folder))
+
+        with open(os.path.join(self.Folder, Manifest_File)) as f:
+            manifest = json.load(f)
+        self.Names = manifest['names']
+        self.Columns = manifest['columns']
+        self.Shared = dict(zip(self.Columns, manifest['shared']))
+        self.dtype = np.dtype(manifest['dtype'])
+
+        Timestamps = pd.DatetimeIndex(np.load(os.path.join(self.Folder, 'index.npy')).view('datetime64[ns]'))
+        First = 0 if Start is None else Timestamps.searchsorted(pd.Timestamp(Start))
+        Last = len(Timestamps) if End is None else Timestamps.searchsorted(pd.Timestamp(End))
+        self.Rows = slice(First, Last)
+        self.Timestamps = Timestamps[self.Rows]
+        self.Arrays = {column: np.load(os.path.join(self.Folder, '{}.npy'.format(i)), mmap_mode = 'r')
+                       for i, column in enumerate(self.Columns)}
+
+    def __reduce__(self):
+        # Only the location is sent to other processes, which memory-map the
+        # files themselves
+        return (Input_Store, (self.Folder, self.Start, self.End))
+
+    def __len__(self):
+        return len(self.Timestamps)
+
+    def window(self, Start = None, End = None):
+        '''
+        Returns the store limited to the timestamps from Start up to End.
+        '''
+
+        return Input_Store(self.Folder, Start, End)
+
+    def get_columns(self):
+        '''
+        Returns a dictionary containing a read only view of each column in the
+        window, with one row per timestep and one column per site. Nothing is
+        read from disk until the values are used.
+        '''
+
+        return {column: values[self.Rows] for column, values in self.Arrays.items()}
+
+    def get_profile(self, Name):
+        '''
+        Reads the profile of one site in the window into memory, in the format
+        returned by Fleet_Simulation.read_profile.
+        '''
+
+        if Name not in self.Names:
+            raise KeyError('Unknown site {}'.format(Name))
+        Site = self.Names.index(Name)
+
+        return {column: np.array(values[self.Rows, Site], dtype = float) for column, values in self.Arrays.items()}
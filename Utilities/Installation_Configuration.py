@@ -14,21 +14,24 @@ Also consider changing it to be a function so it's easier to maintain
 @author: Peter Grant
 """
 
+import numpy as np
 import pandas as pd
-import os
 
-root = os.getcwd()
-# Read data for difference between OAT and surrounding air temperature when
-# the HPWH is installed in a small closet
-Closet = pd.read_csv(os.path.join(root, 'Utilities', 'Data', 'TCloset-TOutdoor_C.csv'))
-# Read data for difference between OAT and surrounding air temperature when
-# the HPWH is installed in a standard attic
-Standard_Attic = pd.read_csv(os.path.join(root, 'Utilities', 'Data', 'TAttic-TOutdoor_Standard_C.csv'), 
-                             index_col = 0)
-# Read data for difference between OAT and surrounding air temperature when
-# the HPWH is installed ina high performance attic
-HP_Attic = pd.read_csv(os.path.join(root, 'Utilities', 'Data', 'TAttic-TOutdoor_HPAttic_C.csv'), 
-                            index_col = 0)
+from Data_Registry import load_dataset
+
+def read_temperature_data():
+    '''
+    Reads the measured differences between the outdoor air temperature and the
+    air surrounding the HPWH in a small closet, a standard attic and a high
+    performance attic. The files are only parsed once, see Data_Registry.py.
+    
+    outputs:
+        The closet, standard attic and high performance attic temperature
+        differences, each as a pd.DataFrame.
+    '''
+    
+    return (load_dataset('Closet Temperature Differences'), load_dataset('Standard Attic Temperature Differences'),
+            load_dataset('HP Attic Temperature Differences'))
 
 def get_temperatures(Model, Installation):
     '''
@@ -51,6 +54,7 @@ def get_temperatures(Model, Installation):
     Model: The input dataframe with new columns added describing the data
            analysis process and updated HPWH operating conditions.
     '''
+    Closet, Standard_Attic, HP_Attic = read_temperature_data()
     Model['Month'] = Model.index.month
     Model['Hour'] = Model.index.hour
     if Installation == 'Open_Area':
@@ -221,4 +225,88 @@ def get_temperatures(Model, Installation):
         return None
         
         
-    return Model
\ No newline at end of file
+    return Model
+def get_temperature_coefficients(Installation):
+    '''
+    Every installation configuration calculates the ambient and evaporator
+    air inlet temperatures as a sum of the outdoor temperature, the monitored
+    ambient temperature and an adjustment which depends on the month and
+    hour. This function finds those terms by applying get_temperatures to
+    one timestamp in each hour of each month, so the temperatures can be
+    calculated for many outdoor temperature channels at once using
+    apply_temperature_coefficients. The terms are checked against
+    get_temperatures at random temperatures, and a ValueError is raised if
+    they do not reproduce it.
+    
+    inputs:
+    Installation: The description of the installation configuration. Must match
+                  one of the options in get_temperatures.
+    
+    outputs:
+    Coefficients: A dictionary containing the 'Offset', 'Outdoor' and
+                  'Ambient' terms. Each is an array with one row per month and
+                  hour, (Month - 1) * 24 + Hour, and columns for the ambient
+                  and evaporator air inlet temperatures.
+    '''
+    
+    Index = pd.DatetimeIndex([pd.Timestamp(2021, Month, 1, Hour) for Month in range(1, 13) for Hour in range(24)])
+    
+    def probe(Outdoor, Ambient):
+        Model = pd.DataFrame({'Outdoor Temperature (deg C)': Outdoor, 'Ambient Temperature (deg C)': Ambient},
+                             index = Index)
+        Model = get_temperatures(Model, Installation)
+        if Model is None:
+            raise ValueError('Unexpected installation configuration {}'.format(Installation))
+        return Model[['Ambient Temperature (deg C)', 'Evaporator Air Inlet Temperature (deg C)']].to_numpy(dtype = float)
+    
+    Offset = probe(0., 0.)
+    Coefficients = {'Offset': Offset, 'Outdoor': probe(1., 0.) - Offset, 'Ambient': probe(0., 1.) - Offset}
+    
+    # The terms are only valid if get_temperatures is linear in the outdoor
+    # and ambient temperatures. Check that they reproduce it for other
+    # temperatures
+    Generator = np.random.default_rng(0)
+    Outdoor = Generator.uniform(-20, 45, len(Index))
+    Ambient = Generator.uniform(-20, 45, len(Index))
+    Expected = probe(Outdoor, Ambient)
+    Calculated = np.column_stack(apply_temperature_coefficients(Index, Outdoor, Ambient, Coefficients))
+    if not np.allclose(Calculated, Expected, atol = 1e-9):
+        raise ValueError('The temperatures of installation configuration {} are not linear in the outdoor and ambient '
+                         'temperatures, so they can not be described by coefficients'.format(Installation))
+    
+    return Coefficients
+
+def apply_temperature_coefficients(Timestamps, Outdoor, Ambient, Coefficients):
+    '''
+    Calculates the ambient and evaporator air inlet temperatures using the
+    coefficients returned by get_temperature_coefficients.
+    
+    inputs:
+    Timestamps: The timestamps of the data set.
+    Outdoor: The outdoor temperature, in deg C. An array with one row per
+             timestamp and optionally one column per scenario, such as
+             climate zones.
+    Ambient: The monitored ambient temperature, in deg C, with the same
+             shape as Outdoor or one value per timestamp.
+    Coefficients: The coefficients returned by get_temperature_coefficients.
+    
+    outputs:
+    Returns the ambient and evaporator air inlet temperatures, each with the
+    shape of Outdoor.
+    '''
+    
+    Timestamps = pd.DatetimeIndex(Timestamps)
+    Rows = (Timestamps.month.to_numpy() - 1) * 24 + Timestamps.hour.to_numpy()
+    Outdoor = np.asarray(Outdoor, dtype = float)
+    Shape = (len(Timestamps),) + (1,) * (Outdoor.ndim - 1)
+    Ambient = np.asarray(Ambient, dtype = float)
+    if Ambient.ndim < Outdoor.ndim:
+        Ambient = Ambient.reshape(Shape)
+    
+    Temperatures = []
+    for column in range(2):
+        Temperatures.append(Coefficients['Offset'][Rows, column].reshape(Shape)
+                            + Coefficients['Outdoor'][Rows, column].reshape(Shape) * Outdoor
+                            + Coefficients['Ambient'][Rows, column].reshape(Shape) * Ambient)
+    
+    return Temperatures[0], Temperatures[1]
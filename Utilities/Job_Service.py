@@ -0,0 +1,970 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:27:45 2026
+
+This script provides a lightweight local job service for Flexi-HPWH
+simulations. Notebooks and scripts submit jobs to a queue and return
+immediately, while worker processes, possibly on several hosts, run the jobs
+and store the results in a common result store.
+
+The queue is a shared directory containing one JSON file per job, stored in a
+sub-folder for each status:
+    pending: Jobs waiting for a worker. The file names start with the
+        priority and submission time, so sorting them gives the order in
+        which jobs run.
+    running: Jobs claimed by a worker. A worker claims a job by moving its
+        file from pending to running, which only one worker can do. The
+        worker renews its lease on the job while it runs. Jobs whose lease
+        expired, for instance because the worker was killed, are moved back
+        to pending the next time a worker claims a job. The lease belongs to
+        the 'Worker' and 'Attempts' stored when the job was claimed, so a
+        stalled worker whose job was claimed again can not renew or finish
+        it.
+    done, failed, cancelled: Finished jobs.
+The results of each job are stored in results/<job id>. Job ids are the 12
+character hexadecimal ids created by submit; requests using any other id are
+rejected.
+
+Workers either read the shared directory directly, or use a localhost HTTP
+endpoint served by serve_queue on the host that owns the directory. Workers
+using the endpoint upload their result files to it. Each job runs in its own
+process, so a running job can be cancelled by terminating that process, and
+throughput scales with the number of worker processes.
+
+The available job types are listed in Job_Types:
+    'Simulate_MonitoredData': Simulates one case of a test matrix, using
+        a case from compile_test_matrix in Test_Matrix_Planner.py. Stores
+        the summary row in summary.csv, as well as the files written by
+        Simulate_MonitoredData.
+    'HPWH_MultipleNodes': Simulates an input data set created by
+        Prepare_Inputs and stored in the queue by store_inputs. Submitted
+        using submit_model. Stores the
+        numeric outputs in outputs.npz, read by read_outputs.
+Inputs and outputs are stored as numeric arrays with the column names in
+JSON, and are never unpickled, so clients can not run code on the workers.
+
+Usage:
+    python Job_Service.py worker <queue folder or url> [--workers N]
+    python Job_Service.py serve <queue folder> [--port 8765]
+
+Scripts using these functions on Windows must protect their entry point with
+if __name__ == '__main__': so the worker processes do not re-run the script.
+
+@author: Peter Grant
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import glob
+import time
+import uuid
+import shutil
+import tempfile
+import argparse
+import traceback
+import multiprocessing
+import urllib.request
+import urllib.error
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+Statuses = ['pending', 'running', 'done', 'failed', 'cancelled']
+Finished_Statuses = ['done', 'failed', 'cancelled']
+Maximum_Priority = 999
+
+# The format of the ids created by submit and store_inputs
+Id_Pattern = re.compile('[0-9a-f]{12}')
+
+# Running jobs whose worker has not renewed the lease for this many seconds
+# are returned to pending
+Lease_Duration = 120
+
+def check_id(Id):
+    '''
+    Raises a ValueError if Id is not an id created by the queue. Prevents
+    ids such as '..' from reaching other folders.
+    '''
+
+    if not isinstance(Id, str) or Id_Pattern.fullmatch(Id) is None:
+        raise ValueError('Invalid job id {!r}'.format(Id))
+
+    return Id
+
+def get_pending_name(Job):
+    '''
+    Returns the name of the file of a pending job. Sorting the names gives the
+    order in which the jobs run.
+    '''
+
+    return '{:03d}_{:020d}_{}.json'.format(Maximum_Priority - Job['Priority'], int(Job['Submitted'] * 1e9), Job['Id'])
+
+def to_json(value):
+    '''
+    Converts a job to JSON, storing numpy values as lists.
+    '''
+
+    return json.dumps(value, default = lambda item: np.asarray(item).tolist())
+
+class Job_Queue():
+    '''
+    A job queue stored in a shared directory. See the description at the top
+    of this script.
+    '''
+
+    def __init__(self, Folder, Lease_Duration = Lease_Duration):
+        '''
+        inputs:
+            Folder: The shared directory storing the queue. Created if it
+                does not exist.
+            Lease_Duration: Running jobs whose lease was not renewed for
+                this many seconds are returned to pending.
+        '''
+
+        self.Folder = Folder
+        self.Lease_Duration = Lease_Duration
+        for Status in Statuses + ['results']:
+            os.makedirs(os.path.join(Folder, Status), exist_ok = True)
+
+    def find_job(self, Id):
+        '''
+        Returns the status and path of the file describing a job, or
+        (None, None) if the job does not exist.
+        '''
+
+        check_id(Id)
+        for Status in Statuses:
+            Paths = glob.glob(os.path.join(self.Folder, Status, '*{}.json'.format(Id)))
+            if len(Paths) > 0:
+                return Status, Paths[0]
+
+        return None, None
+
+    def submit(self, Job_Type, Arguments, Priority = 0):
+        '''
+        Adds a job to the queue.
+
+        inputs:
+            Job_Type: The type of job, matching an entry in Job_Types.
+            Arguments: A dictionary of arguments passed to the job.
+            Priority: Jobs with higher priority run first, from 0 to 999.
+                Jobs with the same priority run in the order submitted.
+
+        outputs:
+            Returns the id of the job.
+        '''
+
+        if Job_Type not in Job_Types:
+            raise ValueError('Unknown job type {}'.format(Job_Type))
+        Priority = int(min(max(Priority, 0), Maximum_Priority))
+        Job = {'Id': uuid.uuid4().hex[:12], 'Job Type': Job_Type, 'Arguments': Arguments, 'Priority': Priority,
+               'Submitted': time.time()}
+        Name = get_pending_name(Job)
+        # Write to a temporary file first so workers never read a partial job
+        Temporary = os.path.join(self.Folder, 'pending', '.' + Name)
+        with open(Temporary, 'w') as f:
+            f.write(to_json(Job))
+        os.replace(Temporary, os.path.join(self.Folder, 'pending', Name))
+
+        return Job['Id']
+
+    def get_status(self, Id):
+        '''
+        Returns the description of a job, including its 'Status'.
+        '''
+
+        Status, Path = self.find_job(Id)
+        if Status is None:
+            raise KeyError('No job {}'.format(Id))
+        with open(Path) as f:
+            Job = json.load(f)
+        Job['Status'] = Status
+        Job['Cancel Requested'] = self.cancel_requested(Id)
+
+        return Job
+
+    def list_jobs(self):
+        '''
+        Returns the id, type, priority and status of every job, with the
+        pending jobs in the order they will run.
+        '''
+
+        Jobs = []
+        for Status in Statuses:
+            for Path in sorted(glob.glob(os.path.join(self.Folder, Status, '*.json'))):
+                Id = os.path.basename(Path)[:-len('.json')].split('_')[-1]
+                try:
+                    Job = self.get_status(Id)
+                except (KeyError, FileNotFoundError):
+                    # The job moved to another status while listing
+                    continue
+                Jobs.append({'Id': Id, 'Job Type': Job['Job Type'], 'Priority': Job['Priority'],
+                             'Status': Job['Status'], 'Worker': Job.get('Worker')})
+
+        return Jobs
+
+    def cancel(self, Id):
+        '''
+        Cancels a job. Pending jobs are cancelled immediately. Running jobs
+        are stopped by their worker the next time it checks the queue.
+
+        outputs:
+            Returns the status of the job after the request.
+        '''
+
+        Status, Path = self.find_job(Id)
+        if Status == 'pending':
+            try:
+                os.replace(Path, os.path.join(self.Folder, 'cancelled', '{}.json'.format(Id)))
+                return 'cancelled'
+            except FileNotFoundError:
+                # A worker claimed the job first
+                Status, Path = self.find_job(Id)
+        if Status == 'running':
+            open(os.path.join(self.Folder, 'running', '{}.cancel'.format(Id)), 'w').close()
+
+        return Status
+
+    def cancel_requested(self, Id):
+        '''
+        Returns True if a running job was cancelled.
+        '''
+
+        return os.path.exists(os.path.join(self.Folder, 'running', '{}.cancel'.format(check_id(Id))))
+
+    def holds_lease(self, Job):
+        '''
+        Returns True if the job is running under the claim described by Job,
+        as returned by claim. Returns False if the job is no longer running
+        or was claimed again after its lease expired.
+        '''
+
+        try:
+            with open(os.path.join(self.Folder, 'running', '{}.json'.format(check_id(Job['Id'])))) as f:
+                Stored = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        return Stored.get('Worker') == Job.get('Worker') and Stored.get('Attempts') == Job.get('Attempts')
+
+    def renew_lease(self, Job):
+        '''
+        Renews the lease of a worker on a running job.
+
+        inputs:
+            Job: The job, as returned by claim.
+
+        outputs:
+            Returns False if the worker lost the lease, because the job is no
+            longer running or was claimed again after its lease expired.
+        '''
+
+        if not self.holds_lease(Job):
+            return False
+        try:
+            os.utime(os.path.join(self.Folder, 'running', '{}.json'.format(Job['Id'])))
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def requeue_expired(self):
+        '''
+        Returns running jobs whose lease expired to pending, so they are run
+        by another worker.
+
+        outputs:
+            Returns the ids of the returned jobs.
+        '''
+
+        Requeued = []
+        for Name in os.listdir(os.path.join(self.Folder, 'running')):
+            Path = os.path.join(self.Folder, 'running', Name)
+            # Jobs being claimed are stored as .<id>.claim, which are only
+            # left behind if the worker stopped while claiming the job
+            if not (Name.endswith('.json') or Name.endswith('.claim')):
+                continue
+            try:
+                if time.time() - os.path.getmtime(Path) < self.Lease_Duration:
+                    continue
+                with open(Path) as f:
+                    Job = json.load(f)
+                os.rename(Path, os.path.join(self.Folder, 'pending', get_pending_name(Job)))
+            except (FileNotFoundError, PermissionError, ValueError):
+                # Another worker finished or returned the job first
+                continue
+            Requeued.append(Job['Id'])
+            print('Returned job {} to pending, the lease of {} expired'.format(Job['Id'], Job.get('Worker')))
+
+        return Requeued
+
+    def claim(self, Worker):
+        '''
+        Claims the next pending job for a worker, after returning jobs whose
+        lease expired to pending.
+
+        outputs:
+            Returns the job, or None if no jobs are pending.
+        '''
+
+        self.requeue_expired()
+        for Name in sorted(os.listdir(os.path.join(self.Folder, 'pending'))):
+            if Name.startswith('.'):
+                continue
+            Id = Name[:-len('.json')].split('_')[-1]
+            if Id_Pattern.fullmatch(Id) is None:
+                continue
+            # The job is only stored as running/<id>.json once it names this
+            # worker, so the previous worker never sees its own claim there
+            Claim = os.path.join(self.Folder, 'running', '.{}.claim'.format(Id))
+            try:
+                os.rename(os.path.join(self.Folder, 'pending', Name), Claim)
+            except (FileNotFoundError, PermissionError):
+                # Another worker claimed this job first
+                continue
+            with open(Claim) as f:
+                Job = json.load(f)
+            Job['Worker'] = Worker
+            Job['Started'] = time.time()
+            Job['Attempts'] = Job.get('Attempts', 0) + 1
+            with open(Claim, 'w') as f:
+                f.write(to_json(Job))
+            os.replace(Claim, os.path.join(self.Folder, 'running', '{}.json'.format(Id)))
+            return Job
+
+        return None
+
+    def get_output_folder(self, Id):
+        '''
+        Returns the folder in which a job stores its results.
+        '''
+
+        Folder = os.path.join(self.Folder, 'results', check_id(Id))
+        os.makedirs(Folder, exist_ok = True)
+
+        return Folder
+
+    def get_result_path(self, Id, Name):
+        '''
+        Returns the path of a result file, raising a ValueError if the name
+        leads outside the result folder of the job.
+        '''
+
+        Folder = os.path.realpath(os.path.join(self.Folder, 'results', check_id(Id)))
+        Path = os.path.realpath(os.path.join(Folder, Name))
+        if not Path.startswith(Folder + os.sep):
+            raise ValueError('Invalid file name {!r}'.format(Name))
+
+        return Path
+
+    def get_checkpoint_folder(self):
+        '''
+        Returns the folder storing the runs re-used by simulate_incremental.
+        It is not a valid job id, so its files can not be written through
+        the HTTP endpoint.
+        '''
+
+        return os.path.join(self.Folder, 'results', 'checkpoints')
+
+    def put_file(self, Id, Name, Data):
+        '''
+        Stores a file in the result folder of a job.
+        '''
+
+        Path = self.get_result_path(Id, Name)
+        os.makedirs(os.path.dirname(Path), exist_ok = True)
+        with open(Path, 'wb') as f:
+            f.write(Data)
+
+    def finish(self, Job, Status, Output_Folder = None, Error = None):
+        '''
+        Moves a running job to 'done', 'failed' or 'cancelled'. Does nothing
+        if the worker lost the lease on the job, because it expired and the
+        job was returned to pending or claimed again.
+
+        outputs:
+            Returns True if the job was finished.
+        '''
+
+        if Status not in Finished_Statuses:
+            raise ValueError('Unknown status {}'.format(Status))
+        Id = check_id(Job['Id'])
+        if not self.holds_lease(Job):
+            return False
+        Job = dict(Job, Finished = time.time(), Error = Error)
+        Path = os.path.join(self.Folder, 'running', '{}.json'.format(Id))
+        with open(Path, 'w') as f:
+            f.write(to_json(Job))
+        os.replace(Path, os.path.join(self.Folder, Status, '{}.json'.format(Id)))
+        Cancel = os.path.join(self.Folder, 'running', '{}.cancel'.format(Id))
+        if os.path.exists(Cancel):
+            os.remove(Cancel)
+
+        return True
+
+    def get_result(self, Id, Name, Path = None):
+        '''
+        Returns the path of a result file of a finished job. Copies the file
+        to Path if provided.
+        '''
+
+        Result = self.get_result_path(Id, Name)
+        if not os.path.exists(Result):
+            raise FileNotFoundError('Job {} has no result {}'.format(Id, Name))
+        if Path is not None:
+            shutil.copyfile(Result, Path)
+            return Path
+
+        return Result
+
+class HTTP_Job_Queue():
+    '''
+    A client for a job queue served by serve_queue. Provides the same methods
+    as Job_Queue, so it can be used by workers and scripts on other hosts.
+    '''
+
+    def __init__(self, Url):
+        '''
+        inputs:
+            Url: The address of the queue, e.g. 'http://localhost:8765'.
+        '''
+
+        self.Url = Url.rstrip('/')
+
+    def request_path(self, Id, *Parts):
+        # Ids are checked before sending, so they can not change the path
+        return '/'.join(['/jobs', check_id(Id)] + list(Parts))
+
+    def request(self, Method, Path, Data = None, Raw = False):
+        '''
+        Sends a request to the queue, returning the decoded JSON response.
+        '''
+
+        if Data is not None and not Raw:
+            Data = to_json(Data).encode()
+        Request = urllib.request.Request(self.Url + Path, data = Data, method = Method)
+        with urllib.request.urlopen(Request) as Response:
+            Body = Response.read()
+        if Raw and Method == 'GET':
+            return Body
+
+        return json.loads(Body) if len(Body) > 0 else None
+
+    def submit(self, Job_Type, Arguments, Priority = 0):
+        return self.request('POST', '/jobs', {'Job Type': Job_Type, 'Arguments': Arguments, 'Priority': Priority})['Id']
+
+    def get_status(self, Id):
+        return self.request('GET', self.request_path(Id))
+
+    def list_jobs(self):
+        return self.request('GET', '/jobs')
+
+    def cancel(self, Id):
+        return self.request('POST', self.request_path(Id, 'cancel'))['Status']
+
+    def cancel_requested(self, Id):
+        return self.get_status(Id)['Cancel Requested']
+
+    def renew_lease(self, Job):
+        return self.request('POST', self.request_path(Job['Id'], 'lease'),
+                            {'Worker': Job.get('Worker'), 'Attempts': Job.get('Attempts')})['Running']
+
+    def claim(self, Worker):
+        return self.request('POST', '/claim', {'Worker': Worker})
+
+    def get_output_folder(self, Id):
+        # Results are written locally, then uploaded when the job finishes
+        return tempfile.mkdtemp(prefix = 'Flexi-HPWH_{}_'.format(check_id(Id)))
+
+    def get_checkpoint_folder(self):
+        # The queue folder is not available, so workers keep their own runs
+        return None
+
+    def put_file(self, Id, Name, Data):
+        self.request('PUT', self.request_path(Id, 'files', urllib.request.quote(Name)), Data, Raw = True)
+
+    def finish(self, Job, Status, Output_Folder = None, Error = None):
+        # Do not upload over the results of a worker which claimed the job
+        # again
+        if not self.renew_lease(Job):
+            if Output_Folder is not None:
+                shutil.rmtree(Output_Folder, ignore_errors = True)
+            return False
+        if Output_Folder is not None:
+            for Root, Folders, Files in os.walk(Output_Folder):
+                for File in Files:
+                    Name = os.path.relpath(os.path.join(Root, File), Output_Folder).replace(os.sep, '/')
+                    with open(os.path.join(Root, File), 'rb') as f:
+                        self.put_file(Job['Id'], Name, f.read())
+            shutil.rmtree(Output_Folder, ignore_errors = True)
+        return self.request('POST', self.request_path(Job['Id'], 'finish'), {'Job': Job, 'Status': Status, 'Error': Error})['Finished']
+
+    def get_result(self, Id, Name, Path = None):
+        if Path is None:
+            Path = os.path.join(tempfile.mkdtemp(), os.path.basename(Name))
+        with open(Path, 'wb') as f:
+            f.write(self.request('GET', self.request_path(Id, 'files', urllib.request.quote(Name)), Raw = True))
+
+        return Path
+
+def connect(Location):
+    '''
+    Returns the queue at a directory or HTTP address.
+    '''
+
+    if Location.startswith('http://') or Location.startswith('https://'):
+        return HTTP_Job_Queue(Location)
+
+    return Job_Queue(Location)
+
+def run_simulation_case(Arguments, Output_Folder, Cache_Folder, Queue):
+    '''
+    Runs a 'Simulate_MonitoredData' job.
+
+    inputs:
+        Arguments: A dictionary containing:
+            Case: One row of the plan returned by compile_test_matrix, as a
+                dictionary.
+            config: The base configuration of the HPWH.
+            Two Week Sim: Optional. Set to True to simulate two weeks.
+            Tariffs: Optional. Tariffs in the format described in Tariffs.py.
+            Emission Factors Path: Optional. The path to a table of hourly
+                emission factors.
+            Time Window: Optional. The start and end times of the simulated
+                period.
+            KPI Only: Optional. Set to True to only store the summary row.
+            Input Store: Optional. The folder of an Input_Store containing
+                the draw profile, read instead of the case's path.
+        Output_Folder: The folder in which to store the results.
+        Cache_Folder: The folder used to store prepared draw profiles.
+        Queue: The queue the job was claimed from.
+    '''
+
+    import pandas as pd
+    from Test_Matrix_Planner import prepare_group, simulate_case
+    from Emissions import read_emission_factors
+    from Input_Store import Input_Store
+
+    Case = pd.Series(Arguments['Case'])
+    config = Arguments['config']
+    Two_Week_Sim = Arguments.get('Two Week Sim', False)
+    Emission_Factors = None
+    if Arguments.get('Emission Factors Path') is not None:
+        Emission_Factors = read_emission_factors(Arguments['Emission Factors Path'])
+    os.makedirs(os.path.join(Output_Folder, 'daily COP'), exist_ok = True)
+    os.makedirs(os.path.join(Output_Folder, 'monthly COP'), exist_ok = True)
+
+    Draw_Profile_Store = None
+    if Arguments.get('Input Store') is not None:
+        Draw_Profile_Store = Input_Store(Arguments['Input Store'])
+
+    Draw_Hash = prepare_group(Case, config, Two_Week_Sim, Cache_Folder, Arguments.get('Time Window'), Draw_Profile_Store)
+    Name = '{}_{}_{}.csv'.format(Arguments.get('Simulation Name', 'Simulation'),
+                                 'Testing' if Two_Week_Sim else 'Annual', Case['Simulation'])
+    summary = simulate_case(Case, config, Output_Folder, Name, not Two_Week_Sim, Cache_Folder, Draw_Hash,
+                            Arguments.get('Tariffs'), Emission_Factors, Arguments.get('KPI Only', False),
+                            Two_Week_Sim, Arguments.get('Time Window'), Draw_Profile_Store)
+    summary.to_csv(os.path.join(Output_Folder, 'summary.csv'))
+
+def store_inputs(Queue, input_data, col_index):
+    '''
+    Stores an input data set created by Prepare_Inputs in the queue, for use
+    by 'HPWH_MultipleNodes' jobs. The numeric columns are stored in
+    inputs.npy and the timestamps in timestamps.npy, with the column names in
+    columns.json. Other columns are not stored.
+
+    outputs:
+        Returns the id of the stored inputs, passed to the job as 'Input Id'.
+    '''
+
+    import pandas as pd
+
+    Id = uuid.uuid4().hex[:12]
+    Columns = {'Column Index': col_index, 'Numeric Columns': [], 'Timestamp Column': None}
+    Values = []
+    for column, index in col_index.items():
+        if column == 'Timestamp':
+            Timestamps = pd.DatetimeIndex(input_data[:, index]).to_numpy(dtype = 'datetime64[ns]').view('int64')
+            Columns['Timestamp Column'] = column
+            continue
+        try:
+            Values.append(input_data[:, index].astype(float))
+        except (TypeError, ValueError):
+            continue
+        Columns['Numeric Columns'].append(column)
+
+    Arrays = {'inputs.npy': np.column_stack(Values)}
+    if Columns['Timestamp Column'] is not None:
+        Arrays['timestamps.npy'] = Timestamps
+    for Name, Array in Arrays.items():
+        Buffer = io.BytesIO()
+        np.save(Buffer, Array, allow_pickle = False)
+        Queue.put_file(Id, Name, Buffer.getvalue())
+    Queue.put_file(Id, 'columns.json', json.dumps(Columns).encode())
+
+    return Id
+
+def read_inputs(Queue, Id):
+    '''
+    Reads an input data set stored by store_inputs.
+
+    outputs:
+        Returns the input data, in the format created by Prepare_Inputs, and
+        its column index.
+    '''
+
+    import pandas as pd
+
+    with open(Queue.get_result(Id, 'columns.json')) as f:
+        Columns = json.load(f)
+    col_index = Columns['Column Index']
+    Values = np.load(Queue.get_result(Id, 'inputs.npy'), allow_pickle = False)
+    input_data = np.zeros((len(Values), max(col_index.values()) + 1), dtype = object)
+    for i, column in enumerate(Columns['Numeric Columns']):
+        input_data[:, col_index[column]] = Values[:, i]
+    if Columns['Timestamp Column'] is not None:
+        Timestamps = np.load(Queue.get_result(Id, 'timestamps.npy'), allow_pickle = False)
+        input_data[:, col_index[Columns['Timestamp Column']]] = pd.DatetimeIndex(Timestamps.view('datetime64[ns]')).to_numpy(dtype = object)
+
+    return input_data, col_index
+
+def read_outputs(Queue, Id):
+    '''
+    Reads the outputs of a finished 'HPWH_MultipleNodes' job.
+
+    outputs:
+        Returns a dictionary containing an array of each numeric column.
+        Columns containing one value per node have one row per timestep and
+        one column per node.
+    '''
+
+    with open(Queue.get_result(Id, 'output_columns.json')) as f:
+        Columns = json.load(f)
+    with np.load(Queue.get_result(Id, 'outputs.npz'), allow_pickle = False) as Stored:
+        return {column: Stored['Column_{}'.format(i)] for i, column in enumerate(Columns)}
+
+def submit_model(Queue, input_data, config, Priority = 0, Use_Checkpoints = False):
+    '''
+    Stores an input data set created by Prepare_Inputs and submits a
+    'HPWH_MultipleNodes' job simulating it.
+
+    outputs:
+        Returns the id of the job.
+    '''
+
+    Input_Id = store_inputs(Queue, input_data, config['Column Index'])
+    Arguments = {'config': config, 'Input Id': Input_Id, 'Use Checkpoints': Use_Checkpoints}
+
+    return Queue.submit('HPWH_MultipleNodes', Arguments, Priority)
+
+def run_model(Arguments, Output_Folder, Cache_Folder, Queue):
+    '''
+    Runs a 'HPWH_MultipleNodes' job.
+
+    inputs:
+        Arguments: A dictionary containing:
+            config: The configuration of the HPWH. 'Column Index' is taken
+                from the stored inputs.
+            Input Id: The id of the inputs, from store_inputs.
+            Use Checkpoints: Optional. Set to True to re-use stored runs
+                using simulate_incremental. The runs are stored in the queue
+                folder, or in Cache_Folder by workers using an HTTP queue.
+        Output_Folder: The folder in which to store the results.
+        Cache_Folder: The folder used to store the runs of workers using an
+            HTTP queue.
+        Queue: The queue the job was claimed from.
+    '''
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from HPWH_Model import HPWH_MultipleNodes
+    from Incremental_Simulation import simulate_incremental
+
+    input_data, col_index = read_inputs(Queue, check_id(Arguments['Input Id']))
+    config = dict(Arguments['config'], **{'Column Index': col_index})
+    if Arguments.get('Use Checkpoints', False):
+        Checkpoint_Folder = Queue.get_checkpoint_folder()
+        if Checkpoint_Folder is None:
+            Checkpoint_Folder = os.path.join(Cache_Folder, 'Checkpoints')
+        input_data = simulate_incremental(config, input_data, Checkpoint_Folder)
+    else:
+        HPWH = HPWH_MultipleNodes(config)
+        for row in range(len(input_data)):
+            input_data[row] = HPWH.calculate_timestep(input_data[row])
+
+    Columns = []
+    Arrays = []
+    for column, index in col_index.items():
+        try:
+            Arrays.append(np.array(input_data[:, index].tolist(), dtype = float))
+        except (TypeError, ValueError):
+            continue
+        Columns.append(column)
+    np.savez(os.path.join(Output_Folder, 'outputs.npz'), **{'Column_{}'.format(i): Array for i, Array in enumerate(Arrays)})
+    with open(os.path.join(Output_Folder, 'output_columns.json'), 'w') as f:
+        json.dump(Columns, f)
+
+Job_Types = {'Simulate_MonitoredData': run_simulation_case,
+             'HPWH_MultipleNodes': run_model}
+
+def execute_job(Job, Output_Folder, Cache_Folder, Location):
+    '''
+    Runs one job in the current process. Called in a separate process by
+    run_worker. Errors are stored in error.txt in the output folder.
+    '''
+
+    try:
+        Job_Types[Job['Job Type']](Job['Arguments'], Output_Folder, Cache_Folder, connect(Location))
+    except Exception:
+        with open(os.path.join(Output_Folder, 'error.txt'), 'w') as f:
+            f.write(traceback.format_exc())
+        sys.exit(1)
+
+def run_worker(Location, Worker = None, Poll_Interval = 5, Stop_When_Empty = False, Cache_Folder = None):
+    '''
+    Runs jobs from a queue until stopped.
+
+    inputs:
+        Location: The queue directory or HTTP address.
+        Worker: The name of this worker. Defaults to the host name and
+            process id.
+        Poll_Interval: The time to wait between checking for new jobs and
+            cancellations, and between renewing the lease on the running
+            job, in seconds. Must be well below the Lease_Duration of the
+            queue.
+        Stop_When_Empty: Set to True to stop when no jobs are pending.
+        Cache_Folder: The folder used to store prepared draw profiles.
+            Defaults to a folder in the temporary directory of this host.
+    '''
+
+    Queue = connect(Location)
+    if Worker is None:
+        Worker = '{}-{}'.format(os.uname().nodename if hasattr(os, 'uname') else os.environ.get('COMPUTERNAME'),
+                                os.getpid())
+    if Cache_Folder is None:
+        Cache_Folder = os.path.join(tempfile.gettempdir(), 'Flexi-HPWH Cache')
+    Context = multiprocessing.get_context('spawn')
+
+    while True:
+        Job = Queue.claim(Worker)
+        if Job is None:
+            if Stop_When_Empty:
+                return
+            time.sleep(Poll_Interval)
+            continue
+
+        print('{} running job {}'.format(Worker, Job['Id']))
+        Output_Folder = Queue.get_output_folder(Job['Id'])
+        Process = Context.Process(target = execute_job, args = (Job, Output_Folder, Cache_Folder, Location))
+        Process.start()
+        Cancelled = False
+        Lost = False
+        while Process.is_alive():
+            Process.join(Poll_Interval)
+            if not Process.is_alive():
+                break
+            if not Queue.renew_lease(Job):
+                # The lease expired and the job was returned to pending or
+                # claimed by another worker
+                Process.terminate()
+                Process.join()
+                Lost = True
+            elif Queue.cancel_requested(Job['Id']):
+                Process.terminate()
+                Process.join()
+                Cancelled = True
+
+        if Lost:
+            print('{} lost the lease on job {}'.format(Worker, Job['Id']))
+            continue
+        if Cancelled:
+            Finished = Queue.finish(Job, 'cancelled', Output_Folder)
+        elif Process.exitcode == 0:
+            Finished = Queue.finish(Job, 'done', Output_Folder)
+        else:
+            Error = 'Exit code {}'.format(Process.exitcode)
+            if os.path.exists(os.path.join(Output_Folder, 'error.txt')):
+                with open(os.path.join(Output_Folder, 'error.txt')) as f:
+                    Error = f.read()
+            Finished = Queue.finish(Job, 'failed', Output_Folder, Error)
+        if Finished:
+            print('{} finished job {}'.format(Worker, Job['Id']))
+        else:
+            print('{} lost the lease on job {}'.format(Worker, Job['Id']))
+
+def start_workers(Location, Number_Workers = None, **kwargs):
+    '''
+    Starts several worker processes on this host, returning the processes.
+    Throughput scales with the number of workers until every core is used.
+
+    inputs:
+        Location: The queue directory or HTTP address.
+        Number_Workers: The number of workers. Defaults to the number of
+            cores on this computer.
+        kwargs: Passed to run_worker.
+    '''
+
+    if Number_Workers is None:
+        Number_Workers = os.cpu_count()
+    Context = multiprocessing.get_context('spawn')
+    Workers = [Context.Process(target = run_worker, args = (Location,), kwargs = kwargs) for i in range(Number_Workers)]
+    for Worker in Workers:
+        Worker.start()
+
+    return Workers
+
+def submit_plan(Queue, Plan, config, Two_Week_Sim = False, Priority = 0, **Arguments):
+    '''
+    Submits every case of a test matrix plan as a separate job.
+
+    inputs:
+        Queue: A Job_Queue or HTTP_Job_Queue.
+        Plan: The plan returned by compile_test_matrix.
+        config: The base configuration of the HPWH.
+        Two_Week_Sim: Set to True to simulate only the first two weeks.
+        Priority: The priority of the jobs.
+        Arguments: Other arguments of the 'Simulate_MonitoredData' job, such
+            as Tariffs.
+
+    outputs:
+        Returns a dictionary of job ids, keyed by test number.
+    '''
+
+    Ids = {}
+    for Simulation in Plan.index:
+        Case = Plan.loc[Simulation].where(Plan.loc[Simulation].notnull(), None).to_dict()
+        Job_Arguments = dict(Arguments, Case = Case, config = config)
+        Job_Arguments['Two Week Sim'] = Two_Week_Sim
+        Ids[Simulation] = Queue.submit('Simulate_MonitoredData', Job_Arguments, Priority)
+
+    return Ids
+
+def collect_summaries(Queue, Ids):
+    '''
+    Reads the summaries of finished 'Simulate_MonitoredData' jobs.
+
+    inputs:
+        Queue: A Job_Queue or HTTP_Job_Queue.
+        Ids: The job ids returned by submit_plan.
+
+    outputs:
+        Returns a pd.DataFrame with one row per finished job.
+    '''
+
+    import pandas as pd
+
+    Summaries = []
+    for Id in Ids.values():
+        if Queue.get_status(Id)['Status'] == 'done':
+            Summaries.append(pd.read_csv(Queue.get_result(Id, 'summary.csv'), index_col = 0))
+
+    return pd.concat(Summaries) if len(Summaries) > 0 else pd.DataFrame()
+
+def make_handler(Queue):
+    '''
+    Creates the HTTP request handler serving a Job_Queue.
+    '''
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def reply(self, Value, Code = 200):
+            Body = b'' if Value is None else to_json(Value).encode()
+            self.send_response(Code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(Body)))
+            self.end_headers()
+            self.wfile.write(Body)
+
+        def read_body(self):
+            return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        def get_file_path(self, Parts):
+            # Only allow files within the result folder of the job
+            return Queue.get_result_path(Parts[1], urllib.request.unquote('/'.join(Parts[3:])))
+
+        def handle_request(self, Method):
+            Parts = self.path.strip('/').split('/')
+            try:
+                if len(Parts) > 1 and Parts[0] == 'jobs':
+                    check_id(Parts[1])
+                if Method == 'GET' and Parts == ['jobs']:
+                    self.reply(Queue.list_jobs())
+                elif Method == 'GET' and len(Parts) == 2 and Parts[0] == 'jobs':
+                    self.reply(Queue.get_status(Parts[1]))
+                elif Method == 'GET' and len(Parts) > 3 and Parts[0] == 'jobs' and Parts[2] == 'files':
+                    with open(self.get_file_path(Parts), 'rb') as f:
+                        Body = f.read()
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(Body)))
+                    self.end_headers()
+                    self.wfile.write(Body)
+                elif Method == 'POST' and Parts == ['jobs']:
+                    Request = json.loads(self.read_body())
+                    self.reply({'Id': Queue.submit(Request['Job Type'], Request['Arguments'], Request.get('Priority', 0))})
+                elif Method == 'POST' and Parts == ['claim']:
+                    self.reply(Queue.claim(json.loads(self.read_body())['Worker']))
+                elif Method == 'POST' and len(Parts) == 3 and Parts[0] == 'jobs' and Parts[2] == 'cancel':
+                    self.reply({'Status': Queue.cancel(Parts[1])})
+                elif Method == 'POST' and len(Parts) == 3 and Parts[0] == 'jobs' and Parts[2] == 'lease':
+                    Request = json.loads(self.read_body())
+                    self.reply({'Running': Queue.renew_lease(dict(Request, Id = Parts[1]))})
+                elif Method == 'POST' and len(Parts) == 3 and Parts[0] == 'jobs' and Parts[2] == 'finish':
+                    Request = json.loads(self.read_body())
+                    if Request['Job'].get('Id') != Parts[1]:
+                        raise ValueError('The job does not match the request')
+                    self.reply({'Finished': Queue.finish(Request['Job'], Request['Status'], Error = Request.get('Error'))})
+                elif Method == 'PUT' and len(Parts) > 3 and Parts[0] == 'jobs' and Parts[2] == 'files':
+                    Queue.put_file(Parts[1], urllib.request.unquote('/'.join(Parts[3:])), self.read_body())
+                    self.reply(None)
+                else:
+                    self.reply({'Error': 'Unknown request'}, 404)
+            except (KeyError, ValueError, FileNotFoundError) as Error:
+                self.reply({'Error': str(Error)}, 400)
+
+        def do_GET(self):
+            self.handle_request('GET')
+
+        def do_POST(self):
+            self.handle_request('POST')
+
+        def do_PUT(self):
+            self.handle_request('PUT')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve_queue(Folder, Port = 8765, Host = '127.0.0.1'):
+    '''
+    Serves a queue directory over HTTP so workers without access to the
+    directory can run its jobs. Only listens on this computer by default.
+    Runs until interrupted.
+    '''
+
+    Server = ThreadingHTTPServer((Host, Port), make_handler(Job_Queue(Folder)))
+    print('Serving {} at http://{}:{}'.format(Folder, Host, Port))
+    try:
+        Server.serve_forever()
+    finally:
+        Server.server_close()
+
+if __name__ == '__main__':
+    Parser = argparse.ArgumentParser(description = 'Flexi-HPWH job service')
+    Commands = Parser.add_subparsers(dest = 'command', required = True)
+    Worker_Parser = Commands.add_parser('worker', help = 'Run jobs from a queue')
+    Worker_Parser.add_argument('location', help = 'The queue directory or HTTP address')
+    Worker_Parser.add_argument('--workers', type = int, default = None, help = 'Number of worker processes')
+    Worker_Parser.add_argument('--poll', type = float, default = 5, help = 'Seconds between checks of the queue')
+    Serve_Parser = Commands.add_parser('serve', help = 'Serve a queue directory over HTTP')
+    Serve_Parser.add_argument('folder', help = 'The queue directory')
+    Serve_Parser.add_argument('--port', type = int, default = 8765)
+    Serve_Parser.add_argument('--host', default = '127.0.0.1')
+    Arguments = Parser.parse_args()
+
+    if Arguments.command == 'worker':
+        for Worker in start_workers(Arguments.location, Arguments.workers, Poll_Interval = Arguments.poll):
+            Worker.join()
+    else:
+        serve_queue(Arguments.folder, Arguments.port, Arguments.host)
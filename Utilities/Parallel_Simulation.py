@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:00:28 2026
+
+This script contains functions used to split a Flexi-HPWH simulation into
+independent segments and run those segments concurrently on multiple cores.
+
+A simulation can be split wherever the state of the tank is re-initialized
+from measurements, such as when calc_rmse restarts the model after a day of
+rejected monitoring data. Only the node temperatures are re-initialized, the
+heat pump and resistance element status and the set temperature history
+carry across. Each segment is first simulated assuming the control state it
+would have at the start of a simulation, and segments whose assumption was
+wrong are simulated again from the state the previous segment ended in. The
+segments are then stitched back together in their original order.
+
+A continuous simulation, such as an annual simulation of a single
+configuration, can also be split into windows using simulate_warmup_windows.
+Each window starts from an estimated state and a warm-up period, and windows
+are simulated again until the state at each window boundary agrees with the
+end of the previous window. This is not parareal, as there is no coarse
+solve to predict the boundary states. It only saves time when the windows
+forget their starting state within the warm-up period.
+
+Scripts using these functions on Windows must protect their entry point with
+if __name__ == '__main__': so the worker processes do not re-run the script.
+
+@author: Peter Grant
+"""
+
+import os
+import sys
+import copy
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from HPWH_Model import HPWH_MultipleNodes
+
+def find_reinitialization_rows(Timestamps, rejected):
+    '''
+    Identifies the rows at which the model must be re-initialized because the
+    previous day of monitored data was rejected. This replaces checking
+    prior_date in rejected.index for every row of the simulation.
+
+    inputs:
+        Timestamps: The timestamps of each row in the simulation. Any
+            sequence that can be converted to a pd.DatetimeIndex.
+        rejected: A pd.DataFrame indexed by the dates that were rejected from
+            the monitored data set.
+
+    outputs:
+        Returns a numpy array of the row numbers requiring re-initialization.
+    '''
+
+    if len(rejected.index) == 0:
+        return np.array([], dtype = int)
+
+    Prior_Dates = pd.DatetimeIndex(Timestamps) - pd.Timedelta(1, unit = 'd')
+    return np.flatnonzero(Prior_Dates.isin(rejected.index))
+
+def split_segments(Number_Rows, Reinitialization_Rows):
+    '''
+    Splits the rows of a simulation into independent segments starting at each
+    re-initialization row.
+
+    inputs:
+        Number_Rows: The number of rows in the simulation.
+        Reinitialization_Rows: The rows at which the model is re-initialized,
+            as returned by find_reinitialization_rows.
+
+    outputs:
+        Returns a list of (start, end) tuples. end is exclusive, matching
+        python slicing.
+    '''
+
+    Starts = sorted(set([0] + [int(row) for row in Reinitialization_Rows if 0 < row < Number_Rows]))
+    Ends = Starts[1:] + [Number_Rows]
+
+    return list(zip(Starts, Ends))
+
+def get_control_state(HPWH):
+    '''
+    Returns the state of the HPWH which carries across a re-initialization,
+    in the format returned by HPWH_MultipleNodes.get_state but without the
+    node temperatures.
+    '''
+
+    State = HPWH.get_state()
+    del State['Node_Temperatures']
+
+    return State
+
+def compare_control_states(State_A, State_B, Time_Window):
+    '''
+    Returns True if two control states lead to the same simulation. The time
+    since the last set temperature change only affects the controls while it
+    is shorter than Time_Window, the 'Heat Pump Deadband Time Period (s)'.
+    '''
+
+    for attribute in ['Set_Temperature_HeatPump', 'Set_Temperature_Resistance', 'HeatPump_Active', 'Resistance_Active']:
+        if State_A[attribute] != State_B[attribute]:
+            return False
+
+    return min(State_A['Time_Since_Set_Change'], Time_Window) == min(State_B['Time_Since_Set_Change'], Time_Window)
+
+def simulate_segment(config, input_data, Node_Temperatures, Update_Frequency = None, Control_State = None):
+    '''
+    Simulates one segment of the input data set starting from the stated node
+    temperatures. This function is called by the worker processes, but can be
+    called directly when simulating a single segment.
+
+    inputs:
+        config: The configuration of the HPWH, including 'Column Index'.
+        input_data: The numpy array of inputs for the rows in this segment.
+        Node_Temperatures: The temperature of each node at the start of the
+            segment. Expressed in deg C.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+        Control_State: The control state at the start of the segment, as
+            returned by get_control_state. None uses the initial state
+            stated in config.
+
+    outputs:
+        Returns input_data with the model outputs stored in each row, and the
+        control state at the end of the segment.
+    '''
+
+    config = copy.copy(config)
+    config['Node Temperatures (deg C)'] = list(Node_Temperatures)
+    HPWH = HPWH_MultipleNodes(config)
+    if Control_State is not None:
+        HPWH.set_state(dict(Control_State, Node_Temperatures = list(Node_Temperatures)))
+
+    Time_Last_Update = time.time()
+    for row in range(0, len(input_data)):
+        input_data[row] = HPWH.calculate_timestep(input_data[row])
+
+        if Update_Frequency is not None and time.time() - Time_Last_Update >= Update_Frequency:
+            print('completed row {} of {} in segment'.format(row, len(input_data)))
+            Time_Last_Update = time.time()
+
+    return input_data, get_control_state(HPWH)
+
+def simulate_segments(config, input_data, Segments, Initial_Node_Temperatures, Number_Workers = None,
+                      Update_Frequency = None):
+    '''
+    Simulates each segment of the input data set, running them in parallel
+    when more than one worker is available, and stitches the outputs back
+    together in their original order.
+
+    The control state carries across each re-initialization, so the results
+    match simulating every row with one model and only resetting its node
+    temperatures. Segments are first simulated in parallel from the initial
+    control state. Any segment starting from a different control state than
+    the previous segment ended in is then simulated again, which usually
+    requires one more pass. The first segment is always correct, so this
+    takes at most one pass per segment. Learned occupant behavior depends on
+    every earlier row, so configurations using it are simulated
+    sequentially.
+
+    inputs:
+        config: The configuration of the HPWH, including 'Column Index'.
+        input_data: The numpy array of inputs for the full simulation.
+        Segments: The list of (start, end) tuples returned by split_segments.
+        Initial_Node_Temperatures: A list containing the node temperatures at
+            the start of each segment.
+        Number_Workers: The number of processes to use. Defaults to the
+            number of cores on this computer. Set to 1 to simulate the
+            segments sequentially in the current process.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+
+    outputs:
+        Returns the numpy array containing the outputs for every row.
+    '''
+
+    if Number_Workers is None:
+        Number_Workers = os.cpu_count()
+    if config.get('Occupant Behavior Window (days)') is not None:
+        Number_Workers = 1
+    Number_Workers = max(1, min(Number_Workers, len(Segments)))
+
+    Inputs = [input_data[start:end] for start, end in Segments]
+    print('Simulating {} segments using {} workers'.format(len(Segments), Number_Workers))
+
+    if Number_Workers == 1:
+        Outputs = []
+        Control_State = None
+        for Segment, Temperatures in zip(Inputs, Initial_Node_Temperatures):
+            Output, Control_State = simulate_segment(config, Segment, Temperatures, Update_Frequency, Control_State)
+            Outputs.append(Output)
+        return np.concatenate(Outputs)
+
+    Time_Window = config['Heat Pump Deadband Time Period (s)']
+    Control_States = [get_control_state(HPWH_MultipleNodes(copy.copy(config)))] * len(Segments)
+    Final_States = [None] * len(Segments)
+    Outputs = [None] * len(Segments)
+    Pending = list(range(len(Segments)))
+    with ProcessPoolExecutor(max_workers = Number_Workers) as executor:
+        while len(Pending) > 0:
+            Results = list(executor.map(simulate_segment, [config] * len(Pending), [Inputs[i] for i in Pending],
+                                        [Initial_Node_Temperatures[i] for i in Pending],
+                                        [Update_Frequency] * len(Pending), [Control_States[i] for i in Pending]))
+            for i, (Output, Final_State) in zip(Pending, Results):
+                Outputs[i] = Output
+                Final_States[i] = Final_State
+
+            # Simulate the segments again which started from a different
+            # control state than the previous segment ended in
+            Pending = []
+            for i in range(1, len(Segments)):
+                if not compare_control_states(Control_States[i], Final_States[i - 1], Time_Window):
+                    Control_States[i] = Final_States[i - 1]
+                    Pending.append(i)
+            if len(Pending) > 0:
+                print('Simulating {} segments again with the control state carried across the re-initialization'.format(len(Pending)))
+
+    return np.concatenate(Outputs)
+
+def split_windows(Number_Rows, Number_Windows, Warmup_Rows = 0):
+    '''
+    Splits the rows of a continuous simulation into windows for
+    simulate_warmup_windows.
+
+    inputs:
+        Number_Rows: The number of rows in the simulation.
+        Number_Windows: The number of windows to create.
+        Warmup_Rows: The number of rows before the start of each window which
+            are simulated, then discarded, to let the estimated state settle
+            before the window begins. Limited to the length of the previous
+            window.
+
+    outputs:
+        Returns a list of (warm-up start, start, end) tuples. end is
+        exclusive, matching python slicing.
+    '''
+
+    Edges = np.linspace(0, Number_Rows, max(1, min(Number_Windows, Number_Rows)) + 1).astype(int)
+    Windows = []
+    for window in range(len(Edges) - 1):
+        start = Edges[window]
+        end = Edges[window + 1]
+        if window == 0:
+            Warmup_Start = start
+        else:
+            Warmup_Start = max(Edges[window - 1], start - Warmup_Rows)
+        Windows.append((int(Warmup_Start), int(start), int(end)))
+
+    return Windows
+
+def simulate_window(config, input_data, State, Record_Row = None, Update_Frequency = None):
+    '''
+    Simulates one window of simulate_warmup_windows, including its warm-up
+    rows, starting from the stated model state.
+
+    inputs:
+        config: The configuration of the HPWH, including 'Column Index'.
+        input_data: The numpy array of inputs for the warm-up and window rows.
+        State: The state of the HPWH at the first row, in the format returned
+            by HPWH_MultipleNodes.get_state.
+        Record_Row: The row, relative to the start of input_data, at which the
+            state should be recorded before the row is simulated. This is the
+            warm-up start of the next window. None skips the recording.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+
+    outputs:
+        Returns input_data with the model outputs stored in each row, and the
+        recorded state.
+    '''
+
+    HPWH = HPWH_MultipleNodes(copy.copy(config))
+    HPWH.set_state(State)
+
+    Recorded_State = None
+    Time_Last_Update = time.time()
+    for row in range(0, len(input_data)):
+        if row == Record_Row:
+            Recorded_State = HPWH.get_state()
+        input_data[row] = HPWH.calculate_timestep(input_data[row])
+
+        if Update_Frequency is not None and time.time() - Time_Last_Update >= Update_Frequency:
+            print('completed row {} of {} in window'.format(row, len(input_data)))
+            Time_Last_Update = time.time()
+    if Record_Row == len(input_data):
+        Recorded_State = HPWH.get_state()
+
+    return input_data, Recorded_State
+
+def calculate_boundary_difference(State_Previous, State_New):
+    '''
+    Calculates the largest difference in node temperature between two
+    estimates of the state at a window boundary. Returns infinity if the heat
+    pump or resistance elements are in a different mode, because that
+    difference will not be corrected by nearby node temperatures.
+    '''
+
+    if (State_Previous['HeatPump_Active'] != State_New['HeatPump_Active'] or 
+        State_Previous['Resistance_Active'] != State_New['Resistance_Active']):
+        return np.inf
+
+    return float(np.max(np.abs(np.array(State_Previous['Node_Temperatures'], dtype = float) - 
+                               np.array(State_New['Node_Temperatures'], dtype = float))))
+
+def simulate_warmup_windows(config, input_data, Number_Windows, Warmup_Rows = 0, Tolerance = 0.05, 
+                            Max_Iterations = None, Number_Workers = None, Update_Frequency = None):
+    '''
+    Performs a continuous simulation by splitting it into windows which are
+    simulated concurrently, each preceded by warm-up rows:
+        
+        1. Every window starts from an estimated state. The first window uses
+           the initial state stated in config, which is exact. The other
+           windows also use it as their first estimate, which is reasonable
+           because the controls keep the tank near the set temperature.
+        2. All windows are simulated in parallel, each starting Warmup_Rows
+           before the window so the estimated state can settle.
+        3. The state each window started from is compared to the state the
+           previous window reached at the same row. Windows whose start state
+           differs by more than Tolerance are corrected and simulated again.
+        4. Steps 2 and 3 repeat until every boundary agrees. The first window
+           is always exact, so each iteration finalizes at least one more
+           window and the process converges in at most Number_Windows
+           iterations.
+
+    At every window boundary the node temperatures agree with those the
+    previous window reached to within Tolerance, and the largest remaining
+    difference is reported in Diagnostics. The result only matches a
+    sequential simulation exactly if Tolerance is 0. The saving depends on
+    the warm-up rows removing the error in the estimated state. There is no
+    coarse solve predicting the boundary states, so a window which does not
+    settle is only corrected once the previous window is final. In the worst
+    case the windows are simulated one after the other, and the total work is
+    about Number_Windows / 2 times that of a sequential simulation.
+    Predicting the boundaries with HPWH_MultipleNodes_Batch at a 15 min
+    timestep was tested on 40 days of 1 min data in 4 windows. The node
+    temperatures it predicted differed by several deg C, the windows still
+    needed 4 iterations, and the coarse solve made the simulation 3 times
+    slower, so it is not used.
+
+    inputs:
+        config: The configuration of the HPWH, including 'Column Index' and
+            'Node Temperatures (deg C)'.
+        input_data: The numpy array of inputs for the full simulation.
+        Number_Windows: The number of windows to split the simulation into.
+            Typically the number of available cores.
+        Warmup_Rows: The number of rows simulated before each window and then
+            discarded. Longer warm-up periods reduce the number of iterations.
+        Tolerance: The largest acceptable difference in node temperature at a
+            window boundary. Expressed in deg C.
+        Max_Iterations: The maximum number of iterations. Defaults to
+            Number_Windows, which guarantees convergence.
+        Number_Workers: The number of processes to use. Defaults to the
+            number of cores on this computer.
+        Update_Frequency: Prints a status update after this many seconds.
+            None disables the updates.
+
+    outputs:
+        input_data: The numpy array containing the outputs for every row.
+        Diagnostics: A pd.DataFrame describing the convergence of each
+            iteration. 'Max Remaining Difference (deg C)' is the largest
+            difference at any boundary between the state a window started
+            from and the state the previous window reached, after the
+            iteration.
+    '''
+
+    Windows = split_windows(len(input_data), Number_Windows, Warmup_Rows)
+    if Max_Iterations is None:
+        Max_Iterations = len(Windows)
+    if Number_Workers is None:
+        Number_Workers = os.cpu_count()
+    Number_Workers = max(1, min(Number_Workers, len(Windows)))
+
+    # Estimate the state at each window boundary using the initial state
+    Estimated_State = HPWH_MultipleNodes(copy.copy(config)).get_state()
+    States = [copy.deepcopy(Estimated_State) for window in Windows]
+    # The state each window was last simulated from, and the state it
+    # reached at the start of the following window
+    Simulated_States = [None] * len(Windows)
+    Recorded_States = [None] * len(Windows)
+    Outputs = [None] * len(Windows)
+    Pending = list(range(len(Windows)))
+    Diagnostics = []
+    print('Simulating {} windows using {} workers'.format(len(Windows), Number_Workers))
+
+    executor = ProcessPoolExecutor(max_workers = Number_Workers) if Number_Workers > 1 else None
+    try:
+        for iteration in range(1, Max_Iterations + 1):
+            Inputs = []
+            Record_Rows = []
+            for window in Pending:
+                Warmup_Start, start, end = Windows[window]
+                Inputs.append(input_data[Warmup_Start:end].copy())
+                if window < len(Windows) - 1:
+                    Record_Rows.append(Windows[window + 1][0] - Warmup_Start)
+                else:
+                    Record_Rows.append(None)
+            Pending_States = [States[window] for window in Pending]
+            for window in Pending:
+                Simulated_States[window] = States[window]
+
+            if executor is None:
+                Results = [simulate_window(config, Inputs[i], Pending_States[i], Record_Rows[i], Update_Frequency) 
+                           for i in range(len(Pending))]
+            else:
+                Results = list(executor.map(simulate_window, [config] * len(Pending), Inputs, Pending_States,
+                                            Record_Rows, [Update_Frequency] * len(Pending)))
+
+            # Store the outputs and correct the state at the following boundary
+            Next_Pending = []
+            Max_Difference = 0
+            for window, (Output, Recorded_State) in zip(Pending, Results):
+                Warmup_Start, start, end = Windows[window]
+                Outputs[window] = Output[start - Warmup_Start:]
+                if Recorded_State is None:
+                    continue
+                Recorded_States[window] = Recorded_State
+                # The following window keeps its outputs unless it started
+                # from a state differing by more than Tolerance
+                Difference = calculate_boundary_difference(Simulated_States[window + 1], Recorded_State)
+                Max_Difference = max(Max_Difference, Difference)
+                if Difference > Tolerance:
+                    States[window + 1] = Recorded_State
+                    Next_Pending.append(window + 1)
+            Remaining_Difference = max([calculate_boundary_difference(Simulated_States[window + 1], Recorded_States[window])
+                                        for window in range(len(Windows) - 1)] + [0])
+
+            Diagnostics.append({'Iteration': iteration,
+                                'Windows Simulated': len(Pending),
+                                'Windows Not Converged': len(Next_Pending),
+                                'Max Boundary Difference (deg C)': Max_Difference,
+                                'Max Remaining Difference (deg C)': Remaining_Difference})
+            print('Iteration {}: simulated {} windows, max boundary difference is {} deg C, {} deg C remaining'.format(
+                iteration, len(Pending), Max_Difference, Remaining_Difference))
+            
+            Pending = Next_Pending
+            if len(Pending) == 0:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if len(Pending) > 0:
+        print('WARNING: {} windows did not converge within {} iterations'.format(len(Pending), Max_Iterations))
+
+    Diagnostics = pd.DataFrame(Diagnostics).set_index('Iteration')
+    Diagnostics['Converged'] = Diagnostics['Windows Not Converged'] == 0
+
+    return np.concatenate(Outputs), Diagnostics
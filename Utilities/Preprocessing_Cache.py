@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:02:46 2026
+
+This script contains functions used to store prepared input data sets on disk
+so that they only need to be prepared once. Preparing a Creekside draw profile
+requires filling blanks, calculating the timesteps, converting units,
+overwriting climate zone data, estimating hot water draws and calculating the
+installation temperatures. Many test cases share the same prepared data, so
+storing it saves that time in every simulation after the first.
+
+Each prepared data set is stored in its own folder with one .npy file per
+column and a manifest describing the columns. The files are memory-mapped
+when read, so only the pages that are used are loaded from disk.
+
+@author: Peter Grant
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+Manifest_File = 'manifest.json'
+
+def hash_file(path):
+    '''
+    Calculates a hash of the contents of a file. Used to identify draw
+    profiles that are read from disk.
+    '''
+
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+def hash_dataframe(data):
+    '''
+    Calculates a hash of the contents of a pd.DataFrame, including the index
+    and column names. Used to identify draw profiles that were already read
+    into memory.
+    '''
+
+    sha = hashlib.sha1()
+    sha.update(json.dumps([str(column) for column in data.columns]).encode())
+    sha.update(pd.util.hash_pandas_object(data, index = True).to_numpy().tobytes())
+
+    return sha.hexdigest()
+
+def get_cache_key(*parts):
+    '''
+    Combines the values identifying a prepared data set into a single key
+    which is safe to use as a folder name.
+    '''
+
+    return hashlib.sha1(json.dumps([str(part) for part in parts]).encode()).hexdigest()
+
+def save_dataframe(data, Cache_Folder, key):
+    '''
+    Stores a prepared data set in the cache.
+
+    The data is written to a temporary folder first and then moved into place
+    so that other processes never read a partially written data set.
+
+    inputs:
+        data: The pd.DataFrame to store. Must have a pd.DatetimeIndex.
+            Columns of other types are stored as numbers if possible and as
+            fixed width text otherwise.
+        Cache_Folder: The folder containing the cache.
+        key: The key identifying this data set, from get_cache_key.
+    '''
+
+    os.makedirs(Cache_Folder, exist_ok = True)
+    Temporary_Folder = tempfile.mkdtemp(dir = Cache_Folder)
+
+    manifest = {'columns': [], 'dtypes': []}
+    np.save(os.path.join(Temporary_Folder, 'index.npy'), data.index.to_numpy(dtype = 'datetime64[ns]').view('int64'))
+    for i, column in enumerate(data.columns):
+        values = data[column].to_numpy()
+        if np.issubdtype(values.dtype, np.datetime64):
+            values = values.astype('datetime64[ns]').view('int64')
+            dtype = 'datetime64[ns]'
+        elif values.dtype == object:
+            try:
+                values = values.astype(float)
+                dtype = 'float64'
+            except (TypeError, ValueError):
+                # Text is stored as fixed width strings, which can be
+                # memory-mapped, and converted back to objects when read
+                values = values.astype(str)
+                dtype = 'object'
+        else:
+            dtype = str(values.dtype)
+        np.save(os.path.join(Temporary_Folder, '{}.npy'.format(i)), values)
+        manifest['columns'].append(column)
+        manifest['dtypes'].append(dtype)
+    with open(os.path.join(Temporary_Folder, Manifest_File), 'w') as f:
+        json.dump(manifest, f)
+
+    try:
+        os.replace(Temporary_Folder, os.path.join(Cache_Folder, key))
+    except OSError:
+        # Another process stored the same data set first
+        shutil.rmtree(Temporary_Folder, ignore_errors = True)
+
+def in_cache(Cache_Folder, key):
+    '''
+    Returns True if a prepared data set is stored in the cache.
+    '''
+
+    return os.path.exists(os.path.join(Cache_Folder, key, Manifest_File))
+
+def load_dataframe(Cache_Folder, key):
+    '''
+    Reads a prepared data set from the cache. The columns are memory-mapped
+    copy-on-write, so they can be modified in memory without changing the
+    cache.
+
+    inputs:
+        Cache_Folder: The folder containing the cache.
+        key: The key identifying this data set, from get_cache_key.
+
+    outputs:
+        Returns the stored pd.DataFrame, or None if it is not in the cache.
+    '''
+
+    Folder = os.path.join(Cache_Folder, key)
+    if not os.path.exists(os.path.join(Folder, Manifest_File)):
+        return None
+
+    with open(os.path.join(Folder, Manifest_File)) as f:
+        manifest = json.load(f)
+
+    index = pd.DatetimeIndex(np.load(os.path.join(Folder, 'index.npy')).view('datetime64[ns]'))
+    columns = {}
+    for i, (column, dtype) in enumerate(zip(manifest['columns'], manifest['dtypes'])):
+        values = np.load(os.path.join(Folder, '{}.npy'.format(i)), mmap_mode = 'c')
+        if dtype == 'datetime64[ns]':
+            values = values.view('datetime64[ns]')
+        elif dtype == 'object':
+            values = values.astype(object)
+        columns[column] = values
+
+    return pd.DataFrame(columns, index = index, copy = False)
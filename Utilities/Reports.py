@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:35:57 2026
+
+This script creates the figures describing Flexi-HPWH simulations. It is a
+separate stage which reads the results stored by the simulations, so the
+simulations themselves never import matplotlib or create figures. Reports
+can be generated after a batch of simulations finishes, on another computer,
+or only for the cases of interest.
+
+The figures are created for every results file in a folder which contains
+the columns needed by each figure type in Figure_Types:
+    'Cumulative Electricity': The cumulative electricity consumption of the
+        HPWH. Created from the files saved by Simulate_MonitoredData and
+        Flexi_HPWH.py.
+    'Lower Thermostat Temperature': The measured and modelled lower
+        thermostat temperature. Created from the files saved by calc_rmse.
+The cumulative electricity consumption of every case is also drawn in a
+single comparison figure.
+
+Figures are saved as image files using the non-interactive Agg backend and
+closed once saved. The files are divided between worker processes, and
+figures which are newer than their results file are not created again.
+
+Usage:
+    python Reports.py <results folder> [--report-folder <folder>] [--workers N]
+
+Scripts using these functions on Windows must protect their entry point with
+if __name__ == '__main__': so the worker processes do not re-run the script.
+
+@author: Peter Grant
+"""
+
+import os
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# The columns needed by each figure type
+Figure_Types = {'Cumulative Electricity': ['Electricity Consumed Total (kWh)'],
+                'Lower Thermostat Temperature': ['Measured Temperature, Lower Thermostat (deg C)',
+                                                 'Modelled Temperature, Lower Thermostat (deg C)']}
+
+def get_pyplot():
+    '''
+    Imports matplotlib.pyplot using the non-interactive Agg backend.
+    '''
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    return plt
+
+def read_columns(Path):
+    '''
+    Returns the names of the columns in a results file without reading the
+    data.
+    '''
+
+    import pandas as pd
+
+    return list(pd.read_csv(Path, index_col = 0, nrows = 0).columns)
+
+def read_results(Path, Columns):
+    '''
+    Reads the stated columns of a results file, indexed by timestamp.
+    '''
+
+    import pandas as pd
+
+    Index_Column = pd.read_csv(Path, nrows = 0).columns[0]
+    Results = pd.read_csv(Path, index_col = 0, usecols = [Index_Column] + list(Columns))
+    Results.index = pd.to_datetime(Results.index)
+
+    return Results
+
+def find_figures(Results_Folder, Report_Folder, Pattern = '*.csv'):
+    '''
+    Lists the figures which can be created from the results files in a
+    folder.
+
+    outputs:
+        A list of (results file, figure type, figure file) tuples.
+    '''
+
+    Figures = []
+    for Path in sorted(glob.glob(os.path.join(Results_Folder, Pattern))):
+        Columns = read_columns(Path)
+        Name = os.path.splitext(os.path.basename(Path))[0]
+        for Figure_Type, Required in Figure_Types.items():
+            if all(column in Columns for column in Required):
+                Figures.append((Path, Figure_Type, os.path.join(Report_Folder, '{}, {}.png'.format(Name, Figure_Type))))
+
+    return Figures
+
+def is_current(Figure_Path, Sources):
+    '''
+    Returns True if the figure exists and is newer than every source file.
+    '''
+
+    if not os.path.exists(Figure_Path):
+        return False
+
+    return all(os.path.getmtime(Figure_Path) >= os.path.getmtime(Source) for Source in Sources)
+
+def plot_figures(Figures):
+    '''
+    Creates a list of figures from find_figures. Called in a separate process
+    by create_report. Each figure is closed once saved.
+    '''
+
+    plt = get_pyplot()
+    for Path, Figure_Type, Figure_Path in Figures:
+        Results = read_results(Path, Figure_Types[Figure_Type])
+        fig, ax = plt.subplots(figsize = (12, 6))
+        if Figure_Type == 'Cumulative Electricity':
+            ax.plot(Results.index, Results['Electricity Consumed Total (kWh)'].cumsum())
+            ax.set_ylabel('Cumulative Electricity Consumption (kWh)')
+        else:
+            for column in Figure_Types[Figure_Type]:
+                ax.plot(Results.index, Results[column], label = column.split(',')[0])
+            ax.set_ylabel('Lower Thermostat Temperature (deg C)')
+            ax.legend()
+        ax.set_title(os.path.splitext(os.path.basename(Path))[0])
+        fig.savefig(Figure_Path)
+        plt.close(fig)
+
+    return len(Figures)
+
+def plot_comparison(Paths, Figure_Path):
+    '''
+    Draws the cumulative electricity consumption of several results files in
+    one figure, labelled by file name.
+    '''
+
+    plt = get_pyplot()
+    fig, ax = plt.subplots(figsize = (12, 6))
+    for Path in Paths:
+        Results = read_results(Path, Figure_Types['Cumulative Electricity'])
+        ax.plot(Results.index, Results['Electricity Consumed Total (kWh)'].cumsum(),
+                label = os.path.splitext(os.path.basename(Path))[0])
+    ax.set_ylabel('Cumulative Electricity Consumption (kWh)')
+    if len(Paths) <= 20:
+        ax.legend()
+    fig.savefig(Figure_Path)
+    plt.close(fig)
+
+def create_report(Results_Folder, Report_Folder = None, Pattern = '*.csv', Number_Workers = None, Overwrite = False):
+    '''
+    Creates the figures describing every results file in a folder.
+
+    inputs:
+        Results_Folder: The folder containing the results files.
+        Report_Folder: The folder in which to save the figures. Defaults to
+            a 'Report' folder within Results_Folder.
+        Pattern: The pattern matching the results files.
+        Number_Workers: The number of processes used to create the figures.
+            Defaults to the number of cores on this computer.
+        Overwrite: Set to True to create figures which are newer than their
+            results file again.
+
+    outputs:
+        A list of the figure files which were created.
+    '''
+
+    if Report_Folder is None:
+        Report_Folder = os.path.join(Results_Folder, 'Report')
+    if Number_Workers is None:
+        Number_Workers = os.cpu_count()
+    os.makedirs(Report_Folder, exist_ok = True)
+
+    Figures = find_figures(Results_Folder, Report_Folder, Pattern)
+    Pending = [Figure for Figure in Figures if Overwrite or not is_current(Figure[2], [Figure[0]])]
+    Created = [Figure[2] for Figure in Pending]
+
+    # Divide the figures between the workers, each creating a batch
+    Number_Workers = max(1, min(Number_Workers, len(Pending)))
+    Batches = [Pending[i::Number_Workers] for i in range(Number_Workers)]
+    if Number_Workers > 1:
+        with ProcessPoolExecutor(max_workers = Number_Workers) as executor:
+            list(executor.map(plot_figures, Batches))
+    elif Pending:
+        plot_figures(Pending)
+
+    Paths = [Path for Path, Figure_Type, Figure_Path in Figures if Figure_Type == 'Cumulative Electricity']
+    Comparison_Path = os.path.join(Report_Folder, 'Cumulative Electricity, All Cases.png')
+    if len(Paths) > 1 and (Overwrite or not is_current(Comparison_Path, Paths)):
+        plot_comparison(Paths, Comparison_Path)
+        Created.append(Comparison_Path)
+    print('Created {} figures in {}'.format(len(Created), Report_Folder))
+
+    return Created
+
+if __name__ == '__main__':
+    Parser = argparse.ArgumentParser(description = 'Create figures from stored Flexi-HPWH results')
+    Parser.add_argument('results_folder', help = 'The folder containing the results files')
+    Parser.add_argument('--report-folder', default = None, help = 'The folder in which to save the figures')
+    Parser.add_argument('--pattern', default = '*.csv', help = 'The pattern matching the results files')
+    Parser.add_argument('--workers', type = int, default = None, help = 'The number of worker processes')
+    Parser.add_argument('--overwrite', action = 'store_true', help = 'Create figures which are up to date again')
+    Arguments = Parser.parse_args()
+
+    create_report(Arguments.results_folder, Arguments.report_folder, Arguments.pattern, Arguments.workers,
+                  Arguments.overwrite)
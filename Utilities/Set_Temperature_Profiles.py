@@ -111,6 +111,14 @@ Profiles = {
                           '19': 51.6, '20': 51.6, '21': 51.6, '22': 51.6, '23': 51.6}             
            }
 
+def get_profile(Profile):
+    '''
+    Returns the set temperature of each hour of the day, in deg C, for the
+    named profile. The keys are the hours as strings, '0' to '23'.
+    '''
+    
+    return Profiles[Profile]
+
 def Supervisory_Control(Current_Set_Temperature, Current_Hour, Prices, Control_Logic):
     '''
     Creates an optimized set temperature profile for the HPWH based on the current set temperature and
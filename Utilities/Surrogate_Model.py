@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:40:43 2026
+
+This script creates surrogate models of Flexi-HPWH, estimating the annual
+key performance indicators of a HPWH design without simulating it. They are
+intended for early-stage screening of thousands of combinations of tank
+volume, compressor size, UA, set temperature profile, installation
+configuration and climate zone, far more than can be simulated.
+
+A surrogate model is trained by:
+    1. Generating a design of experiments. The continuous design parameters
+        (tank volume, compressor size and UA) are sampled using a Latin
+        hypercube within the bounds in Bounds.
+    2. Simulating every design in every climate zone for each combination of
+        set temperature profile and installation configuration, using the
+        batched simulation in Simulate_ClimateZones.
+    3. Fitting a quadratic regression of each KPI in Targets to the design
+        parameters, separately for each combination of set temperature
+        profile, installation configuration and climate zone.
+
+Each regression reports the standard error of its estimates and the
+leave-one-out cross-validation error of the fit. Estimates are calculated
+using plain Python arithmetic, taking microseconds. Queries outside the
+trained domain, either a design parameter outside the sampled range or a
+profile, installation or climate zone which was not simulated, are simulated
+instead when the draw profile used for training is available.
+
+@author: Peter Grant
+"""
+
+import time
+import pickle
+import itertools
+import numpy as np
+import pandas as pd
+
+from HPWH_Utilities import Simulate_ClimateZones, Design_Parameters
+
+# The range of each continuous design parameter sampled in the design of
+# experiments
+Bounds = {'Tank volume (L)': (150, 450),
+          'Compressor size (W)': (1000, 4000),
+          'UA (W/K)': (1.5, 4.0)}
+
+# The key performance indicators estimated by the surrogate models, using the
+# names in the summary of Simulate_ClimateZones
+Targets = ['Electricity Consumed (kWh)', 'Annual COP', 'Electricity Consumed Peak (kWh, 4-9P)']
+
+# The parameters identifying each regression
+Categories = ['Set Temperature Profile', 'Installation Configuration', 'Climate Zone']
+
+def latin_hypercube(Bounds, Number_Samples, Seed = None):
+    '''
+    Samples the design parameters using a Latin hypercube. The range of each
+    parameter is divided into Number_Samples intervals of equal width, and
+    each interval is sampled once.
+
+    inputs:
+        Bounds: A dictionary containing the (minimum, maximum) of each
+            parameter.
+        Number_Samples: The number of designs.
+        Seed: Optional. The seed of the random number generator.
+
+    outputs:
+        A pd.DataFrame with one row per design and one column per parameter.
+    '''
+
+    Generator = np.random.default_rng(Seed)
+    Designs = pd.DataFrame(index = pd.RangeIndex(Number_Samples, name = 'Design'))
+    for parameter, (Minimum, Maximum) in Bounds.items():
+        Position = (Generator.permutation(Number_Samples) + Generator.random(Number_Samples)) / Number_Samples
+        Designs[parameter] = Minimum + Position * (Maximum - Minimum)
+
+    return Designs
+
+def calculate_terms(Normalized):
+    '''
+    Calculates the terms of a quadratic regression: a constant, every
+    parameter, and the product of every pair of parameters including the
+    squares. Normalized contains one row per design, with each parameter
+    scaled from -1 to 1 over its bounds.
+    '''
+
+    Normalized = np.atleast_2d(Normalized)
+    Terms = [np.ones(len(Normalized))]
+    Terms += [Normalized[:, i] for i in range(Normalized.shape[1])]
+    Terms += [Normalized[:, i] * Normalized[:, j] for i, j in
+              itertools.combinations_with_replacement(range(Normalized.shape[1]), 2)]
+
+    return np.column_stack(Terms)
+
+def fit_regression(Terms, Values):
+    '''
+    Fits a regression of several KPIs to the same designs using least squares.
+
+    inputs:
+        Terms: The terms of each design, from calculate_terms.
+        Values: A dictionary containing the simulated value of each design,
+            for each KPI.
+
+    outputs:
+        A dictionary containing the 'Covariance' matrix used to calculate the
+        standard error of estimates, which is shared by every KPI, and for
+        each KPI the 'Coefficients', the 'Variance' of the residuals and the
+        leave-one-out cross-validation error as 'RMSE' and 'Maximum Error'.
+    '''
+
+    Number_Samples, Number_Terms = Terms.shape
+    if Number_Samples <= Number_Terms:
+        raise ValueError('At least {} designs are needed to fit {} terms'.format(Number_Terms + 1, Number_Terms))
+
+    Covariance = np.linalg.pinv(Terms.T @ Terms)
+    # The leave-one-out residuals follow from the leverage of each design,
+    # without fitting the regression again
+    Leverage = np.einsum('ij,jk,ik->i', Terms, Covariance, Terms)
+
+    Regression = {'Covariance': Covariance.tolist()}
+    for Target, Value in Values.items():
+        Coefficients = Covariance @ Terms.T @ Value
+        Residuals = Value - Terms @ Coefficients
+        Errors = Residuals / np.maximum(1 - Leverage, 1e-12)
+        Regression[Target] = {'Coefficients': Coefficients.tolist(),
+                              'Variance': float(Residuals @ Residuals) / (Number_Samples - Number_Terms),
+                              'RMSE': float(np.sqrt(np.mean(Errors ** 2))),
+                              'Maximum Error': float(np.abs(Errors).max())}
+
+    return Regression
+
+class Surrogate_Model():
+    '''
+    Estimates the annual KPIs of HPWH designs using regressions fitted to a
+    design of experiments. See the description at the top of this script.
+    '''
+
+    def __init__(self, Bounds = Bounds, Targets = Targets):
+        '''
+        inputs:
+            Bounds: The range of each continuous design parameter, in the
+                format of Bounds at the top of this script.
+            Targets: The KPIs to estimate, using the names in the summary of
+                Simulate_ClimateZones.
+        '''
+
+        for parameter in Bounds:
+            if parameter not in Design_Parameters:
+                raise ValueError('Unknown design parameter {}. Options are {}'.format(parameter, list(Design_Parameters)))
+        self.Bounds = dict(Bounds)
+        self.Parameters = list(Bounds.keys())
+        self.Targets = list(Targets)
+        self.Regressions = {}
+        self.Training = None
+        self.Simulation = None
+        self.Simulated = {}
+
+    def train(self, Draw_Profile, config, Set_Temperature_Profiles, Installation_Configurations, Case_Type,
+              CZs = None, Number_Samples = 30, Seed = None, note = ''):
+        '''
+        Generates the design of experiments, simulates it and fits the
+        regressions.
+
+        inputs:
+            Draw_Profile: The Creekside draw profile used in every simulation.
+            config: The configuration of the HPWH. The design parameters
+                overwrite the corresponding entries.
+            Set_Temperature_Profiles: The names of the set temperature
+                profiles to train.
+            Installation_Configurations: The names of the installation
+                configurations to train.
+            Case_Type: The case type, as used in Apply_Case_Type.
+            CZs: The climate zones to train. Defaults to every climate zone.
+            Number_Samples: The number of designs. Must exceed the number of
+                terms in the regression, 10 with the default Bounds.
+            Seed: Optional. The seed of the design of experiments.
+            note: A note specified in the test matrix, as used in
+                Simulate_ClimateZones.
+
+        outputs:
+            A pd.DataFrame describing the cross-validation error of every
+            regression, as returned by validation.
+        '''
+
+        start_time = time.time()
+        Designs = latin_hypercube(self.Bounds, Number_Samples, Seed)
+        # Stored so queries outside the trained domain can be simulated
+        self.Simulation = {'Draw Profile': Draw_Profile.copy(), 'config': config, 'Case Type': Case_Type,
+                           'note': note}
+
+        Training = []
+        for Profile, Installation in itertools.product(Set_Temperature_Profiles, Installation_Configurations):
+            summary = Simulate_ClimateZones(Draw_Profile.copy(), dict(config), Profile, Installation, Case_Type,
+                                            note = note, CZs = CZs, Designs = Designs)
+            summary = summary.reset_index()
+            summary['Set Temperature Profile'] = Profile
+            summary['Installation Configuration'] = Installation
+            Training.append(summary)
+        print('simulated the design of experiments in {} min'.format((time.time() - start_time)/60))
+
+        return self.fit(pd.concat(Training, ignore_index = True))
+
+    def fit(self, Training):
+        '''
+        Fits the regressions to a table of simulation results, such as a
+        table stored by a previous call to train.
+
+        inputs:
+            Training: A pd.DataFrame with one row per simulation, containing
+                the columns in Categories, the design parameters and Targets.
+
+        outputs:
+            A pd.DataFrame describing the cross-validation error of every
+            regression, as returned by validation.
+        '''
+
+        self.Training = Training
+        self.Regressions = {}
+        for Group, Data in Training.groupby(Categories, sort = False):
+            Terms = calculate_terms(self.normalize(Data[self.Parameters].to_numpy(dtype = float)))
+            Values = {Target: Data[Target].to_numpy(dtype = float) for Target in self.Targets}
+            self.Regressions[tuple(str(value) for value in Group)] = fit_regression(Terms, Values)
+
+        return self.validation()
+
+    def validation(self):
+        '''
+        Returns a pd.DataFrame with one row per regression, containing the
+        leave-one-out cross-validation RMSE and maximum error of each KPI.
+        '''
+
+        Rows = {}
+        for Group, Regression in self.Regressions.items():
+            Rows[Group] = {}
+            for Target in self.Targets:
+                Rows[Group]['{}, RMSE'.format(Target)] = Regression[Target]['RMSE']
+                Rows[Group]['{}, Maximum Error'.format(Target)] = Regression[Target]['Maximum Error']
+
+        Validation = pd.DataFrame.from_dict(Rows, orient = 'index')
+        Validation.index = pd.MultiIndex.from_tuples(Validation.index, names = Categories)
+
+        return Validation
+
+    def normalize(self, Values):
+        '''
+        Scales design parameters from -1 to 1 over their bounds.
+        '''
+
+        Minimum = np.array([self.Bounds[parameter][0] for parameter in self.Parameters])
+        Maximum = np.array([self.Bounds[parameter][1] for parameter in self.Parameters])
+
+        return 2 * (np.asarray(Values, dtype = float) - Minimum) / (Maximum - Minimum) - 1
+
+    def in_domain(self, Set_Temperature_Profile, Installation_Configuration, Climate_Zone, Design):
+        '''
+        Returns True if a query is within the trained domain: its profile,
+        installation configuration and climate zone were simulated, and every
+        design parameter is within the bounds.
+        '''
+
+        if (str(Set_Temperature_Profile), str(Installation_Configuration), str(Climate_Zone).zfill(2)) not in self.Regressions:
+            return False
+
+        return all(self.Bounds[parameter][0] <= Design[parameter] <= self.Bounds[parameter][1]
+                   for parameter in self.Parameters)
+
+    def predict(self, Set_Temperature_Profile, Installation_Configuration, Climate_Zone, Design):
+        '''
+        Estimates the KPIs of one design using the regressions. Uses plain
+        Python arithmetic so each estimate takes microseconds.
+
+        inputs:
+            Set_Temperature_Profile: The name of the set temperature profile.
+            Installation_Configuration: The name of the installation
+                configuration.
+            Climate_Zone: The climate zone.
+            Design: A dictionary containing the design parameters.
+
+        outputs:
+            A dictionary containing the estimate of each KPI, and its
+            standard error as '<KPI>, Standard Error'.
+        '''
+
+        Regression = self.Regressions[(str(Set_Temperature_Profile), str(Installation_Configuration),
+                                       str(Climate_Zone).zfill(2))]
+        Normalized = [2 * (Design[parameter] - self.Bounds[parameter][0]) / (self.Bounds[parameter][1] - self.Bounds[parameter][0]) - 1
+                      for parameter in self.Parameters]
+        Terms = [1.0] + Normalized + [Normalized[i] * Normalized[j] for i, j in
+                                      itertools.combinations_with_replacement(range(len(Normalized)), 2)]
+
+        Leverage = sum(Terms[i] * sum(term * value for term, value in zip(Terms, row))
+                       for i, row in enumerate(Regression['Covariance']))
+        Estimates = {}
+        for Target in self.Targets:
+            Estimates[Target] = sum(term * coefficient for term, coefficient in zip(Terms, Regression[Target]['Coefficients']))
+            Estimates['{}, Standard Error'.format(Target)] = (Regression[Target]['Variance'] * (1 + Leverage)) ** 0.5
+
+        return Estimates
+
+    def predict_many(self, Queries):
+        '''
+        Estimates the KPIs of many designs at once using array operations.
+
+        inputs:
+            Queries: A pd.DataFrame with one row per query, containing the
+                columns in Categories and the design parameters. Every query
+                must be within the trained domain.
+
+        outputs:
+            A pd.DataFrame containing the estimates of every query, with the
+            same index as Queries.
+        '''
+
+        Estimates = pd.DataFrame(index = Queries.index)
+        Groups = zip(Queries['Set Temperature Profile'].astype(str), Queries['Installation Configuration'].astype(str),
+                     Queries['Climate Zone'].astype(str).str.zfill(2))
+        Groups = pd.Series(list(Groups), index = Queries.index)
+        for Group, Rows in Groups.groupby(Groups, sort = False).groups.items():
+            Regression = self.Regressions[Group]
+            Terms = calculate_terms(self.normalize(Queries.loc[Rows, self.Parameters].to_numpy(dtype = float)))
+            Leverage = np.einsum('ij,jk,ik->i', Terms, np.asarray(Regression['Covariance']), Terms)
+            for Target in self.Targets:
+                Estimates.loc[Rows, Target] = Terms @ np.asarray(Regression[Target]['Coefficients'])
+                Estimates.loc[Rows, '{}, Standard Error'.format(Target)] = np.sqrt(Regression[Target]['Variance'] * (1 + Leverage))
+
+        return Estimates
+
+    def simulate(self, Set_Temperature_Profile, Installation_Configuration, Climate_Zone, Design):
+        '''
+        Simulates one design using the draw profile, configuration and case
+        type used for training. Results are stored, so repeated queries are
+        only simulated once.
+        '''
+
+        if self.Simulation is None:
+            raise ValueError('The query is outside the trained domain, and the surrogate model does not store the draw profile needed to simulate it')
+
+        Key = (str(Set_Temperature_Profile), str(Installation_Configuration), str(Climate_Zone).zfill(2),
+               tuple(float(Design[parameter]) for parameter in self.Parameters))
+        if Key not in self.Simulated:
+            Designs = pd.DataFrame([{parameter: Design[parameter] for parameter in self.Parameters}],
+                                   index = pd.RangeIndex(1, name = 'Design'))
+            summary = Simulate_ClimateZones(self.Simulation['Draw Profile'].copy(), dict(self.Simulation['config']),
+                                            Set_Temperature_Profile, Installation_Configuration,
+                                            self.Simulation['Case Type'], note = self.Simulation['note'],
+                                            CZs = [Climate_Zone], Designs = Designs)
+            self.Simulated[Key] = {Target: float(summary[Target].iloc[0]) for Target in self.Targets}
+
+        return dict(self.Simulated[Key])
+
+    def query(self, Set_Temperature_Profile, Installation_Configuration, Climate_Zone, Design):
+        '''
+        Estimates the KPIs of one design using the regressions if the query
+        is within the trained domain, and simulates it otherwise.
+
+        outputs:
+            A dictionary containing the KPIs, and 'Source' stating whether
+            they were estimated by the 'Surrogate' or calculated by a
+            'Simulation'. Simulated KPIs have no standard error.
+        '''
+
+        if self.in_domain(Set_Temperature_Profile, Installation_Configuration, Climate_Zone, Design):
+            Estimates = self.predict(Set_Temperature_Profile, Installation_Configuration, Climate_Zone, Design)
+            Estimates['Source'] = 'Surrogate'
+        else:
+            Estimates = self.simulate(Set_Temperature_Profile, Installation_Configuration, Climate_Zone, Design)
+            Estimates['Source'] = 'Simulation'
+
+        return Estimates
+
+    def save(self, Path):
+        '''
+        Stores the surrogate model, including the draw profile used for
+        training, so it can be loaded without training again.
+        '''
+
+        with open(Path, 'wb') as f:
+            pickle.dump(self, f)
+
+def load_surrogate_model(Path):
+    '''
+    Loads a surrogate model stored by Surrogate_Model.save.
+    '''
+
+    with open(Path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:18:11 2026
+
+This script calculates electricity bills for simulated HPWHs under time of
+use, tiered and demand charge tariffs. Many tariffs and many simulations are
+evaluated at once.
+
+Every timestep is assigned to one of 576 slots describing its month, whether
+it is a weekday or weekend, and its hour. The electricity consumption is
+summed into these slots for each billing month, and the peak demand of each
+demand window is stored as the maximum for its slot. Every tariff is then
+described by a rate for each slot, so the bills of all tariffs are calculated
+from the same sums using array operations.
+
+The sums can be updated one part of the simulation at a time using
+Bill_Accumulator, or calculated from complete results using calculate_bills.
+
+Tariffs are described by dictionaries with the following entries:
+    Fixed Charge ($/month): Optional. The fixed charge per billing month.
+    Energy Rates: A list of periods, each a dictionary containing
+        'Rate ($/kWh)' and optionally 'Months' (1-12), 'Hours' (0-23) and
+        'Days' ('All', 'Weekdays' or 'Weekends'). Periods without 'Months',
+        'Hours' or 'Days' apply to all of them. Later periods replace earlier
+        periods where they overlap, so list the base rate first.
+    Tiers: Optional. A list of consumption blocks for each billing month,
+        each a dictionary containing 'Up To (kWh)' (None for the last block)
+        and 'Rate Adder ($/kWh)', which is added to the energy rate for the
+        consumption within that block.
+    Demand Charges: Optional. A list of demand charges, each a dictionary
+        containing 'Rate ($/kW)', 'Window (min)' and optionally 'Months',
+        'Hours' and 'Days' as above. The charge is applied to the highest
+        average demand of any window starting in the stated periods during
+        the billing month.
+Holidays are treated as weekdays.
+
+The tariffs in Tariffs are illustrative examples only, showing how the common
+tariff structures are described. They are not the rates of any utility.
+
+@author: Peter Grant
+"""
+
+import numpy as np
+import pandas as pd
+
+Number_Slots = 12 * 2 * 24
+
+Tariffs = {
+           # Flat rate
+           'Example Flat': {'Fixed Charge ($/month)': 10,
+                            'Energy Rates': [{'Rate ($/kWh)': 0.25}]},
+           # 4-9P weekday peak
+           'Example TOU, 4-9P Peak': {'Fixed Charge ($/month)': 10,
+                                      'Energy Rates': [{'Rate ($/kWh)': 0.22},
+                                                       {'Rate ($/kWh)': 0.45, 'Hours': [16, 17, 18, 19, 20],
+                                                        'Days': 'Weekdays'}]},
+           # 4-9P peak in summer only, with a super off-peak period overnight
+           'Example Seasonal TOU': {'Fixed Charge ($/month)': 10,
+                                    'Energy Rates': [{'Rate ($/kWh)': 0.24},
+                                                     {'Rate ($/kWh)': 0.15, 'Hours': [0, 1, 2, 3, 4, 5]},
+                                                     {'Rate ($/kWh)': 0.52, 'Hours': [16, 17, 18, 19, 20],
+                                                      'Months': [6, 7, 8, 9]}]},
+           # Two consumption tiers
+           'Example Tiered': {'Fixed Charge ($/month)': 10,
+                              'Energy Rates': [{'Rate ($/kWh)': 0.21}],
+                              'Tiers': [{'Up To (kWh)': 300, 'Rate Adder ($/kWh)': 0},
+                                        {'Up To (kWh)': None, 'Rate Adder ($/kWh)': 0.08}]},
+           # TOU with a 15 minute on-peak demand charge
+           'Example TOU with Demand': {'Fixed Charge ($/month)': 15,
+                                       'Energy Rates': [{'Rate ($/kWh)': 0.18},
+                                                        {'Rate ($/kWh)': 0.30, 'Hours': [16, 17, 18, 19, 20],
+                                                         'Days': 'Weekdays'}],
+                                       'Demand Charges': [{'Rate ($/kW)': 12, 'Window (min)': 15,
+                                                           'Hours': [16, 17, 18, 19, 20], 'Days': 'Weekdays'}]}
+          }
+
+def get_slots(Timestamps):
+    '''
+    Returns the slot and billing month of each timestamp. The slot identifies
+    the month, weekday or weekend, and hour. The billing month is the number
+    of months since year 0.
+    '''
+
+    Timestamps = pd.DatetimeIndex(Timestamps)
+    Slots = (Timestamps.month.to_numpy() - 1) * 48 + (Timestamps.dayofweek.to_numpy() >= 5) * 24 + Timestamps.hour.to_numpy()
+    Billing_Months = Timestamps.year.to_numpy() * 12 + Timestamps.month.to_numpy() - 1
+
+    return Slots, Billing_Months
+
+def get_period_mask(Period):
+    '''
+    Returns a boolean array stating which slots are in the period described
+    by the 'Months', 'Hours' and 'Days' entries of Period.
+    '''
+
+    Months = np.isin(np.arange(1, 13), Period.get('Months', range(1, 13)))
+    Hours = np.isin(np.arange(24), Period.get('Hours', range(24)))
+    Days = {'All': [True, True], 'Weekdays': [True, False], 'Weekends': [False, True]}[Period.get('Days', 'All')]
+
+    return (Months[:, np.newaxis, np.newaxis] & np.array(Days)[np.newaxis, :, np.newaxis] & Hours).reshape(-1)
+
+def get_rates(Tariff):
+    '''
+    Returns the energy rate of a tariff in each slot, in $/kWh.
+    '''
+
+    Rates = np.full(Number_Slots, np.nan)
+    for Period in Tariff['Energy Rates']:
+        Rates[get_period_mask(Period)] = Period['Rate ($/kWh)']
+    if np.isnan(Rates).any():
+        raise ValueError('The energy rates do not cover every hour of the year')
+
+    return Rates
+
+def calculate_tier_charges(Tiers, Energy):
+    '''
+    Calculates the tier rate adders for the consumption in each billing month.
+
+    inputs:
+        Tiers: The 'Tiers' entry of a tariff.
+        Energy: An array containing the consumption in each billing month.
+
+    outputs:
+        An array containing the tier charge in each billing month.
+    '''
+
+    Charge = np.zeros_like(Energy)
+    Lower = 0
+    for Tier in Tiers:
+        Upper = np.inf if Tier['Up To (kWh)'] is None else Tier['Up To (kWh)']
+        Charge += np.clip(Energy - Lower, 0, Upper - Lower) * Tier['Rate Adder ($/kWh)']
+        Lower = Upper
+
+    return Charge
+
+class Bill_Accumulator():
+    '''
+    Accumulates the electricity consumption of one or more simulations so the
+    bills can be calculated for many tariffs. Call update with each part of
+    the simulation results, in chronological order, then calculate_bills.
+    The simulations must share the same timestamps.
+    '''
+
+    def __init__(self, Tariffs, Simulations = 1):
+        '''
+        inputs:
+            Tariffs: A dictionary of tariffs, keyed by name, in the format
+                described at the top of this script.
+            Simulations: The number of simulations, or a list of their names.
+        '''
+
+        self.Tariffs = Tariffs
+        if isinstance(Simulations, int):
+            Simulations = list(range(Simulations))
+        self.Simulations = list(Simulations)
+
+        # The consumption in each slot of each billing month
+        self.Energy = {}
+        # The peak demand of the windows starting in each slot of each billing
+        # month, for each window length used by the tariffs
+        self.Windows = sorted({Charge['Window (min)'] for Tariff in Tariffs.values()
+                               for Charge in Tariff.get('Demand Charges', [])})
+        self.Demand = {Window: {} for Window in self.Windows}
+        # The window which is still being filled, for each window length
+        self.Open_Windows = {Window: None for Window in self.Windows}
+
+    def get_month(self, Storage, Billing_Month):
+        '''
+        Returns the array for a billing month, creating it if needed.
+        '''
+
+        if Billing_Month not in Storage:
+            Storage[Billing_Month] = np.zeros((Number_Slots, len(self.Simulations)))
+
+        return Storage[Billing_Month]
+
+    def update(self, Timestamps, Electricity):
+        '''
+        Adds the electricity consumption of part of the simulation.
+
+        inputs:
+            Timestamps: The timestamps of this part of the simulation.
+            Electricity: The electricity consumed during each timestep, in
+                kWh. A 1D array for one simulation, or a 2D array with one
+                column per simulation.
+        '''
+
+        Electricity = np.asarray(Electricity, dtype = float).reshape(len(Timestamps), -1)
+        if len(Timestamps) == 0:
+            return
+        Slots, Billing_Months = get_slots(Timestamps)
+
+        # Sum the consumption of each run of timesteps in the same slot
+        Keys = Billing_Months * Number_Slots + Slots
+        Starts = np.flatnonzero(np.r_[True, Keys[1:] != Keys[:-1]])
+        Sums = np.add.reduceat(Electricity, Starts, axis = 0)
+        for Billing_Month in np.unique(Billing_Months[Starts]):
+            Runs = Billing_Months[Starts] == Billing_Month
+            np.add.at(self.get_month(self.Energy, Billing_Month), Slots[Starts][Runs], Sums[Runs])
+
+        # Sum the consumption in each demand window
+        Minutes = pd.DatetimeIndex(Timestamps).asi8 // (60 * 10**9)
+        for Window in self.Windows:
+            Window_Ids = Minutes // Window
+            Starts = np.flatnonzero(np.r_[True, Window_Ids[1:] != Window_Ids[:-1]])
+            Sums = np.add.reduceat(Electricity, Starts, axis = 0)
+            Window_Ids = Window_Ids[Starts]
+
+            Open = self.Open_Windows[Window]
+            if Open is not None:
+                if Open[0] == Window_Ids[0]:
+                    Sums[0] += Open[1]
+                else:
+                    self.add_demand(self.Demand[Window], Window, [Open[0]], Open[1][np.newaxis, :])
+            # The last window may continue in the next update
+            self.Open_Windows[Window] = (Window_Ids[-1], Sums[-1])
+            self.add_demand(self.Demand[Window], Window, Window_Ids[:-1], Sums[:-1])
+
+    def add_demand(self, Storage, Window, Window_Ids, Sums):
+        '''
+        Stores the demand of completed windows in Storage as the maximum
+        demand of the slot in which they start.
+        '''
+
+        if len(Window_Ids) == 0:
+            return
+        Starts = pd.DatetimeIndex(np.asarray(Window_Ids, dtype = np.int64) * Window * 60 * 10**9)
+        Slots, Billing_Months = get_slots(Starts)
+        Demand = Sums / (Window / 60)
+        for Billing_Month in np.unique(Billing_Months):
+            Windows = Billing_Months == Billing_Month
+            np.maximum.at(self.get_month(Storage, Billing_Month), Slots[Windows], Demand[Windows])
+
+    def calculate_bills(self, Monthly = False):
+        '''
+        Calculates the bill of every simulation under every tariff.
+
+        inputs:
+            Monthly: Set to True to return the bill of each billing month
+                instead of the total.
+
+        outputs:
+            A pd.DataFrame indexed by simulation and tariff, and billing month
+            if Monthly is True, containing the electricity consumption, the
+            energy, tier, demand and fixed charges, and the total bill.
+        '''
+
+        Billing_Months = sorted(self.Energy)
+        Energy = np.array([self.Energy[Billing_Month] for Billing_Month in Billing_Months])
+        Demand = {}
+        for Window in self.Windows:
+            # Include the window which is still being filled, without
+            # changing the stored demand
+            Storage = {Billing_Month: Values.copy() for Billing_Month, Values in self.Demand[Window].items()}
+            Open = self.Open_Windows[Window]
+            if Open is not None:
+                self.add_demand(Storage, Window, [Open[0]], Open[1][np.newaxis, :])
+            Demand[Window] = np.array([Storage.get(Billing_Month, np.zeros((Number_Slots, len(self.Simulations))))
+                                       for Billing_Month in Billing_Months])
+
+        # Energy charges for every tariff, billing month and simulation
+        Names = list(self.Tariffs)
+        Rates = np.array([get_rates(self.Tariffs[Name]) for Name in Names])
+        Energy_Charges = np.einsum('ts,msk->tmk', Rates, Energy)
+        Consumption = Energy.sum(axis = 1)
+
+        Bills = []
+        for i, Name in enumerate(Names):
+            Tariff = self.Tariffs[Name]
+            Tier_Charges = calculate_tier_charges(Tariff.get('Tiers', []), Consumption)
+            Demand_Charges = np.zeros_like(Consumption)
+            for Charge in Tariff.get('Demand Charges', []):
+                Mask = get_period_mask(Charge)
+                Demand_Charges += Demand[Charge['Window (min)']][:, Mask, :].max(axis = 1) * Charge['Rate ($/kW)']
+            Fixed_Charges = np.full_like(Consumption, Tariff.get('Fixed Charge ($/month)', 0))
+
+            for j, Simulation in enumerate(self.Simulations):
+                Bill = pd.DataFrame({'Simulation': Simulation,
+                                     'Tariff': Name,
+                                     'Billing Month': [pd.Period(year = Billing_Month // 12, month = Billing_Month % 12 + 1,
+                                                                 freq = 'M') for Billing_Month in Billing_Months],
+                                     'Electricity Consumed (kWh)': Consumption[:, j],
+                                     'Energy Charge ($)': Energy_Charges[i, :, j],
+                                     'Tier Charge ($)': Tier_Charges[:, j],
+                                     'Demand Charge ($)': Demand_Charges[:, j],
+                                     'Fixed Charge ($)': Fixed_Charges[:, j]})
+                Bills.append(Bill)
+
+        Bills = pd.concat(Bills, ignore_index = True)
+        Bills['Total Bill ($)'] = Bills[['Energy Charge ($)', 'Tier Charge ($)', 'Demand Charge ($)',
+                                         'Fixed Charge ($)']].sum(axis = 1)
+        if Monthly == True:
+            return Bills.set_index(['Simulation', 'Tariff', 'Billing Month'])
+
+        return Bills.drop(columns = 'Billing Month').groupby(['Simulation', 'Tariff'], sort = False).sum()
+
+def calculate_bills(Tariffs, Timestamps, Electricity, Monthly = False):
+    '''
+    Calculates the bills of complete simulation results for many tariffs.
+
+    inputs:
+        Tariffs: A dictionary of tariffs, keyed by name.
+        Timestamps: The timestamps of the simulation results.
+        Electricity: The electricity consumed during each timestep, in kWh.
+            Either a pd.Series or 1D array for one simulation, or a
+            pd.DataFrame or 2D array with one column per simulation.
+        Monthly: Set to True to return the bill of each billing month.
+
+    outputs:
+        A pd.DataFrame containing the bills, as returned by
+        Bill_Accumulator.calculate_bills.
+    '''
+
+    if isinstance(Electricity, pd.DataFrame):
+        Simulations = list(Electricity.columns)
+    elif isinstance(Electricity, pd.Series):
+        Simulations = [Electricity.name if Electricity.name is not None else 0]
+    else:
+        Simulations = np.asarray(Electricity).reshape(len(Timestamps), -1).shape[1]
+
+    Accumulator = Bill_Accumulator(Tariffs, Simulations)
+    Accumulator.update(Timestamps, Electricity)
+
+    return Accumulator.calculate_bills(Monthly)
+
+def calculate_bills_from_files(Paths, Tariffs, Column = 'Electricity Consumed Total (kWh)', Monthly = False):
+    '''
+    Calculates the bills of stored simulation results, such as those saved by
+    Simulate_MonitoredData.
+
+    inputs:
+        Paths: A list of paths to the stored results. Each file must be
+            indexed by timestamp.
+        Tariffs: A dictionary of tariffs, keyed by name.
+        Column: The column containing the electricity consumption in kWh.
+        Monthly: Set to True to return the bill of each billing month.
+
+    outputs:
+        A pd.DataFrame containing the bills, with the file name as the
+        simulation.
+    '''
+
+    Bills = []
+    for Path in Paths:
+        Result = pd.read_csv(Path, index_col = 0)
+        Result.index = pd.to_datetime(Result.index)
+        Electricity = Result[Column].rename(Path.replace('\\', '/').split('/')[-1])
+        Bills.append(calculate_bills(Tariffs, Result.index, Electricity, Monthly))
+
+    return pd.concat(Bills)
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:04:02 2026
+
+This script compiles a test matrix (Test_Cases.csv) into a plan of structured
+simulation cases and runs them. The free-text 'Draw Profile Source' and
+'Notes' entries are parsed once, up front, instead of inside the simulation
+loop. Cases are then grouped by the preprocessing they share (draw profile,
+climate zone, installation configuration and case type) so that each draw
+profile is read and prepared once and then fanned out to every simulation
+that needs it.
+
+The supported entries are:
+    Draw Profile Source: The draw profile name, optionally followed by
+        ' * 25%' (single dwelling, Case Type 'SF') or ' * 75%' (3 dwellings,
+        Case Type '3'). '398' is read as '3E98' because Excel converts it to
+        scientific notation.
+    Notes: 'CZ #' overwrites the inlet water and outdoor air temperatures
+        using the CBECC-Res assumptions for that climate zone. '100 gal' uses
+        a 100 gallon tank. '3516.85 W' uses the larger compressor. Notes
+        starting with 'ER' adjust the resistance element deadband with the
+        set temperature; the note is passed to Simulate_MonitoredData, which
+        applies the adjustment.
+    Installation Configuration: Optional. Overrides the installation
+        configuration used for every case.
+
+The draw profiles may also be read from an Input_Store containing the
+unprepared draw profile of each site, named by its draw profile name, instead
+of parsing a file for each group. The store is created with
+Input_Store.create_input_store and should use float64 so the monitored data
+is not rounded.
+
+@author: Peter Grant
+"""
+
+import os
+import copy
+import json
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from HPWH_Utilities import Simulate_MonitoredData, Prepare_Creekside_DrawProfile_Cached, get_draw_profile_cache_key
+from Preprocessing_Cache import hash_file, hash_dataframe, get_cache_key, in_cache
+
+# The columns of Test_Cases.csv that determine the preprocessing
+Preprocessing_Columns = ['Draw Profile Path', 'Climate Zone', 'Installation Configuration', 'Case Type']
+
+def parse_case(Simulation, Test_Case, Installation_Configuration, Draw_Profile_Path):
+    '''
+    Converts one row of the test matrix into a structured case specification.
+
+    inputs:
+        Simulation: The test number of the case.
+        Test_Case: The row of the test matrix describing the case.
+        Installation_Configuration: The installation configuration used if
+            the test matrix does not state one.
+        Draw_Profile_Path: The path to the draw profile. '{}' is replaced with
+            the draw profile name.
+
+    outputs:
+        Returns a dictionary describing the case.
+    '''
+
+    case = str(Test_Case['Draw Profile Source'])
+
+    # If the simulation is a single dwelling case
+    if ' * 25%' in case:
+        case = case[0:4].replace(' ', '')
+        Case_Type = 'SF'
+    elif ' * 75%' in case:
+        case = case[0:4].replace(' ', '')
+        Case_Type = '3'
+    else:
+        Case_Type = '4'
+
+    # To avoid issues with Excel saving 3E98 as scientific notation...
+    if case == '398':
+        case = '3E98'
+
+    note = str(Test_Case['Notes'])
+    if note.startswith('CZ'):
+        Climate_Zone = note.split(' ')[-1].zfill(2)
+    else:
+        Climate_Zone = None
+
+    if 'Installation Configuration' in Test_Case.index and not pd.isnull(Test_Case['Installation Configuration']):
+        Installation_Configuration = Test_Case['Installation Configuration']
+
+    # If this is simulating a single family case reduce the size and UA losses
+    # of the storage tank
+    if Case_Type == 'SF':
+        Volume = 170.34
+        UA = 2.8 * 0.83
+    elif Case_Type == '3':
+        Volume = 280
+        UA = 2.8
+    elif '100 gal' in note:
+        Volume = 340.69
+        UA = 2.8 * 1.112
+    else:
+        Volume = 280
+        UA = 2.8
+
+    if '3516.85 W' in note:
+        Compressor = 3516.85
+    else:
+        Compressor = 1230.9
+
+    return {'Simulation': Simulation,
+            'Case': case,
+            'Case Type': Case_Type,
+            'Set Temperature Profile': Test_Case['Set Temperature Profile'],
+            'note': note,
+            'Climate Zone': Climate_Zone,
+            'Installation Configuration': Installation_Configuration,
+            'Draw Profile Path': Draw_Profile_Path.format(case),
+            'Compressor size (W)': Compressor,
+            'Tank volume (L)': Volume,
+            'UA (W/K)': UA}
+
+def compile_test_matrix(Test_Cases, Installation_Configuration, Draw_Profile_Path):
+    '''
+    Compiles the test matrix into a plan describing every case.
+
+    inputs:
+        Test_Cases: The test matrix, indexed by test number.
+        Installation_Configuration: The installation configuration used for
+            cases which do not state one.
+        Draw_Profile_Path: The path to the draw profiles. '{}' is replaced
+            with the draw profile name of each case.
+
+    outputs:
+        Returns a pd.DataFrame with one row per case, including the 'Group'
+        each case belongs to. Cases in the same group share preprocessing.
+    '''
+
+    Plan = pd.DataFrame([parse_case(Simulation, Test_Cases.loc[Simulation], Installation_Configuration,
+                                    Draw_Profile_Path) for Simulation in Test_Cases.index])
+    Plan.index = Test_Cases.index
+    Plan['Group'] = Plan.groupby(Preprocessing_Columns, dropna = False, sort = False).ngroup()
+
+    return Plan
+
+def configure_case(config, Case):
+    '''
+    Returns a copy of the base configuration modified for the stated case.
+    '''
+
+    config = copy.deepcopy(config)
+    config['Volume Tank (L)'] = Case['Tank volume (L)']
+    config['Jacket Loss Coefficient (W/K)'] = Case['UA (W/K)']
+    config['Heat Pump Heat Addition Rate (W)'] = Case['Compressor size (W)']
+
+    return config
+
+def read_draw_profile(path, Two_Week_Sim, Time_Window = None, Draw_Profile_Store = None):
+    '''
+    Reads a draw profile, limiting it to the first two weeks of the first
+    month when testing. Time_Window optionally limits the draw profile to the
+    timestamps between a start and end time, either of which may be None.
+    If Draw_Profile_Store, an Input_Store, is provided, path is the name of
+    the draw profile in the store instead.
+    '''
+
+    if Draw_Profile_Store is not None:
+        print('Reading draw profile {} from {}'.format(path, Draw_Profile_Store.Folder))
+        Draw_Profile = pd.DataFrame(Draw_Profile_Store.get_profile(path), index = Draw_Profile_Store.Timestamps)
+    else:
+        print('Path_DrawProfile is {}'.format(path))
+        Draw_Profile = pd.read_csv(path, index_col = 0)
+        Draw_Profile.index = pd.to_datetime(Draw_Profile.index)
+    if Time_Window is not None:
+        Draw_Profile = Draw_Profile.loc[Time_Window[0]:Time_Window[1]]
+    if Two_Week_Sim == True:
+        Draw_Profile = Draw_Profile[Draw_Profile.index.month == Draw_Profile.index[0].month]
+        Draw_Profile = Draw_Profile[Draw_Profile.index.day < 15]
+
+    return Draw_Profile
+
+def get_draw_profile_source(Case, Draw_Profile_Store):
+    '''
+    Returns the path to the draw profile of a case, or its name if the draw
+    profiles are read from Draw_Profile_Store.
+    '''
+
+    return Case['Draw Profile Path'] if Draw_Profile_Store is None else Case['Case']
+
+def prepare_group(Case, config, Two_Week_Sim, Cache_Folder, Time_Window = None, Draw_Profile_Store = None):
+    '''
+    Reads and prepares the draw profile for one group of cases, storing it in
+    the preprocessing cache. The draw profile is read from
+    Draw_Profile_Store, if provided.
+
+    outputs:
+        Returns the hash identifying the draw profile in the cache.
+    '''
+
+    Draw_Profile = read_draw_profile(get_draw_profile_source(Case, Draw_Profile_Store), Two_Week_Sim, Time_Window,
+                                     Draw_Profile_Store)
+    if Draw_Profile_Store is None:
+        Key_Parts = [hash_file(Case['Draw Profile Path']), Two_Week_Sim]
+    else:
+        # The stored profile has no file of its own, so it is identified by
+        # the data read from the store
+        Key_Parts = [hash_dataframe(Draw_Profile), Two_Week_Sim]
+    if Time_Window is not None:
+        Key_Parts.append(list(Time_Window))
+    Draw_Hash = get_cache_key(*Key_Parts)
+    note = 'CZ {}'.format(Case['Climate Zone']) if Case['Climate Zone'] is not None else ''
+    Prepare_Creekside_DrawProfile_Cached(Draw_Profile, config, Case['Installation Configuration'], note,
+                                         Case['Case Type'], Cache_Folder, Draw_Hash)
+
+    return Draw_Hash
+
+def simulate_case(Case, config, Output_Folder, Simulation_Name, Reduced_Output, Cache_Folder, Draw_Hash,
+                  Tariffs = None, Emission_Factors = None, KPI_Only = False, Two_Week_Sim = False,
+                  Time_Window = None, Draw_Profile_Store = None):
+    '''
+    Simulates one case using the prepared draw profile in the cache. If the
+    prepared draw profile is not in the cache, for instance because it was
+    deleted or could not be stored, the draw profile is read from its path,
+    or Draw_Profile_Store, and prepared again. Two_Week_Sim, Time_Window and
+    Draw_Profile_Store must then match the values used by prepare_group.
+
+    outputs:
+        Returns a pd.DataFrame containing the summary row for this case.
+    '''
+
+    print('simulation number {}'.format(Case['Simulation']))
+    print('case is {}'.format(Case['Case']))
+    print('Case_Type is {}'.format(Case['Case Type']))
+    print('set temperature profile is {}'.format(Case['Set Temperature Profile']))
+    print('note is {}'.format(Case['note']))
+
+    Draw_Profile = None
+    if not in_cache(Cache_Folder, get_draw_profile_cache_key(Draw_Hash, Case['Installation Configuration'],
+                                                             Case['note'], Case['Case Type'])):
+        print('The prepared draw profile is not in the cache, reading it again')
+        Draw_Profile = read_draw_profile(get_draw_profile_source(Case, Draw_Profile_Store), Two_Week_Sim, Time_Window,
+                                         Draw_Profile_Store)
+
+    summary = pd.DataFrame(index = [Case['Simulation']])
+    summary = Simulate_MonitoredData(Draw_Profile, configure_case(config, Case), Case['Set Temperature Profile'],
+                                     Case['Installation Configuration'], output_folder = Output_Folder,
+                                     Simulation_Name = Simulation_Name, Case_Type = Case['Case Type'],
+                                     note = Case['note'], Reduced_Output = Reduced_Output, summary = summary,
+                                     simulation = Case['Simulation'], Cache_Folder = Cache_Folder,
+                                     Draw_Hash = Draw_Hash, Tariffs = Tariffs,
+                                     Emission_Factors = Emission_Factors, KPI_Only = KPI_Only)
+
+    return summary
+
+def run_plan(Plan, config, Output_Folder, Simulation_Name, Two_Week_Sim = False, Cache_Folder = None,
+             Number_Workers = None, Tariffs = None, Emission_Factors = None, Time_Window = None,
+             KPI_Only = False, Draw_Profile_Store = None):
+    '''
+    Runs every case in the plan. The draw profile of each group is prepared
+    once and stored in the preprocessing cache, then the simulations in that
+    group read the prepared draw profile from the cache. Both stages run in
+    parallel when more than one worker is available.
+
+    inputs:
+        Plan: The plan returned by compile_test_matrix.
+        config: The base configuration of the HPWH, read once.
+        Output_Folder: The folder in which to save the simulation results.
+        Simulation_Name: The base name of the output files.
+        Two_Week_Sim: Set to True to simulate only the first two weeks.
+        Cache_Folder: The folder used to store prepared draw profiles.
+            Defaults to a 'Cache' folder within Output_Folder.
+        Number_Workers: The number of processes to use. Defaults to the
+            number of cores on this computer.
+        Tariffs: A dictionary of tariffs in the format described in
+            Tariffs.py. If provided, the bill of each case under each tariff
+            is added to the summary.
+        Emission_Factors: A pd.DataFrame containing hourly emission factors,
+            as read by read_emission_factors in Emissions.py. If provided,
+            the emissions of each case under each scenario are added to the
+            summary.
+        Time_Window: Optional. The start and end times of the simulated
+            period, either of which may be None. Applied to every draw profile.
+        KPI_Only: Set to True to only return the summary, without saving the
+            results of each timestep.
+        Draw_Profile_Store: Optional. An Input_Store containing the draw
+            profile of each case, named by its draw profile name. If
+            provided, the draw profiles are read from the store instead of
+            their paths. Only the location of the store is sent to the
+            worker processes.
+
+    outputs:
+        Returns a pd.DataFrame summarizing the results of every case.
+    '''
+
+    if Cache_Folder is None:
+        Cache_Folder = os.path.join(Output_Folder, 'Cache')
+    if Number_Workers is None:
+        Number_Workers = os.cpu_count()
+    os.makedirs(os.path.join(Output_Folder, 'daily COP'), exist_ok = True)
+    os.makedirs(os.path.join(Output_Folder, 'monthly COP'), exist_ok = True)
+    Reduced_Output = not Two_Week_Sim
+
+    Leaders = Plan.drop_duplicates('Group')
+    Cases = [Plan.loc[Simulation] for Simulation in Plan.index]
+    if Two_Week_Sim == True:
+        Names = ['{}_Testing_{}.csv'.format(Simulation_Name, Simulation) for Simulation in Plan.index]
+    else:
+        Names = ['{}_Annual_{}.csv'.format(Simulation_Name, Simulation) for Simulation in Plan.index]
+    print('{} simulations sharing {} preprocessing groups'.format(len(Plan), len(Leaders)))
+
+    with ProcessPoolExecutor(max_workers = max(1, Number_Workers)) as executor:
+        Draw_Hashes = list(executor.map(prepare_group, [Leaders.loc[Simulation] for Simulation in Leaders.index],
+                                        [config] * len(Leaders), [Two_Week_Sim] * len(Leaders),
+                                        [Cache_Folder] * len(Leaders), [Time_Window] * len(Leaders),
+                                        [Draw_Profile_Store] * len(Leaders)))
+        Draw_Hashes = dict(zip(Leaders['Group'], Draw_Hashes))
+
+        Summaries = list(executor.map(simulate_case, Cases, [config] * len(Cases), [Output_Folder] * len(Cases),
+                                      Names, [Reduced_Output] * len(Cases), [Cache_Folder] * len(Cases),
+                                      [Draw_Hashes[Case['Group']] for Case in Cases], [Tariffs] * len(Cases),
+                                      [Emission_Factors] * len(Cases), [KPI_Only] * len(Cases),
+                                      [Two_Week_Sim] * len(Cases), [Time_Window] * len(Cases),
+                                      [Draw_Profile_Store] * len(Cases)))
+
+    return pd.concat(Summaries)
+
+def read_config(Path_Config):
+    '''
+    Reads the HPWH configuration file.
+    '''
+
+    print('Path_Config is {}'.format(Path_Config))
+    with open(Path_Config) as f:
+        data = f.read()
+
+    return json.loads(data)
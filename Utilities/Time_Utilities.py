@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:23:06 2026
+
+This script contains functions used to locate timestamps within the tables
+of hourly values used by several scripts, such as the 8760 hourly emission
+factors in Emissions.py and the CBECC-Res climate zone assumptions in
+CZ_Assumptions.py.
+
+@author: Peter Grant
+"""
+
+import pandas as pd
+
+def get_hour_of_year(Timestamps):
+    '''
+    Returns the hour of the year, 0-8759, of each timestamp. February 29 uses
+    the hours of February 28 so that leap years use the same 8760 hour table.
+    '''
+
+    Timestamps = pd.DatetimeIndex(Timestamps)
+    Day = Timestamps.dayofyear.to_numpy() - 1
+    Leap_Day_Passed = Timestamps.is_leap_year & (Day >= 59)
+
+    return (Day - Leap_Day_Passed) * 24 + Timestamps.hour.to_numpy()
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:37:33 2026
+
+This script validates Flexi-HPWH against the monitored data from every
+Creekside site at once. calc_rmse in HPWH_Utilities.py compares one month of
+one site using the lower thermostat only. This script simulates every month
+of every site in parallel using the same approach, and compares:
+    The upper and lower thermostat temperatures: root mean squared error and
+        bias of the node containing each thermostat.
+    The daily electricity consumption: the modelled electricity compared to
+        the daily increase of 'Power_EnergySum_kWh'.
+Errors are modelled minus measured, so a positive bias means the model
+over-predicts.
+
+Each site is prepared once using Prepare_Creekside_DrawProfile_Cached and the
+prepared data set is memory-mapped by the workers simulating each month.
+Instead of storing the time series, each month is reduced to sums (counts,
+sums of errors and sums of squared errors) as soon as it finishes. The sums
+of several months or sites are added together to calculate the metrics of
+any group, and the table of sums is saved so further metric sets can be
+calculated without simulating again.
+
+The metrics in each metric set are listed in Metric_Sets. The consolidated
+table has one row per site and month, one row per site for all months, and a
+final row for all sites.
+
+Usage:
+    python Validation.py <folder containing Creekside data> [--config <file>] [--workers N]
+
+Scripts using these functions on Windows must protect their entry point with
+if __name__ == '__main__': so the worker processes do not re-run the script.
+
+@author: Peter Grant
+"""
+
+import os
+import copy
+import glob
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from HPWH_Utilities import Prepare_Creekside_DrawProfile_Cached, Calculate_InitialTemps_Creekside, Simulate_Monitored_Period
+from Preprocessing_Cache import hash_file
+
+# The measured temperature of each thermostat
+Thermostats = {'Upper': 'T_Tank_Upper_C', 'Lower': 'T_Tank_Lower_C'}
+
+# The sums stored for each site and month
+Statistics = ['Count, Upper Thermostat', 'Sum Error, Upper Thermostat (deg C)',
+              'Sum Squared Error, Upper Thermostat (deg C2)', 'Count, Lower Thermostat',
+              'Sum Error, Lower Thermostat (deg C)', 'Sum Squared Error, Lower Thermostat (deg C2)', 'Days',
+              'Sum Error, Daily Energy (kWh)', 'Sum Absolute Error, Daily Energy (kWh)',
+              'Sum Squared Error, Daily Energy (kWh2)', 'Measured Energy (kWh)', 'Modelled Energy (kWh)']
+
+Metric_Sets = {'Thermostats': ['RMSE, Upper Thermostat (deg C)', 'Bias, Upper Thermostat (deg C)',
+                               'RMSE, Lower Thermostat (deg C)', 'Bias, Lower Thermostat (deg C)'],
+               'Daily Energy': ['RMSE, Daily Energy (kWh)', 'Mean Absolute Error, Daily Energy (kWh)',
+                                'Bias, Daily Energy (kWh)', 'Error, Total Energy (%)']}
+
+def calculate_statistics(result, Model_month, config):
+    '''
+    Reduces the simulation of one period to the sums needed to calculate the
+    error metrics.
+
+    inputs:
+        result: The model outputs returned by Simulate_Monitored_Period.
+        Model_month: The measurements returned by Simulate_Monitored_Period.
+        config: The configuration of the HPWH.
+
+    outputs:
+        A dictionary containing each entry in Statistics.
+    '''
+
+    Sums = {}
+    for Thermostat, Column in Thermostats.items():
+        Node = config['{} Thermostat Node'.format(Thermostat)]
+        Error = (result['Node Temperature {} (deg C)'.format(Node)].to_numpy(dtype = float)
+                 - Model_month[Column].to_numpy(dtype = float))
+        Error = Error[np.isfinite(Error)]
+        Sums['Count, {} Thermostat'.format(Thermostat)] = len(Error)
+        Sums['Sum Error, {} Thermostat (deg C)'.format(Thermostat)] = Error.sum()
+        Sums['Sum Squared Error, {} Thermostat (deg C2)'.format(Thermostat)] = (Error**2).sum()
+
+    # The measured energy is cumulative, starting at 0
+    Measured = np.diff(Model_month['Power_EnergySum_kWh'].to_numpy(dtype = float), prepend = 0)
+    Modelled = result['Electricity Consumed Total (kWh)'].to_numpy(dtype = float)
+    Days = pd.factorize(Model_month.index.normalize())[0]
+    Measured_Daily = np.bincount(Days, weights = Measured)
+    Modelled_Daily = np.bincount(Days, weights = Modelled)
+    Error = Modelled_Daily - Measured_Daily
+    Sums['Days'] = len(Error)
+    Sums['Sum Error, Daily Energy (kWh)'] = Error.sum()
+    Sums['Sum Absolute Error, Daily Energy (kWh)'] = np.abs(Error).sum()
+    Sums['Sum Squared Error, Daily Energy (kWh2)'] = (Error**2).sum()
+    Sums['Measured Energy (kWh)'] = Measured_Daily.sum()
+    Sums['Modelled Energy (kWh)'] = Modelled_Daily.sum()
+
+    return {Statistic: float(Sums[Statistic]) for Statistic in Statistics}
+
+def calculate_metrics(Sums, Metric_Set_Names = None):
+    '''
+    Calculates the error metrics from a table of sums. Works on the table of
+    any group of sites and months, since the sums of a group are the sums of
+    its members.
+
+    inputs:
+        Sums: A pd.DataFrame with one row per group, containing the columns in
+            Statistics.
+        Metric_Set_Names: The metric sets to calculate, from Metric_Sets.
+            Defaults to every metric set.
+
+    outputs:
+        A pd.DataFrame with one row per group and one column per metric.
+    '''
+
+    if Metric_Set_Names is None:
+        Metric_Set_Names = list(Metric_Sets)
+
+    Metrics = pd.DataFrame(index = Sums.index)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        for Thermostat in Thermostats:
+            Count = Sums['Count, {} Thermostat'.format(Thermostat)]
+            Metrics['RMSE, {} Thermostat (deg C)'.format(Thermostat)] = np.sqrt(Sums['Sum Squared Error, {} Thermostat (deg C2)'.format(Thermostat)] / Count)
+            Metrics['Bias, {} Thermostat (deg C)'.format(Thermostat)] = Sums['Sum Error, {} Thermostat (deg C)'.format(Thermostat)] / Count
+        Metrics['RMSE, Daily Energy (kWh)'] = np.sqrt(Sums['Sum Squared Error, Daily Energy (kWh2)'] / Sums['Days'])
+        Metrics['Mean Absolute Error, Daily Energy (kWh)'] = Sums['Sum Absolute Error, Daily Energy (kWh)'] / Sums['Days']
+        Metrics['Bias, Daily Energy (kWh)'] = Sums['Sum Error, Daily Energy (kWh)'] / Sums['Days']
+        Metrics['Error, Total Energy (%)'] = 100 * (Sums['Modelled Energy (kWh)'] / Sums['Measured Energy (kWh)'] - 1)
+
+    return Metrics[[Metric for Name in Metric_Set_Names for Metric in Metric_Sets[Name]]]
+
+def read_rejected(Path):
+    '''
+    Reads the days rejected from the monitored data of each site, from a file
+    with 'Site' and 'Date' columns.
+
+    outputs:
+        A dictionary containing a list of the rejected dates of each site.
+    '''
+
+    Rejected = pd.read_csv(Path)
+    Rejected['Date'] = pd.to_datetime(Rejected['Date'])
+
+    return {Site: list(Dates) for Site, Dates in Rejected.groupby('Site')['Date']}
+
+def prepare_site(Path, config, Installation_Configuration, Cache_Folder):
+    '''
+    Reads and prepares the monitored data of one site, storing it in the
+    preprocessing cache.
+
+    outputs:
+        The hash identifying the site in the cache, and the months in the data.
+    '''
+
+    Draw_Hash = hash_file(Path)
+    Draw_Profile = pd.read_csv(Path, index_col = 0)
+    Draw_Profile.index = pd.to_datetime(Draw_Profile.index)
+    Draw_Profile = Prepare_Creekside_DrawProfile_Cached(Draw_Profile, config, Installation_Configuration, '', '4',
+                                                        Cache_Folder, Draw_Hash)
+
+    return Draw_Hash, [str(Month) for Month in Draw_Profile.index.to_period('M').unique()]
+
+def validate_period(Month, config, Installation_Configuration, Cache_Folder, Draw_Hash, Rejected_Dates = ()):
+    '''
+    Simulates one month of one site from the preprocessing cache and returns
+    the sums from calculate_statistics. Called in a separate process by
+    validate_sites.
+    '''
+
+    Draw_Profile = Prepare_Creekside_DrawProfile_Cached(None, config, Installation_Configuration, '', '4',
+                                                        Cache_Folder, Draw_Hash)
+    Model = Draw_Profile[Draw_Profile.index.to_period('M') == pd.Period(Month)].copy()
+
+    config = copy.deepcopy(config)
+    config = Calculate_InitialTemps_Creekside(config, Model)
+    rejected = pd.DataFrame(index = pd.DatetimeIndex(Rejected_Dates))
+    result, Model_month = Simulate_Monitored_Period(Model, config, rejected, Number_Workers = 1)
+
+    return calculate_statistics(result, Model_month, config)
+
+def validate_sites(Sites, config, Installation_Configuration, Cache_Folder, Rejected = None, Months = None,
+                   Number_Workers = None, Metric_Set_Names = None):
+    '''
+    Validates the model against the monitored data of every site and month.
+
+    inputs:
+        Sites: A dictionary containing the path to the Creekside data of each
+            site.
+        config: The configuration of the HPWH.
+        Installation_Configuration: The installation configuration of the
+            monitored HPWHs.
+        Cache_Folder: The folder used to store the prepared data sets.
+        Rejected: Optional. A dictionary containing a list of the dates
+            rejected from the monitored data of each site. The model is
+            re-initialized on the day after each rejected day.
+        Months: Optional. The months to validate, e.g. ['2020-10']. Defaults
+            to every month in the data.
+        Number_Workers: The number of processes to use. Defaults to the
+            number of cores on this computer.
+        Metric_Set_Names: The metric sets in the table, from Metric_Sets.
+            Defaults to every metric set.
+
+    outputs:
+        Table: A pd.DataFrame indexed by site and month containing the
+            metrics. Rows with a month of 'All' combine every month of the
+            site, and the row with a site of 'All' combines every site.
+        Sums: A pd.DataFrame containing the sums of each site and month. Use
+            calculate_metrics to calculate other metric sets from them.
+    '''
+
+    if Rejected is None:
+        Rejected = {}
+    if Number_Workers is None:
+        Number_Workers = os.cpu_count()
+    Number_Workers = max(1, Number_Workers)
+
+    Sums = {}
+    with ProcessPoolExecutor(max_workers = Number_Workers) as executor:
+        Prepared = dict(zip(Sites, executor.map(prepare_site, Sites.values(), [config] * len(Sites),
+                                                [Installation_Configuration] * len(Sites),
+                                                [Cache_Folder] * len(Sites))))
+
+        Futures = {}
+        for Site, (Draw_Hash, Site_Months) in Prepared.items():
+            for Month in Site_Months:
+                if Months is None or Month in Months:
+                    Future = executor.submit(validate_period, Month, config, Installation_Configuration, Cache_Folder,
+                                             Draw_Hash, Rejected.get(Site, ()))
+                    Futures[Future] = (Site, Month)
+        print('Validating {} months of {} sites using {} workers'.format(len(Futures), len(Sites), Number_Workers))
+
+        # Store the sums of each month as it finishes
+        for Future in as_completed(Futures):
+            Site, Month = Futures[Future]
+            Sums[(Site, Month)] = Future.result()
+            print('Validated {} {}'.format(Site, Month))
+
+    Sums = pd.DataFrame.from_dict(Sums, orient = 'index')[Statistics].sort_index()
+    Sums.index = pd.MultiIndex.from_tuples(Sums.index, names = ['Site', 'Month'])
+
+    Site_Sums = Sums.groupby(level = 'Site').sum()
+    Site_Sums.index = pd.MultiIndex.from_tuples([(Site, 'All') for Site in Site_Sums.index], names = ['Site', 'Month'])
+    Total = pd.DataFrame([Sums.sum()], index = pd.MultiIndex.from_tuples([('All', 'All')], names = ['Site', 'Month']))
+    Groups = pd.concat([Sums, Site_Sums]).sort_index()
+    Groups = pd.concat([Groups, Total])
+
+    Table = calculate_metrics(Groups, Metric_Set_Names)
+    Table.insert(0, 'Days', Groups['Days'].astype(int))
+
+    return Table, Sums
+
+if __name__ == '__main__':
+    Parser = argparse.ArgumentParser(description = 'Validate Flexi-HPWH against every Creekside site')
+    Parser.add_argument('folder', help = 'The folder containing the Creekside data files')
+    Parser.add_argument('--pattern', default = 'Creekside Data for *.csv',
+                        help = "The pattern matching the data files. The site is the text matching '*'")
+    Parser.add_argument('--config', default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                           'Rheem_PROPH80_Config.txt'))
+    Parser.add_argument('--installation', default = 'Ducted_Exhaust')
+    Parser.add_argument('--rejected', default = None, help = "A file listing rejected days, with 'Site' and 'Date' columns")
+    Parser.add_argument('--months', nargs = '*', default = None, help = 'The months to validate, e.g. 2020-10')
+    Parser.add_argument('--workers', type = int, default = None)
+    Parser.add_argument('--output', default = 'Validation.csv', help = 'The file in which to save the table')
+    Arguments = Parser.parse_args()
+
+    Prefix, Suffix = Arguments.pattern.split('*')
+    Sites = {os.path.basename(Path)[len(Prefix):len(os.path.basename(Path)) - len(Suffix)]: Path
+             for Path in sorted(glob.glob(os.path.join(Arguments.folder, Arguments.pattern)))}
+    with open(Arguments.config) as f:
+        config = json.load(f)
+    Rejected = read_rejected(Arguments.rejected) if Arguments.rejected is not None else None
+    Cache_Folder = os.path.join(os.path.dirname(os.path.abspath(Arguments.output)), 'Cache')
+
+    Table, Sums = validate_sites(Sites, config, Arguments.installation, Cache_Folder, Rejected, Arguments.months,
+                                 Arguments.workers)
+    Table.to_csv(Arguments.output)
+    Sums.to_csv(os.path.splitext(Arguments.output)[0] + '_Sums.csv')
+    print(Table)
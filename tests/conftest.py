@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:05:19 2026
+
+Makes the model and the scripts in Utilities importable by the tests, the
+same way the scripts import each other.
+
+@author: Peter Grant
+"""
+
+import os
+import sys
+
+Root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(Root, 'Utilities'))
+sys.path.insert(0, Root)
+
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+from Prepare_Inputs import Prepare_Inputs
+
+@pytest.fixture
+def config():
+    '''
+    The Rheem PROPH80 configuration, starting with the tank at the set
+    temperature.
+    '''
+
+    with open(os.path.join(Root, 'Rheem_PROPH80_Config.txt')) as f:
+        config = json.load(f)
+    config['Node Temperatures (deg C)'] = [51.7] * config['Number of Nodes']
+
+    return config
+
+def create_inputs(config, Days = 2, Timestep = 1, Draw_Scale = 1, Seed = 0):
+    '''
+    Creates a prepared input data set with random draws, a load shifting set
+    temperature schedule and varying air temperatures.
+
+    outputs:
+        The numpy array of inputs, with the column index stored in config.
+    '''
+
+    Generator = np.random.default_rng(Seed)
+    Index = pd.date_range('2020-10-01', periods = int(Days * 24 * 60 / Timestep), freq = '{}min'.format(Timestep))
+    Rows = np.arange(len(Index))
+    Input_Data = pd.DataFrame(index = Index)
+    Input_Data['Set Temperature, Heat Pump (deg C)'] = np.where((Index.hour >= 8) & (Index.hour < 16), 56.1, 51.6)
+    Input_Data['Set Temperature, Resistance (deg C)'] = Input_Data['Set Temperature, Heat Pump (deg C)']
+    Input_Data['Timestep (min)'] = float(Timestep)
+    Input_Data['Ambient Temperature (deg C)'] = 18 + 5 * np.sin(Rows * Timestep / 500)
+    Input_Data['Evaporator Air Inlet Temperature (deg C)'] = Input_Data['Ambient Temperature (deg C)'] - 4
+    Input_Data['Inlet Water Temperature (deg C)'] = 15.0
+    Input_Data['Hot Water Draw Volume (L)'] = np.where(Generator.random(len(Index)) < 0.05,
+                                                       Generator.random(len(Index)) * 8 * Draw_Scale, 0) * Timestep
+    input_data, config, col_index = Prepare_Inputs(Input_Data, config)
+
+    return input_data
+
+@pytest.fixture
+def make_inputs():
+    return create_inputs
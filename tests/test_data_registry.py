@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:17:43 2026
+
+Tests reading the bundled reference data through the registry and its cache.
+
+@author: Peter Grant
+"""
+
+import os
+import pandas as pd
+import pytest
+
+import Data_Registry
+
+@pytest.fixture
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(Data_Registry, 'Cache_Folder', str(tmp_path))
+    Data_Registry.clear_cache()
+    yield str(tmp_path)
+    Data_Registry.clear_cache()
+
+@pytest.mark.parametrize('Name', ['Closet Temperature Differences', 'Creekside Water Temperatures', 'CBECC-Res CZ03'])
+def test_round_trip(cache_folder, monkeypatch, Name):
+    Settings = Data_Registry.Datasets[Name]
+    Expected = pd.read_csv(Data_Registry.get_path(Name), index_col = Settings.get('Index Column'),
+                           skiprows = Settings.get('Skip Rows', 0))
+
+    Parsed = Data_Registry.load_dataset(Name)
+    assert len(os.listdir(cache_folder)) == 1
+
+    # Later processes read the cached arrays instead of the CSV file
+    Data_Registry.clear_cache()
+    def parse_dataset(Name, Path):
+        raise AssertionError('The data set was parsed again')
+    monkeypatch.setattr(Data_Registry, 'parse_dataset', parse_dataset)
+    Cached = Data_Registry.load_dataset(Name)
+
+    pd.testing.assert_frame_equal(Cached, Parsed)
+    pd.testing.assert_frame_equal(Cached, Expected, check_dtype = False, check_index_type = False)
+
+def test_unknown_dataset(cache_folder):
+    with pytest.raises(KeyError):
+        Data_Registry.load_dataset('Unknown')
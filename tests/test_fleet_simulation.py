@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:26:31 2026
+
+Tests the bills accumulated while simulating a fleet.
+
+@author: Peter Grant
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Fleet_Simulation
+from Fleet_Simulation import read_profile, simulate_fleet
+from HPWH_Model import HPWH_MultipleNodes_Batch
+from Tariffs import Tariffs, calculate_bills
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+def test_fleet_bills_match_complete_results(config, make_inputs, monkeypatch):
+    input_data = make_inputs(config, Days = 2, Timestep = 5)
+    Profile = read_profile(input_data, config)
+    Timestamps = pd.date_range('2020-10-31', periods = len(input_data), freq = '5min')
+    Fleet = pd.DataFrame({'Profile': ['Site', 'Site'], 'Draw Scale': [1, 1.5]})
+    # Update the bills part way through the demand windows and billing months
+    monkeypatch.setattr(Fleet_Simulation, 'Bill_Update_Length', 7)
+    Load_Shape, KPI_Distribution, Unit_KPIs = simulate_fleet(config, {'Site': Profile}, Fleet, Timestamps, Number_Workers = 1,
+                                                             dtype = np.float64, Unit_KPIs = True, Tariffs = Tariffs)
+
+    Inputs = {column: values.copy() for column, values in Profile.items()}
+    Inputs['Hot Water Draw Volume (L)'] = np.column_stack([Inputs['Hot Water Draw Volume (L)'] * Scale for Scale in Fleet['Draw Scale']])
+    Electricity = HPWH_MultipleNodes_Batch(config, 2, dtype = np.float64).simulate(Inputs)['Electricity Consumed Total (kWh)']
+    Bills = calculate_bills(Tariffs, Timestamps, Electricity)['Total Bill ($)'].unstack('Tariff')
+    for Tariff in Tariffs:
+        np.testing.assert_allclose(Unit_KPIs['Bill, {} ($)'.format(Tariff)], Bills[Tariff], atol = 1e-9)
+    assert 'Bill, Example Flat ($)' in KPI_Distribution.index
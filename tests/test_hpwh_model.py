@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:17:43 2026
+
+Regression tests of the multi-node models.
+
+@author: Peter Grant
+"""
+
+import copy
+import numpy as np
+import pytest
+
+from HPWH_Model import (HPWH_MultipleNodes, HPWH_MultipleNodes_Batch, HPWH_Plant, Performance_Map, Model_Inputs,
+                        plug_flow_advection, SpecificHeat_Water, Density_Water)
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+def simulate(config, input_data):
+    HPWH = HPWH_MultipleNodes(copy.deepcopy(config))
+    input_data = input_data.copy()
+    for row in range(len(input_data)):
+        input_data[row] = HPWH.calculate_timestep(input_data[row])
+
+    return input_data
+
+def get_column(config, input_data, column):
+    if column == 'Node Temperatures (deg C)':
+        return np.array(list(input_data[:, config['Column Index'][column]]), dtype = float)
+
+    return input_data[:, config['Column Index'][column]].astype(float)
+
+def get_batch_inputs(config, input_data):
+    return {column: get_column(config, input_data, column) for column in Model_Inputs if column in config['Column Index']}
+
+def get_energy_balance(Outputs):
+    '''
+    Returns the heat added plus the jacket losses and the energy withdrawn,
+    which are negative, minus the change in stored energy. This is 0 if
+    energy is conserved.
+    '''
+
+    return (np.sum(Outputs['Total Heat Added (kWh)']) + np.sum(Outputs['Total Jacket Losses (kWh)'])
+            + np.sum(Outputs['Total Energy Withdrawn (kWh)']) - np.sum(Outputs['Total Energy Change (kWh)']))
+
+@pytest.mark.parametrize('Draw_Advection', ['Implicit', 'Plug Flow'])
+def test_operator_split_conserves_energy(config, make_inputs, Draw_Advection):
+    # 5 minute timesteps with large draws, which are unstable with the
+    # explicit scheme
+    config.update({'Integration Scheme': 'Operator Split', 'Draw Advection': Draw_Advection})
+    input_data = make_inputs(config, Timestep = 5, Draw_Scale = 2)
+    Outputs = simulate(config, input_data)
+    Columns = ['Total Heat Added (kWh)', 'Total Jacket Losses (kWh)', 'Total Energy Withdrawn (kWh)',
+               'Total Energy Change (kWh)']
+    Balance = get_energy_balance({column: get_column(config, Outputs, column) for column in Columns})
+
+    Node_Temperatures = get_column(config, Outputs, 'Node Temperatures (deg C)')
+    ThermalMass_Tank = config['Volume Tank (L)'] * Density_Water * SpecificHeat_Water / 3600 / 1000
+    Stored = ThermalMass_Tank * (Node_Temperatures[-1].mean() - np.mean(config['Node Temperatures (deg C)']))
+
+    assert np.all(Node_Temperatures > 14.9) and np.all(Node_Temperatures < 100)
+    assert abs(Balance) < 1e-6
+    assert np.sum(get_column(config, Outputs, 'Total Energy Change (kWh)')) == pytest.approx(Stored, abs = 1e-6)
+
+def test_plug_flow_advection_conserves_energy():
+    Node_Temperatures = np.array([20., 30, 40, 50, 60])
+    Volume_Node = 10
+    T_Water_In = 12.5
+
+    # Shifting by exactly one node moves every temperature up one node
+    np.testing.assert_allclose(plug_flow_advection(Node_Temperatures, 10, Volume_Node, T_Water_In), [12.5, 20, 30, 40, 50])
+    np.testing.assert_array_equal(plug_flow_advection(Node_Temperatures, 0, Volume_Node, T_Water_In), Node_Temperatures)
+
+    # Compare to moving the water up in 1000 sub-nodes per node, for which
+    # the draws are a whole number of sub-nodes
+    for Volume_Drawn in [3.7, 13, 41, 100]:
+        New = plug_flow_advection(Node_Temperatures, Volume_Drawn, Volume_Node, T_Water_In)
+        Shift = int(round(Volume_Drawn / Volume_Node * 1000))
+        Sub_Nodes = np.concatenate([np.full(Shift, T_Water_In), np.repeat(Node_Temperatures, 1000)])[:len(Node_Temperatures) * 1000]
+        np.testing.assert_allclose(New, Sub_Nodes.reshape(len(Node_Temperatures), 1000).mean(axis = 1))
+
+        # The energy entering the tank minus the energy leaving it
+        Leaving = np.concatenate([np.full(Shift, T_Water_In), Node_Temperatures.repeat(1000)])[::-1][:Shift].sum() * Volume_Node / 1000
+        Change = (New.sum() - Node_Temperatures.sum()) * Volume_Node
+        assert Change == pytest.approx(Volume_Drawn * T_Water_In - Leaving)
+
+    # Several tanks at once match each tank on its own
+    Tanks = np.array([Node_Temperatures, Node_Temperatures[::-1], Node_Temperatures + 1])
+    Volumes = np.array([5, 10, 0])
+    Inlets = np.array([10, 12, 14])
+    Batch = plug_flow_advection(Tanks, Volumes, Volume_Node, Inlets)
+    for tank in range(len(Tanks)):
+        np.testing.assert_allclose(Batch[tank], plug_flow_advection(Tanks[tank], Volumes[tank], Volume_Node, Inlets[tank]))
+
+    # Well mixed parts of the tank keep their temperature exactly, for one
+    # tank or many
+    New = plug_flow_advection(np.full((2, 50), 51.7), [2.3, 0], 2.8, [15, 15])
+    assert np.all(New[0, 1:] == 51.7) and np.all(New[1] == 51.7)
+
+def test_adaptive_stratification_conserves_energy(config, make_inputs):
+    config['Adaptive Stratification Tolerance (deg C)'] = 0.5
+    input_data = make_inputs(config)
+    Outputs = simulate(config, input_data)
+    Columns = ['Total Heat Added (kWh)', 'Total Jacket Losses (kWh)', 'Total Energy Withdrawn (kWh)',
+               'Total Energy Change (kWh)']
+    Balance = get_energy_balance({column: get_column(config, Outputs, column) for column in Columns})
+
+    Node_Temperatures = get_column(config, Outputs, 'Node Temperatures (deg C)')
+    ThermalMass_Tank = config['Volume Tank (L)'] * Density_Water * SpecificHeat_Water / 3600 / 1000
+    Stored = ThermalMass_Tank * (Node_Temperatures[-1].mean() - np.mean(config['Node Temperatures (deg C)']))
+
+    assert abs(Balance) < 1e-6
+    assert np.sum(get_column(config, Outputs, 'Total Energy Change (kWh)')) == pytest.approx(Stored, abs = 1e-6)
+
+def test_adaptive_stratification_matches_nodes_at_zero_tolerance(config, make_inputs):
+    input_data = make_inputs(config)
+    Nodes = simulate(config, input_data)
+    config['Adaptive Stratification Tolerance (deg C)'] = 0
+    Layers = simulate(config, input_data)
+
+    for column in ['Node Temperatures (deg C)', 'Energy Withdrawn (kWh)', 'Node Energy Change (kWh)']:
+        np.testing.assert_allclose(np.array(list(Layers[:, config['Column Index'][column]]), dtype = float),
+                                   np.array(list(Nodes[:, config['Column Index'][column]]), dtype = float),
+                                   rtol = 1e-9, atol = 1e-9)
+    for column in ['Electricity Consumed Total (kWh)', 'Total Heat Added (kWh)', 'Total Energy Withdrawn (kWh)']:
+        np.testing.assert_allclose(get_column(config, Layers, column), get_column(config, Nodes, column),
+                                   rtol = 1e-9, atol = 1e-9)
+
+def test_batch_matches_scalar(config, make_inputs):
+    input_data = make_inputs(config)
+    Scalar = simulate(config, input_data)
+    Batch = HPWH_MultipleNodes_Batch(config, 1).simulate(get_batch_inputs(config, input_data))
+
+    for column in ['Electricity Consumed Total (kWh)', 'Total Heat Added Heat Pump (kWh)',
+                   'Total Heat Added Backup (kWh)', 'Total Energy Withdrawn (kWh)']:
+        np.testing.assert_allclose(Batch[column][:, 0], get_column(config, Scalar, column), atol = 1e-9)
+    Batch_Model = HPWH_MultipleNodes_Batch(config, 1)
+    Batch_Model.simulate(get_batch_inputs(config, input_data), Outputs = [])
+    np.testing.assert_allclose(Batch_Model.Node_Temperatures[0], get_column(config, Scalar, 'Node Temperatures (deg C)')[-1],
+                               atol = 1e-9)
+
+@pytest.mark.parametrize('Interaction', [False, True])
+def test_performance_map_matches_regression(config, Interaction):
+    Coefficients = config['Heat Rate Coefficients']
+    Map = Performance_Map(Coefficients = Coefficients, Interaction = Interaction)
+
+    Generator = np.random.default_rng(0)
+    T_Water = Generator.uniform(10, 65, 1000)
+    T_Air = Generator.uniform(-10, 40, 1000)
+    c = Coefficients
+    Expected = c[0] + c[1] * T_Water + c[2] * T_Air + c[3] * T_Water ** 2 + c[4] * T_Air ** 2
+    if Interaction:
+        Expected = Expected + c[5] * T_Water * T_Air
+
+    np.testing.assert_allclose(Map.evaluate(T_Water, T_Air), Expected, rtol = 1e-5)
+    assert Map.evaluate_scalar(T_Water[0], T_Air[0]) == pytest.approx(Expected[0], rel = 1e-5)
+
+def test_plant_with_one_tank_matches_batch(config, make_inputs):
+    Inputs = get_batch_inputs(config, make_inputs(config, Draw_Scale = 3))
+    Batch = HPWH_MultipleNodes_Batch(config, 1).simulate(Inputs)
+    Plant = HPWH_Plant(config, 1).simulate(Inputs)
+
+    for column in ['Electricity Consumed Total (kWh)', 'Total Energy Withdrawn (kWh)', 'Total Heat Added (kWh)']:
+        np.testing.assert_allclose(Plant[column], Batch[column][:, 0], atol = 1e-9)
+
+def test_parallel_tanks_match_one_tank_at_half_the_draw(config, make_inputs):
+    Inputs = get_batch_inputs(config, make_inputs(config, Draw_Scale = 3))
+    Half = dict(Inputs, **{'Hot Water Draw Volume (L)': Inputs['Hot Water Draw Volume (L)'] / 2})
+    Batch = HPWH_MultipleNodes_Batch(config, 1).simulate(Half)
+    Plant = HPWH_Plant(config, 2).simulate(Inputs)
+
+    for column in ['Electricity Consumed Total (kWh)', 'Total Energy Withdrawn (kWh)']:
+        np.testing.assert_allclose(Plant[column], 2 * Batch[column][:, 0], atol = 1e-9)
+    for Arrangement in ['Parallel', 'Series']:
+        assert abs(get_energy_balance(HPWH_Plant(config, 3, Arrangement).simulate(Inputs))) < 1e-6
+
+def test_state_of_charge_is_nan_without_usable_energy(config, make_inputs):
+    # The set temperature equals the delivery temperature, as when simulating
+    # a 48.9 deg C (120 deg F) set temperature with the mixing valve
+    input_data = make_inputs(config)
+    config.update({'Set Temperature, Heat Pump (deg C)': 48.9, 'Set Temperature, Resistance (deg C)': 48.9,
+                   'State of Charge Delivery Temperature (deg C)': 48.9})
+    Outputs = simulate(config, input_data)
+    assert np.all(np.isnan(get_column(config, Outputs, 'State of Charge (%)')))
+    assert np.all(np.isfinite(get_column(config, Outputs, 'Electricity Consumed Total (kWh)')))
+
+    # The maximum temperature of each HPWH defaults to its own set temperature
+    Parameters = {'Set Temperature, Heat Pump (deg C)': [48.9, 55], 'Set Temperature, Resistance (deg C)': [48.9, 55]}
+    Batch = HPWH_MultipleNodes_Batch(config, 2, Parameters).simulate(get_batch_inputs(config, input_data))
+    assert np.all(np.isnan(Batch['State of Charge (%)'][:, 0]))
+    assert np.all(np.isfinite(Batch['State of Charge (%)'][:, 1])) and Batch['State of Charge (%)'][0, 1] > 0
+
+def test_occupant_behavior_starts_at_first_timestamp(config, make_inputs):
+    input_data = make_inputs(config, Days = 3, Timestep = 15)
+    config['Occupant Behavior Window (days)'] = 2
+    Timestamps = np.datetime64('2020-10-01T06:00') + np.arange(len(input_data)) * np.timedelta64(15, 'm')
+    Timestamped_Config = copy.deepcopy(config)
+    Timestamped_Config['Column Index']['Timestamp'] = input_data.shape[1]
+    config['Start Time (hr)'] = 6
+
+    Models = []
+    for Config, Data in [(config, input_data), (Timestamped_Config, np.column_stack([input_data, Timestamps.astype(object)]))]:
+        HPWH = HPWH_MultipleNodes(copy.deepcopy(Config))
+        for row in range(len(Data)):
+            HPWH.calculate_timestep(Data[row])
+        Models.append(HPWH.Occupant_Behavior)
+
+    assert Models[1].Days_Learned == Models[0].Days_Learned == 3
+    np.testing.assert_allclose(Models[1].History, Models[0].History)
+
+def test_unused_interaction_term_warns_once(config, make_inputs, monkeypatch):
+    import warnings
+    import HPWH_Model
+    make_inputs(config)
+    monkeypatch.setattr(HPWH_Model, 'Performance_Maps', {})
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        HPWH_MultipleNodes(copy.deepcopy(config))
+
+    del config['Performance Map Interaction Term']
+    monkeypatch.setattr(HPWH_Model, 'Performance_Maps', {})
+    with pytest.warns(UserWarning, match = 'Heat Rate Coefficients') as Record:
+        for i in range(3):
+            HPWH_MultipleNodes(copy.deepcopy(config))
+            HPWH_MultipleNodes_Batch(config, 2)
+    assert len(Record) == 1
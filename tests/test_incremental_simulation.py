@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:39:43 2026
+
+Tests re-using stored runs: re-simulating from the last checkpoint before a
+change matches simulating the whole period again.
+
+@author: Peter Grant
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+
+from HPWH_Model import HPWH_MultipleNodes, Model_Outputs
+from Incremental_Simulation import simulate_incremental
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+def simulate(config, input_data):
+    HPWH = HPWH_MultipleNodes(copy.deepcopy(config))
+    input_data = input_data.copy()
+    for row in range(len(input_data)):
+        input_data[row] = HPWH.calculate_timestep(input_data[row])
+
+    return input_data
+
+def assert_outputs_equal(config, Outputs, Expected):
+    for column in Model_Outputs:
+        if column in config['Column Index']:
+            index = config['Column Index'][column]
+            np.testing.assert_array_equal(np.array(list(Outputs[:, index]), dtype = float),
+                                          np.array(list(Expected[:, index]), dtype = float), err_msg = column)
+
+def add_timestamps(config, input_data, Start):
+    config['Column Index']['Timestamp'] = input_data.shape[1]
+    Timestamps = pd.date_range(Start, periods = len(input_data), freq = '1min')
+
+    return np.column_stack([input_data, Timestamps.to_numpy(dtype = object)])
+
+def test_edited_afternoon_matches_full_run(config, make_inputs, tmp_path, capsys):
+    config['Occupant Behavior Window (days)'] = 1
+    input_data = make_inputs(config)
+    simulate_incremental(config, input_data.copy(), str(tmp_path), Checkpoint_Interval = 60)
+
+    # Load up from 1 PM to 5 PM on the second day
+    Edited = input_data.copy()
+    Afternoon = slice(1440 + 13 * 60, 1440 + 17 * 60)
+    for column in ['Set Temperature, Heat Pump (deg C)', 'Set Temperature, Resistance (deg C)']:
+        Edited[Afternoon, config['Column Index'][column]] = 60.0
+    capsys.readouterr()
+    Outputs = simulate_incremental(config, Edited.copy(), str(tmp_path), Checkpoint_Interval = 60)
+
+    assert 'Re-using {} of {}'.format(Afternoon.start, len(input_data)) in capsys.readouterr().out
+    assert_outputs_equal(config, Outputs, simulate(config, Edited))
+
+def test_start_time_is_compared_with_occupant_behavior(config, make_inputs, tmp_path, capsys):
+    config['Occupant Behavior Window (days)'] = 1
+    input_data = make_inputs(config)
+    Morning = add_timestamps(config, input_data, '2020-10-01 06:00')
+    Midnight = add_timestamps(config, input_data, '2020-10-01 00:00')
+    simulate_incremental(config, Morning.copy(), str(tmp_path))
+
+    capsys.readouterr()
+    Outputs = simulate_incremental(config, Midnight.copy(), str(tmp_path))
+    assert 'Re-using 0 of' in capsys.readouterr().out
+    assert_outputs_equal(config, Outputs, simulate(config, Midnight))
+
+    # The same start time re-uses the whole run
+    simulate_incremental(config, Midnight.copy(), str(tmp_path))
+    assert 'Re-using {} of'.format(len(input_data)) in capsys.readouterr().out
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:38:47 2026
+
+Tests the job queue: the order jobs are claimed in, cancellation, returning
+jobs whose lease expired, and the HTTP endpoint.
+
+@author: Peter Grant
+"""
+
+import os
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from http.server import ThreadingHTTPServer
+
+from Job_Service import Job_Queue, HTTP_Job_Queue, make_handler
+
+def expire_lease(Queue, Id):
+    Path = os.path.join(Queue.Folder, 'running', '{}.json'.format(Id))
+    Expired = time.time() - 2 * Queue.Lease_Duration
+    os.utime(Path, (Expired, Expired))
+
+@pytest.fixture
+def queue(tmp_path):
+    return Job_Queue(str(tmp_path / 'Queue'))
+
+@pytest.fixture
+def http_queue(queue):
+    Server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(queue))
+    Thread = threading.Thread(target = Server.serve_forever, daemon = True)
+    Thread.start()
+    yield HTTP_Job_Queue('http://127.0.0.1:{}'.format(Server.server_address[1]))
+    Server.shutdown()
+    Server.server_close()
+
+def test_claim_order(queue):
+    Low = queue.submit('HPWH_MultipleNodes', {}, Priority = 1)
+    First = queue.submit('HPWH_MultipleNodes', {}, Priority = 5)
+    Second = queue.submit('HPWH_MultipleNodes', {}, Priority = 5)
+
+    assert [queue.claim('A')['Id'] for i in range(3)] == [First, Second, Low]
+    assert queue.claim('A') is None
+    Job = queue.get_status(First)
+    assert Job['Status'] == 'running' and Job['Worker'] == 'A' and Job['Attempts'] == 1
+
+def test_cancel(queue):
+    Pending = queue.submit('HPWH_MultipleNodes', {})
+    assert queue.cancel(Pending) == 'cancelled'
+    assert queue.get_status(Pending)['Status'] == 'cancelled'
+
+    Running = queue.submit('HPWH_MultipleNodes', {})
+    Job = queue.claim('A')
+    assert queue.cancel(Running) == 'running'
+    assert queue.cancel_requested(Running)
+    assert queue.finish(Job, 'cancelled')
+    assert queue.get_status(Running)['Status'] == 'cancelled'
+    assert not queue.cancel_requested(Running)
+
+def test_requeued_job_belongs_to_new_worker(queue):
+    Id = queue.submit('HPWH_MultipleNodes', {})
+    Stalled = queue.claim('A')
+    assert queue.renew_lease(Stalled)
+
+    # A stops renewing its lease, so B claims the job again
+    expire_lease(queue, Id)
+    assert queue.requeue_expired() == [Id]
+    assert queue.get_status(Id)['Status'] == 'pending'
+    Job = queue.claim('B')
+    assert Job['Id'] == Id and Job['Attempts'] == 2
+
+    # The job file is back under the same name, but A lost its lease
+    assert not queue.renew_lease(Stalled)
+    assert not queue.finish(Stalled, 'done')
+    assert queue.get_status(Id)['Status'] == 'running'
+    assert queue.renew_lease(Job)
+    assert queue.finish(Job, 'done')
+    assert queue.get_status(Id)['Status'] == 'done'
+
+def test_same_worker_name_loses_lease(queue):
+    Id = queue.submit('HPWH_MultipleNodes', {})
+    Stalled = queue.claim('A')
+    expire_lease(queue, Id)
+    Job = queue.claim('A')
+
+    assert not queue.renew_lease(Stalled)
+    assert queue.renew_lease(Job)
+
+def test_http_endpoint(queue, http_queue):
+    Id = http_queue.submit('HPWH_MultipleNodes', {'Input Id': '0123456789ab'}, Priority = 3)
+    assert [Job['Id'] for Job in http_queue.list_jobs()] == [Id]
+
+    Job = http_queue.claim('A')
+    assert Job['Id'] == Id and Job['Arguments'] == {'Input Id': '0123456789ab'}
+    assert http_queue.renew_lease(Job)
+    assert not http_queue.renew_lease(dict(Job, Worker = 'B'))
+    assert http_queue.cancel(Id) == 'running'
+    assert http_queue.cancel_requested(Id)
+
+    http_queue.put_file(Id, 'folder/result.json', json.dumps({'Value': 1}).encode())
+    with open(http_queue.get_result(Id, 'folder/result.json')) as f:
+        assert json.load(f) == {'Value': 1}
+    assert http_queue.finish(Job, 'cancelled')
+    assert http_queue.get_status(Id)['Status'] == 'cancelled'
+    assert queue.get_status(Id)['Status'] == 'cancelled'
+
+    # Ids and file names are checked by the client and the server
+    with pytest.raises(ValueError):
+        http_queue.get_status('..')
+    for Path in ['/jobs/..', '/jobs/{}/files/..%2F..%2Fpending'.format(Id), '/unknown']:
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(http_queue.Url + Path)
+
+def test_http_finish_after_lost_lease(queue, http_queue, tmp_path):
+    Id = http_queue.submit('HPWH_MultipleNodes', {})
+    Stalled = http_queue.claim('A')
+    expire_lease(queue, Id)
+    Job = http_queue.claim('B')
+
+    Output_Folder = tmp_path / 'Output'
+    Output_Folder.mkdir()
+    (Output_Folder / 'outputs.npz').write_bytes(b'A')
+    assert not http_queue.finish(Stalled, 'done', str(Output_Folder))
+    assert not os.path.exists(queue.get_result_path(Id, 'outputs.npz'))
+    assert http_queue.finish(Job, 'done')
+    assert queue.get_status(Id)['Status'] == 'done'
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:17:43 2026
+
+Tests simulating re-initialized segments and windows of a simulation in
+parallel.
+
+@author: Peter Grant
+"""
+
+import copy
+import numpy as np
+import pytest
+
+from HPWH_Model import HPWH_MultipleNodes
+from Parallel_Simulation import split_segments, simulate_segments, simulate_warmup_windows
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+def get_node_temperatures(config, input_data):
+    return np.array(list(input_data[:, config['Column Index']['Node Temperatures (deg C)']]), dtype = float)
+
+@pytest.mark.parametrize('Number_Workers', [1, 3])
+def test_segments_carry_control_state(config, make_inputs, Number_Workers):
+    input_data = make_inputs(config, Days = 3)
+    Reinitialization_Rows = [1440 + 7, 2 * 1440 + 300]
+    Initial_Node_Temperatures = [config['Node Temperatures (deg C)'], list(np.linspace(25, 52, 20)),
+                                 list(np.linspace(40, 45, 20))]
+
+    # Simulate every row with one model, only resetting the node temperatures
+    Expected = input_data.copy()
+    HPWH = HPWH_MultipleNodes(copy.deepcopy(config))
+    for row in range(len(Expected)):
+        if row in Reinitialization_Rows:
+            HPWH.Node_Temperatures = list(Initial_Node_Temperatures[Reinitialization_Rows.index(row) + 1])
+        Expected[row] = HPWH.calculate_timestep(Expected[row])
+
+    Segments = split_segments(len(input_data), Reinitialization_Rows)
+    Outputs = simulate_segments(config, input_data.copy(), Segments, Initial_Node_Temperatures,
+                                Number_Workers = Number_Workers)
+
+    np.testing.assert_allclose(get_node_temperatures(config, Outputs), get_node_temperatures(config, Expected))
+
+def test_warmup_windows_match_sequential(config, make_inputs):
+    input_data = make_inputs(config)
+    Expected = input_data.copy()
+    HPWH = HPWH_MultipleNodes(copy.deepcopy(config))
+    for row in range(len(Expected)):
+        Expected[row] = HPWH.calculate_timestep(Expected[row])
+
+    Outputs, Diagnostics = simulate_warmup_windows(config, input_data.copy(), 3, Warmup_Rows = 120, Tolerance = 0,
+                                                   Number_Workers = 1)
+
+    assert Diagnostics['Converged'].iloc[-1]
+    assert Diagnostics['Max Remaining Difference (deg C)'].iloc[-1] == 0
+    np.testing.assert_allclose(get_node_temperatures(config, Outputs), get_node_temperatures(config, Expected))
+
+    # Accepting every boundary reports the difference left at the boundaries
+    Outputs, Diagnostics = simulate_warmup_windows(config, input_data.copy(), 3, Warmup_Rows = 120, Tolerance = np.inf,
+                                                   Number_Workers = 1)
+    assert len(Diagnostics) == 1 and Diagnostics['Converged'].iloc[-1]
+    assert Diagnostics['Max Remaining Difference (deg C)'].iloc[-1] > 0
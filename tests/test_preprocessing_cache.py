@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:05:19 2026
+
+Tests storing prepared data sets in the preprocessing cache.
+
+@author: Peter Grant
+"""
+
+import numpy as np
+import pandas as pd
+
+from Preprocessing_Cache import save_dataframe, load_dataframe, in_cache, get_cache_key
+
+def test_round_trip(tmp_path):
+    Index = pd.date_range('2020-10-01', periods = 4, freq = '1min')
+    data = pd.DataFrame({'Water Draw Volume (L)': [0, 1.5, 0, 2.25],
+                         'Hour': [0, 0, 0, 0],
+                         'Mixed': np.array([1, 2.5, 3, 4], dtype = object),
+                         'Site': np.array(['Creekside', 'Creekside', 'Site B', 'Site B'], dtype = object),
+                         'Timestamp': Index}, index = Index)
+    key = get_cache_key('draw profile', 'Ducted_Exhaust')
+
+    assert not in_cache(str(tmp_path), key)
+    save_dataframe(data, str(tmp_path), key)
+    assert in_cache(str(tmp_path), key)
+    Stored = load_dataframe(str(tmp_path), key)
+
+    pd.testing.assert_index_equal(Stored.index, data.index)
+    assert list(Stored.columns) == list(data.columns)
+    assert Stored['Site'].tolist() == data['Site'].tolist()
+    assert Stored['Site'].dtype == object
+    np.testing.assert_array_equal(Stored['Mixed'].to_numpy(dtype = float), [1, 2.5, 3, 4])
+    np.testing.assert_array_equal(Stored['Water Draw Volume (L)'], data['Water Draw Volume (L)'])
+    pd.testing.assert_series_equal(Stored['Timestamp'], data['Timestamp'], check_freq = False)
+
+def test_missing_key(tmp_path):
+    assert load_dataframe(str(tmp_path), 'missing') is None
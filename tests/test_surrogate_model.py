@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:17:43 2026
+
+Tests fitting the regressions of the surrogate model.
+
+@author: Peter Grant
+"""
+
+import numpy as np
+import pytest
+
+from Surrogate_Model import Bounds, latin_hypercube, calculate_terms, fit_regression
+
+def test_leave_one_out_matches_refitting():
+    Designs = latin_hypercube(Bounds, 25, Seed = 1)
+    Normalized = 2 * (Designs.to_numpy() - [Bounds[parameter][0] for parameter in Designs.columns]) / \
+        np.array([Bounds[parameter][1] - Bounds[parameter][0] for parameter in Designs.columns]) - 1
+    Terms = calculate_terms(Normalized)
+    Generator = np.random.default_rng(0)
+    Values = Terms @ Generator.normal(size = Terms.shape[1]) + Generator.normal(scale = 0.1, size = len(Terms))
+
+    Regression = fit_regression(Terms, {'KPI': Values})['KPI']
+
+    # Fit the regression again without each design and predict it
+    Errors = []
+    for design in range(len(Terms)):
+        Keep = np.arange(len(Terms)) != design
+        Coefficients = np.linalg.lstsq(Terms[Keep], Values[Keep], rcond = None)[0]
+        Errors.append(Values[design] - Terms[design] @ Coefficients)
+    Errors = np.array(Errors)
+
+    assert Regression['RMSE'] == pytest.approx(np.sqrt(np.mean(Errors ** 2)), rel = 1e-8)
+    assert Regression['Maximum Error'] == pytest.approx(np.abs(Errors).max(), rel = 1e-8)
+    np.testing.assert_allclose(Regression['Coefficients'], np.linalg.lstsq(Terms, Values, rcond = None)[0], atol = 1e-8)
+
+def test_too_few_designs():
+    Terms = calculate_terms(np.zeros((5, 3)))
+    with pytest.raises(ValueError):
+        fit_regression(Terms, {'KPI': np.zeros(5)})